@@ -1,27 +1,164 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_cors import CORS
+from functools import partial
+from sqlalchemy import Select, event
+from sqlalchemy.engine import make_url
 import os
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# 只读连接池的绑定名
+READ_BIND = 'read'
+
+# SQLite：写连接数（SQLite同一时刻只有一个写事务，多余的写连接只会互相等待锁）与只读连接数
+SQLITE_WRITE_POOL_SIZE = int(os.getenv('SQLITE_WRITE_POOL_SIZE', '1'))
+SQLITE_READ_POOL_SIZE = int(os.getenv('SQLITE_READ_POOL_SIZE', '8'))
+# SQLite pragma：等待锁的毫秒数、页缓存（负数表示KiB）、内存映射字节数、同步级别
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# PostgreSQL：连接池大小、溢出连接数、连接回收秒数
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# 从连接池获取连接的最长等待秒数
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+
+class RoutingSession(Session):
+    """
+    配置了只读连接池时：SELECT 走只读连接，写操作走写连接
+    事务中一旦发生写入（flush或执行DML），之后的读取也留在写连接上，保证读到自己的写入；
+    事务结束后恢复路由；启用分片时，条目表的读写由 shard_router 发往用户所在的分片
+    """
+
+    # 分片路由（见 app.shards）：涉及条目表时返回分片引擎，否则返回None
+    shard_router = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.shard_router is not None:
+            engine = self.shard_router(self, mapper, clause)
+            if engine is not None:
+                return engine
+        if bind is None and READ_BIND in self._db.engines:
+            if isinstance(clause, Select) and not self._flushing and not self.info.get('pmer_wrote'):
+                return self._db.engines[READ_BIND]
+            self.info['pmer_wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('pmer_wrote', None)
+
 # 初始化数据库
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def _is_memory_sqlite(url):
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def _sqlite_profile(app, url):
+    """SQLite：WAL + 单写连接 + 只读连接池"""
+    if _is_memory_sqlite(url):
+        # 内存数据库的每个连接都是独立的库，保持Flask-SQLAlchemy的默认单连接配置
+        return
+
+    connection_options = {
+        'max_overflow': 0,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000, 'check_same_thread': False}
+    }
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': SQLITE_WRITE_POOL_SIZE, **connection_options}
+    app.config['SQLALCHEMY_BINDS'] = {
+        READ_BIND: {'url': url.render_as_string(hide_password=False), 'pool_size': SQLITE_READ_POOL_SIZE, **connection_options}
+    }
+
+def _postgresql_profile(app, url):
+    """PostgreSQL：较大的连接池，定期回收并在取出前检测连接"""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True
+    }
+
+# 按数据库后端选择存储配置；未列出的后端使用SQLAlchemy默认配置
+DATABASE_PROFILES = {
+    'sqlite': _sqlite_profile,
+    'postgresql': _postgresql_profile
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record, read_only=False):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute(f'PRAGMA cache_size={SQLITE_CACHE_SIZE}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    if read_only:
+        # 路由出错时立即报错，而不是在只读连接上悄悄写入
+        cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+def configure_database(app):
+    """根据 DATABASE_URI 的后端应用对应的存储配置"""
+    uri = os.getenv('DATABASE_URI', 'sqlite:///pmer.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    profile = DATABASE_PROFILES.get(make_url(uri).get_backend_name())
+    if profile:
+        profile(app, make_url(uri))
+
+def _register_engine_events(app):
+    """为文件型SQLite的每个连接设置pragma"""
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite' and not _is_memory_sqlite(engine.url):
+                event.listen(engine, 'connect', partial(_apply_sqlite_pragmas, read_only=key == READ_BIND))
 
 def create_app():
     app = Flask(__name__)
-    
+
     # 配置数据库
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///pmer.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-    
+
     # 初始化扩展
     db.init_app(app)
+    _register_engine_events(app)
     CORS(app)
-    
+
+    # 可选的按用户分片存储
+    from app.shards import configure_sharding
+    configure_sharding(app)
+
+    # 缓存后端（sqlite / redis 后端在多个worker之间共享）
+    from app.cache import init_cache
+    init_cache(app)
+
+    # JSON序列化（安装了 orjson 时使用）
+    from app.serialization import JSONProvider
+    app.json = JSONProvider(app)
+
+    # 请求级性能统计（Server-Timing 与请求日志）
+    from app.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    # 按 Accept-Encoding 压缩响应
+    from app.compression import init_compression
+    init_compression(app)
+
+    # 运行指标与 /metrics 端点
+    from app.metrics import init_metrics
+    init_metrics(app)
+
     # 注册蓝图
     from app.auth import auth_bp
     from app.passwords import passwords_bp
@@ -32,9 +169,17 @@ def create_app():
     app.register_blueprint(passwords_bp)
     app.register_blueprint(commands_bp)
     app.register_blueprint(main_bp)
-    
-    # 创建数据库表
-    with app.app_context():
-        db.create_all()
-    
-    return app
\ No newline at end of file
+
+    # 条目变动通知（SSE）
+    from app.events import init_events
+    init_events(app)
+
+    # 检查数据库结构版本（落后时按配置自动升级）
+    from app.schema import check_schema
+    check_schema(app)
+
+    # 后台把旧的文本令牌改写为二进制存储
+    from app.passwords.convert import launch_token_conversion
+    launch_token_conversion(app)
+
+    return app
@@ -0,0 +1,82 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.cache import cache, invalidate_after_commit
+from app.models import User
+
+# 用户资料快照在缓存中的有效期（秒）；用户记录被修改或删除并提交后立即失效
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+
+class Principal:
+    """
+    由已验证的JWT声明构建的轻量用户身份
+    大多数接口只需要 current_user.id，无需查询users表；
+    访问其他属性或方法时才按需从数据库加载完整的User对象
+    """
+
+    __slots__ = ('id', '_key_version', '_profile', '_kdf', '_user')
+
+    def __init__(self, user_id, key_version, profile, kdf, user=None):
+        object.__setattr__(self, 'id', user_id)
+        object.__setattr__(self, '_key_version', key_version)
+        object.__setattr__(self, '_profile', profile)
+        object.__setattr__(self, '_kdf', kdf)
+        object.__setattr__(self, '_user', user)
+
+    @property
+    def key_version(self):
+        """主密钥版本；已加载完整User时以其为准（可能刚被修改）"""
+        if self._user is not None:
+            return self._user.key_version or 0
+        return self._key_version
+
+    def load(self):
+        """加载（并记住）完整的User ORM对象"""
+        if self._user is None:
+            user = db.session.get(User, self.id)
+            if user is None:
+                raise LookupError(f'用户 {self.id} 不存在')
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def to_dict(self):
+        return dict(self._profile)
+
+    def kdf_info(self):
+        """主密钥派生参数；已加载完整User时以其为准（修改密码时可能刚被升级）"""
+        if self._user is not None:
+            return self._user.kdf_info()
+        return dict(self._kdf)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+def load_principal(user_id):
+    """
+    根据JWT中的用户ID构建Principal
+    缓存（只缓存 key_version、to_dict()、kdf_info() 快照，不缓存ORM对象）命中时不访问数据库；
+    用户不存在时返回None
+    """
+    key = cache.user_key(user_id, 'principal')
+    cached = cache.get('user', key)
+    if cached is not None:
+        key_version, profile, kdf = cached
+        return Principal(user_id, key_version, profile, kdf)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    key_version, profile, kdf = user.key_version or 0, user.to_dict(), user.kdf_info()
+    cache.set('user', key, [key_version, profile, kdf], USER_CACHE_TTL)
+    return Principal(user_id, key_version, profile, kdf, user)
+
+# 用户记录的修改/删除在flush时记下，提交后再失效缓存（所有worker同时生效）
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            invalidate_after_commit(session, obj.id)
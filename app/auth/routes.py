@@ -2,14 +2,31 @@ from flask import request, jsonify, current_app
 from app import db
 from app.models import User
 from app.auth import auth_bp
+from app.auth.principal import load_principal
+from app.kdf import KdfBusyError
+from app.shards import create_shard, use_shard
 import jwt
 import os
 import pyotp
-import qrcode
-import io
-import base64
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import partial, wraps
+
+@auth_bp.app_errorhandler(KdfBusyError)
+def handle_kdf_busy(e):
+    """密钥派生并发已满时返回429，提示客户端稍后重试"""
+    response = jsonify({'message': '请求过于频繁，请稍后重试'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def issue_token(user, master_key):
+    """签发正式的JWT令牌，包含主密钥及其版本（修改密码后旧版本的令牌失效）"""
+    return jwt.encode({
+        'user_id': user.id,
+        'master_key': master_key,
+        'kv': user.key_version or 0,
+        'exp': datetime.utcnow() + timedelta(hours=24)
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
 # 认证装饰器
 def token_required(f):
@@ -24,15 +41,23 @@ def token_required(f):
 
         try:
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            # 轻量身份：缓存命中时不查询users表，处理函数需要时才加载完整User
+            current_user = load_principal(data['user_id'])
             if not current_user:
                 return jsonify({'message': '无效的用户'}), 401
 
+            # 修改密码后主密钥已更换，旧令牌携带的主密钥不能再用于写入
+            if data.get('kv', 0) != current_user.key_version:
+                return jsonify({'message': '令牌已失效，请重新登录'}), 401
+
             # 从JWT中提取master_key（如果存在）
             master_key = data.get('master_key')
         except:
             return jsonify({'message': '无效的令牌'}), 401
 
+        # 分片模式下，本请求的条目读写都发往该用户的分片
+        use_shard(current_user.id)
+
         # 将master_key作为参数传递给被装饰的函数
         return f(current_user, master_key, *args, **kwargs)
 
@@ -60,6 +85,8 @@ def token_or_temp_required(f):
         except:
             return jsonify({'message': '无效的令牌'}), 401
 
+        use_shard(current_user.id)
+
         return f(current_user, master_key, *args, **kwargs)
 
     return decorated
@@ -94,7 +121,10 @@ def register():
     db.session.add(new_user)
     db.session.commit()
 
-    return jsonify({'message': '注册成功', 'user': new_user.to_dict()}), 201
+    response = jsonify({'message': '注册成功', 'user': new_user.to_dict()})
+    # 分片模式下在响应发送后为新用户创建分片，建表迁移不在请求中执行
+    response.call_on_close(partial(create_shard, new_user.id))
+    return response, 201
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -111,6 +141,10 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'message': '用户名或密码错误'}), 401
 
+    # 口令哈希参数已过期时透明升级
+    if user.rehash_password_if_needed(data['password']):
+        db.session.commit()
+
     # 检查是否需要设置2FA（强制要求）
     if not user.two_factor_enabled:
         # 用户还没有启用2FA，返回临时token要求设置
@@ -147,16 +181,13 @@ def login():
     master_key = user.generate_master_key(data['password'])
 
     # 生成JWT令牌，包含加密的master_key
-    token = jwt.encode({
-        'user_id': user.id,
-        'master_key': master_key,  # 将master_key加密存储在JWT中
-        'exp': datetime.utcnow() + timedelta(hours=24)
-    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+    token = issue_token(user, master_key)
 
     return jsonify({
         'message': '登录成功',
         'token': token,
-        'user': user.to_dict()
+        'user': user.to_dict(),
+        'kdf': user.kdf_info()
     }), 200
 
 @auth_bp.route('/profile', methods=['GET'])
@@ -177,11 +208,28 @@ def change_password(current_user, master_key):
     if not current_user.check_password(data['old_password']):
         return jsonify({'message': '旧密码错误'}), 401
 
-    # 更新密码
+    from app.passwords.rekey import create_rekey_job, launch_rekey
+
+    # 主密钥随密码改变：用旧密码派生旧主密钥，并借机升级到当前的派生参数
+    old_key = current_user.generate_master_key(data['old_password'])
     current_user.set_password(data['new_password'])
+    current_user.upgrade_kdf()
+    new_key = current_user.generate_master_key(data['new_password'])
+
+    # 密码修改与重新加密任务在同一事务中提交，崩溃后任务可以继续
+    job = create_rekey_job(current_user.id, old_key, new_key)
+    current_user.key_version = (current_user.key_version or 0) + 1
     db.session.commit()
 
-    return jsonify({'message': '密码修改成功'}), 200
+    # 后台分批把密码库从旧主密钥轮换到新主密钥
+    launch_rekey(current_user.id, job.id, new_key)
+
+    return jsonify({
+        'message': '密码修改成功',
+        'token': issue_token(current_user, new_key),
+        'kdf': current_user.kdf_info(),
+        'rekey_job': job.to_dict()
+    }), 200
 
 @auth_bp.route('/setup-2fa', methods=['POST'])
 @token_or_temp_required
@@ -196,7 +244,11 @@ def setup_2fa(current_user, master_key):
         issuer_name='PMER Password Manager'
     )
 
-    # 生成二维码图片
+    # 生成二维码图片（qrcode 与图像库只在这里使用，延迟导入以加快启动）
+    import base64
+    import io
+    import qrcode
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(totp_uri)
     qr.make(fit=True)
@@ -247,17 +299,22 @@ def enable_2fa(current_user, master_key):
         # 生成主密钥
         master_key = current_user.generate_master_key(password)
 
+        # 继续未完成的重新加密任务
+        from app.passwords.rekey import resume_rekey
+        resume_rekey(current_user.id, master_key)
+
+        # 在后台把旧格式条目拆分为摘要/机密两列，并补建缺少的盲索引
+        from app.passwords.payload import launch_entry_migration
+        launch_entry_migration(current_user.id, master_key)
+
         # 生成正式的JWT令牌
-        token = jwt.encode({
-            'user_id': current_user.id,
-            'master_key': master_key,
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, current_app.config['SECRET_KEY'], algorithm='HS256')
+        token = issue_token(current_user, master_key)
 
         return jsonify({
             'message': '2FA启用成功',
             'token': token,
             'user': current_user.to_dict(),
+            'kdf': current_user.kdf_info(),
             'auto_login': True
         }), 200
 
@@ -305,6 +362,7 @@ def verify_2fa():
         user = User.query.get(token_data['user_id'])
         if not user:
             return jsonify({'message': '用户不存在'}), 401
+        use_shard(user.id)
 
         # 验证2FA代码
         totp = pyotp.TOTP(user.two_factor_secret)
@@ -314,17 +372,23 @@ def verify_2fa():
         # 生成主密钥
         master_key = user.generate_master_key(token_data['password'])
 
+        # 继续未完成的重新加密任务（例如进程在任务中途重启）
+        from app.passwords.rekey import resume_rekey
+        resume_rekey(user.id, master_key)
+
+        # 在后台把旧格式条目拆分为摘要/机密两列，并补建缺少的盲索引
+        from app.passwords.payload import launch_entry_migration
+        launch_entry_migration(user.id, master_key)
+
         # 生成正式的JWT令牌
-        token = jwt.encode({
-            'user_id': user.id,
-            'master_key': master_key,
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, current_app.config['SECRET_KEY'], algorithm='HS256')
+        token = issue_token(user, master_key)
 
         return jsonify({
             'message': '登录成功',
             'token': token,
-            'user': user.to_dict()
+            'user': user.to_dict(),
+            # 客户端解密模式：浏览器用登录口令和这些参数自行派生主密钥
+            'kdf': user.kdf_info()
         }), 200
 
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,50 @@
+"""
+批量操作接口的公共辅助函数
+
+请求体格式: {"operations": [{"op": "create" | "update" | "delete", "id": ..., ...字段}]}
+整批在一个事务中执行，每个操作返回独立的结果状态。
+"""
+
+import os
+
+# 单次批量请求允许的最大操作数
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', '5000'))
+
+BATCH_OPS = ('create', 'update', 'delete')
+
+def parse_batch_operations(data):
+    """
+    校验批量请求体，返回操作列表
+    请求体无效时返回 (None, 错误信息)，否则返回 (operations, None)
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('operations'), list):
+        return None, '缺少操作列表'
+
+    operations = data['operations']
+    if not operations:
+        return None, '操作列表为空'
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return None, f'单次最多 {BATCH_MAX_OPERATIONS} 个操作'
+    return operations, None
+
+def batch_result(index, status, message=None, **extra):
+    """单个操作的结果"""
+    result = {'index': index, 'status': status}
+    if message:
+        result['message'] = message
+    result.update(extra)
+    return result
+
+def invalid_operation(index, op, text_fields=()):
+    """
+    op字段本身无效时的结果；有效则返回None
+    text_fields 中的字段提供了（且不为null）时必须是字符串
+    """
+    if not isinstance(op, dict) or op.get('op') not in BATCH_OPS:
+        return batch_result(index, 400, '无效的操作类型')
+    if op['op'] != 'create' and not isinstance(op.get('id'), int):
+        return batch_result(index, 400, '缺少条目id')
+    for field in text_fields:
+        if op.get(field) is not None and not isinstance(op[field], str):
+            return batch_result(index, 400, f'字段 {field} 必须是字符串', **({'id': op['id']} if 'id' in op else {}))
+    return None
@@ -0,0 +1,303 @@
+"""
+可插拔的缓存（多进程部署时由各worker共享）
+
+CACHE_BACKEND 选择后端：
+- memory：进程内LRU（默认）。只适合单进程部署：各worker的缓存互不可见，写入后的失效也只作用于本进程
+- sqlite：本机共享的SQLite文件（CACHE_PATH），同一台机器上的所有worker共享，不需要外部服务
+- redis：Redis协议的服务（CACHE_URL，需要安装 redis 包），可以跨机器共享
+
+按用户划分命名空间：user_key() 生成的键中带有该用户当前的代数（generation），
+invalidate_user() 把代数换成新值，该用户的所有缓存项在所有worker中同时失效，旧值随TTL过期。
+调用方先取键（即读取代数）再查询数据库、最后用同一个键写入：与失效并发的读取即使写回旧数据，
+也写在已作废的代数下，之后的请求不会读到。代数丢失（过期或被淘汰）时生成新值，效果等同于失效。
+条目与用户记录的修改在事务提交后通过 invalidate_after_commit() 失效。
+
+值以JSON保存（不使用pickle，共享存储中的数据不应能在应用中执行代码）；
+只缓存可以与同机其他进程共享的数据，密钥材料（如 Fernet 对象）保留在进程内的专用缓存中。
+后端出错时按未命中处理，计入 pmer_cache_errors_total，不影响请求。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.metrics import cache_errors, cache_requests
+
+try:
+    import redis
+except ImportError:  # 可选依赖，只有 CACHE_BACKEND=redis 时需要
+    redis = None
+
+# memory / sqlite / redis
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+# sqlite 后端的文件路径（同一台机器上的所有worker使用同一个文件）
+CACHE_PATH = os.getenv('CACHE_PATH', 'pmer-cache.db')
+# redis 后端的地址与键前缀（多个应用共用一个Redis时区分）
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'pmer:')
+# 默认有效期（秒）
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', '300'))
+# memory 与 sqlite 后端保留的最大条目数
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+# 共享后端单次操作的超时（秒），超时按未命中处理
+CACHE_TIMEOUT = float(os.getenv('CACHE_TIMEOUT', '0.5'))
+
+# 用户代数的有效期：代数丢失只会让该用户的缓存提前失效，不影响正确性
+GENERATION_TTL = 24 * 3600
+# 后端持续出错时，错误日志的最短间隔（秒）；每次出错都计入指标
+ERROR_LOG_INTERVAL = 60
+
+logger = logging.getLogger('pmer.cache')
+
+class MemoryBackend:
+    """进程内的LRU + TTL"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl):
+        """键不存在（或已过期）时写入，返回键当前的值"""
+        existing = self.get(key)
+        if existing is not None:
+            return existing
+        self.set(key, value, ttl)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteBackend:
+    """
+    本机共享的SQLite文件：每个线程一个连接（派生子进程后重新连接），WAL模式下读取互不阻塞
+    缓存可以随时丢弃，因此关闭同步；过期与超出上限的条目每隔一段写入清理一次
+    """
+
+    # 每写入这么多次清理一次
+    PRUNE_INTERVAL = 500
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=CACHE_TIMEOUT, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, time.time() + ttl)
+        )
+        self._after_write()
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        connection = self._connection()
+        # 已过期的旧值视为不存在
+        connection.execute(
+            'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at '
+            'WHERE cache.expires_at <= ?',
+            (key, value, now + ttl, now)
+        )
+        self._after_write()
+        return self.get(key)
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL:
+            return
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        excess = connection.execute('SELECT count(*) FROM cache').fetchone()[0] - self.max_entries
+        if excess > 0:
+            # 先淘汰最早过期的条目
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)', (excess,)
+            )
+
+class RedisBackend:
+    """Redis协议的服务（Redis、Valkey、KeyDB等），过期由服务端处理"""
+
+    def __init__(self, url=CACHE_URL, prefix=CACHE_KEY_PREFIX):
+        if redis is None:
+            raise RuntimeError('CACHE_BACKEND=redis 需要安装 redis 包（pip install redis）')
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=CACHE_TIMEOUT, socket_connect_timeout=CACHE_TIMEOUT)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        key = self.prefix + key
+        if self.client.set(key, value, px=int(ttl * 1000), nx=True):
+            return value
+        # 其他进程已写入（或刚好过期，此时使用自己的值）
+        return self.client.get(key) or value
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*', count=1000):
+            self.client.delete(key)
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SQLiteBackend,
+    'redis': RedisBackend
+}
+
+class Cache:
+    """
+    缓存的统一接口：值为可JSON序列化的对象（None 表示未命中，不能作为值缓存）
+    namespace 用于区分统计（如 user、version），不参与键
+    """
+
+    def __init__(self, backend_name=CACHE_BACKEND):
+        if backend_name not in BACKENDS:
+            raise ValueError(f'未知的 CACHE_BACKEND: {backend_name}（可选 {", ".join(BACKENDS)}）')
+        self.backend_name = backend_name
+        # 是否在进程之间共享：进程内缓存无法感知其他worker的写入，不能缓存依赖最新写入的数据
+        self.shared = backend_name != 'memory'
+        self._backend = None
+        self._lock = threading.Lock()
+        self._last_error_log = 0.0
+
+    def get_backend(self):
+        """惰性创建后端（导入时不连接外部服务）"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = BACKENDS[self.backend_name]()
+        return self._backend
+
+    def _call(self, operation, *args):
+        try:
+            return getattr(self.get_backend(), operation)(*args)
+        except Exception:
+            cache_errors.inc(operation=operation)
+            now = time.monotonic()
+            if now - self._last_error_log >= ERROR_LOG_INTERVAL:
+                self._last_error_log = now
+                logger.warning('缓存操作 %s 失败（按未命中处理）', operation, exc_info=True)
+            return None
+
+    def get(self, namespace, key):
+        raw = self._call('get', key)
+        cache_requests.inc(namespace=namespace, result='miss' if raw is None else 'hit')
+        return None if raw is None else json.loads(raw)
+
+    def set(self, namespace, key, value, ttl=None):
+        self._call('set', key, json.dumps(value, separators=(',', ':')).encode('utf-8'), ttl or CACHE_DEFAULT_TTL)
+
+    def delete(self, key):
+        self._call('delete', key)
+
+    def clear(self):
+        self._call('clear')
+
+    def cached(self, namespace, key, compute, ttl=None):
+        """读取缓存，未命中时调用 compute() 计算并写入（compute 返回 None 时不缓存）"""
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(namespace, key, value, ttl)
+        return value
+
+    def _generation(self, user_id):
+        key = f'gen:u{user_id}'
+        generation = self._call('add', key, os.urandom(8).hex().encode(), GENERATION_TTL)
+        # 后端不可用时使用一次性的代数，本次读取必然未命中
+        return generation.decode() if isinstance(generation, bytes) else generation or os.urandom(8).hex()
+
+    def user_key(self, user_id, name):
+        """用户命名空间下的键（带当前代数），须在读取数据库之前取得"""
+        return f'u{user_id}:{self._generation(user_id)}:{name}'
+
+    def invalidate_user(self, user_id):
+        """作废用户的所有缓存项（所有共享同一后端的进程同时生效）"""
+        self._call('set', f'gen:u{user_id}', os.urandom(8).hex().encode(), GENERATION_TTL)
+
+cache = Cache()
+
+def invalidate_after_commit(session, user_id):
+    """在会话的事务提交后作废用户的缓存（回滚时不做任何事）"""
+    session.info.setdefault('pmer_cache_users', set()).add(user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for user_id in session.info.pop('pmer_cache_users', ()):
+        cache.invalidate_user(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('pmer_cache_users', None)
+
+def init_cache(app):
+    """启动时创建缓存后端（配置错误时立即失败）"""
+    cache.get_backend()
+    app.logger.info('缓存后端: %s', cache.backend_name)
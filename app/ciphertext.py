@@ -0,0 +1,47 @@
+"""
+密文列的存储类型
+
+Fernet令牌本身是URL安全的base64文本，直接存入Text列会多出约1/3的体积。
+FernetToken 列在数据库中保存解码后的原始字节（BLOB），对应用代码仍然表现为
+base64令牌字符串，加解密、导出等逻辑无需关心存储形式。
+
+旧数据库中以文本保存的令牌照常可读，由后台转换任务逐步改写为二进制。
+"""
+
+import base64
+from sqlalchemy import LargeBinary, type_coerce
+from sqlalchemy.types import NullType, TypeDecorator
+
+def to_token(value):
+    """把数据库中的原始值（二进制或旧的文本令牌）转换为base64令牌字符串"""
+    if value is None or isinstance(value, str):
+        return value
+    if not isinstance(value, bytes):
+        value = bytes(value)
+    return base64.urlsafe_b64encode(value).decode()
+
+class FernetToken(TypeDecorator):
+    """以原始字节存储Fernet令牌的列类型"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return base64.urlsafe_b64decode(value)
+
+    def process_result_value(self, value, dialect):
+        return to_token(value)
+
+def stored(column):
+    """按数据库中的原始值（不经过 FernetToken 转换）读取或比较该列"""
+    return type_coerce(column, NullType())
+
+def unchanged(column, raw_value):
+    """
+    条件更新用：列的原始值仍等于之前读到的 raw_value
+    必须与 stored() 读出的原始值比较，文本令牌与二进制令牌在数据库中并不相等
+    """
+    if raw_value is None:
+        return column.is_(None)
+    return stored(column) == type_coerce(raw_value, NullType())
@@ -1,18 +1,72 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from app import db
 from app.models import Command
-from app.commands import commands_bp
+from app.commands import commands_bp, search
 from app.auth.routes import token_required
+from app.conditional import collection_version, make_etag, not_modified, etag_json, etag_stream
+from app.batch import parse_batch_operations, batch_result, invalid_operation
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from app.sync import parse_since, new_cursor, record_deletion, deleted_since
+from app.groups import group_summary, summary_version
+from app.serialization import JSON_STREAM_CHUNK_SIZE, stream_response
+from app.shards import use_shard
+
+# 搜索结果每页最大条数
+MAX_SEARCH_PAGE_SIZE = 100
+
+# 列表输出的字段（与 Command.to_dict 相同）
+LIST_FIELDS = ('id', 'name', 'command_type', 'command_text', 'created_at', 'updated_at')
+
+def command_chunks(user_id, *criteria, order_by=Command.id):
+    """
+    按块读取用户命令条目的列表字段，直接得到字典（不构造ORM对象）
+    时间字段保持 datetime，由JSON提供者编码为与 to_dict 相同的 ISO 8601 字符串
+    """
+    # 流式输出时请求的会话已在 teardown 中移除，需要为新会话重新选定分片
+    use_shard(user_id)
+    result = db.session.execute(
+        select(*(getattr(Command, field) for field in LIST_FIELDS))
+        .where(Command.user_id == user_id, *criteria).order_by(order_by),
+        execution_options={'yield_per': JSON_STREAM_CHUNK_SIZE}
+    )
+    try:
+        for rows in result.partitions():
+            yield [dict(zip(LIST_FIELDS, row)) for row in rows]
+    finally:
+        result.close()
 
 @commands_bp.route('/', methods=['GET'])
 @token_required
 def get_all_commands(current_user, master_key):
     """获取用户的所有命令条目"""
-    commands = Command.query.filter_by(user_id=current_user.id).all()
+    etag = make_etag('commands', collection_version(Command, current_user.id, 'command'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    return jsonify({
-        'commands': [cmd.to_dict() for cmd in commands]
-    }), 200
+    return etag_stream({}, 'commands', command_chunks(current_user.id), etag)
+
+@commands_bp.route('/changes', methods=['GET'])
+@token_required
+def get_command_changes(current_user, master_key):
+    """
+    增量同步：返回 since 之后新增/修改的命令条目以及被删除条目的id
+    未提供 since 时返回全部条目（首次同步）
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'message': '无效的同步游标'}), 400
+
+    cursor = new_cursor()
+
+    criteria = [Command.updated_at >= since] if since else []
+
+    return stream_response({
+        'deleted': deleted_since(current_user.id, 'command', since) if since else [],
+        'cursor': cursor
+    }, 'upserted', command_chunks(current_user.id, *criteria, order_by=Command.updated_at))
 
 @commands_bp.route('/<int:command_id>', methods=['GET'])
 @token_required
@@ -23,7 +77,12 @@ def get_command(current_user, master_key, command_id):
     if not command:
         return jsonify({'message': '命令条目不存在'}), 404
 
-    return jsonify(command.to_dict()), 200
+    etag = make_etag(command.id, command.updated_at.isoformat())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return etag_json(command.to_dict(), etag)
 
 @commands_bp.route('/', methods=['POST'])
 @token_required
@@ -97,15 +156,135 @@ def delete_command(current_user, master_key, command_id):
         return jsonify({'message': '命令条目不存在'}), 404
 
     db.session.delete(command)
+    record_deletion(current_user.id, 'command', command_id)
     db.session.commit()
 
     return jsonify({'message': '命令条目删除成功'}), 200
 
+@commands_bp.route('/batch', methods=['POST'])
+@token_required
+def batch_commands(current_user, master_key):
+    """
+    批量创建/更新/删除命令条目
+    整批在一个事务中提交，每个操作返回独立的结果状态
+    """
+    operations, error = parse_batch_operations(request.get_json(silent=True))
+    if error:
+        return jsonify({'message': error}), 400
+
+    results = [None] * len(operations)
+
+    # 一次性载入所有被更新/删除的条目
+    target_ids = list({
+        op['id'] for op in operations
+        if isinstance(op, dict) and isinstance(op.get('id'), int)
+    })
+    existing = {}
+    for i in range(0, len(target_ids), 500):
+        rows = Command.query.filter(
+            Command.user_id == current_user.id,
+            Command.id.in_(target_ids[i:i + 500])
+        ).all()
+        existing.update((cmd.id, cmd) for cmd in rows)
+
+    try:
+        created = []
+        deleted_ids = set()
+        for index, op in enumerate(operations):
+            invalid = invalid_operation(index, op)
+            if invalid:
+                results[index] = invalid
+                continue
+
+            if op['op'] == 'create':
+                if not all(k in op for k in ('name', 'command_text')):
+                    results[index] = batch_result(index, 400, '缺少必要字段')
+                    continue
+                created.append((index, Command(
+                    name=op['name'],
+                    command_type=op.get('command_type', ''),
+                    command_text=op['command_text'],
+                    user_id=current_user.id
+                )))
+                continue
+
+            command = existing.get(op['id'])
+            if command is None or command.id in deleted_ids:
+                results[index] = batch_result(index, 404, '命令条目不存在', id=op['id'])
+                continue
+
+            if op['op'] == 'delete':
+                db.session.delete(command)
+                record_deletion(current_user.id, 'command', command.id)
+                deleted_ids.add(command.id)
+            else:
+                for field in ('name', 'command_type', 'command_text'):
+                    if field in op:
+                        setattr(command, field, op[field])
+            results[index] = batch_result(index, 200, id=command.id)
+
+        # 新增条目在flush时按哨兵列合并为多行INSERT（见 Password._sentinel），分组计数与变动通知照常由flush钩子维护
+        db.session.add_all([command for _, command in created])
+        db.session.flush()
+
+        for index, command in created:
+            results[index] = batch_result(index, 201, id=command.id)
+
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.exception('批量操作失败')
+        return jsonify({'message': f'批量操作失败: {str(e)}'}), 400
+
+    failed = sum(1 for result in results if result['status'] >= 400)
+    return jsonify({
+        'results': results,
+        'succeeded': len(results) - failed,
+        'failed': failed
+    }), 200
+
 @commands_bp.route('/types', methods=['GET'])
 @token_required
 def get_command_types(current_user, master_key):
-    """获取用户的所有命令类型"""
-    types = db.session.query(Command.command_type).filter_by(user_id=current_user.id).distinct().all()
+    """获取用户的命令类型及各类型的条目数：{name, count, last_updated}，total 为全部命令数"""
+    types, total = group_summary(current_user.id, 'command')
+    etag = make_etag('types', summary_version(types, total))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return etag_json({
+        'types': [t.to_dict() for t in types],
+        'total': total
+    }, etag)
+
+@commands_bp.route('/search', methods=['GET'])
+@token_required
+def search_commands(current_user, master_key):
+    """
+    全文检索命令条目（名称、命令文本、类型；每个词按前缀匹配，多个词需同时命中）
+    查询参数: q、type（按命令类型筛选）、limit、offset
+    结果按相关度排序，next_cursor 为下一页的 offset
+    """
+    terms = search.query_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({'message': '请输入搜索词'}), 400
+
+    command_type = request.args.get('type') or None
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_SEARCH_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    # 多取一条用于判断是否还有下一页
+    rows = search.search(current_user.id, terms, command_type, limit + 1, offset)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = offset + limit
+
     return jsonify({
-        'types': [t[0] for t in types if t[0]]
+        'commands': [
+            {**command.to_dict(), 'name_highlight': name_highlight, 'snippet': snippet, 'score': score}
+            for command, name_highlight, snippet, score in rows
+        ],
+        'next_cursor': next_cursor
     }), 200
@@ -0,0 +1,154 @@
+"""
+命令库的全文检索（SQLite FTS5）
+
+commands_fts 是以 commands 为外部内容的FTS5表（内容经视图 commands_fts_content 读取，不重复保存文本），
+由 commands 上的触发器保持同步，因此ORM写入、批量操作、导入与分片拆分都无需额外处理。
+索引列为 name、command_text、command_type，以及只用于限定用户的 owner 列（'u' || user_id）。
+
+每个检索词按前缀匹配（词表带2、3字符的前缀索引），多个检索词需同时命中；
+结果按 bm25 排序（名称权重最高），并返回名称高亮与命令文本片段。
+bm25 需要为每个命中行计算得分后排序，宽泛的检索词可能命中整个命令库，因此分两步：
+1. 带 owner 条件在FTS内部求交集，按id倒序取该用户最新的 COMMAND_SEARCH_RANK_WINDOW 条命中
+   （不计算得分，FTS可以提前结束扫描）；
+2. 只在这些命中的id范围内计算 bm25 并排序。这一步不带 owner 条件：
+   bm25 会统计每个检索词的全部命中，owner 条件会使每次查询多扫描一遍该用户的所有条目。
+非SQLite数据库或SQLite未编译FTS5时退化为 LIKE 子串匹配（按id排序，不返回高亮）。
+"""
+
+import functools
+import os
+import re
+import sqlite3
+import unicodedata
+from sqlalchemy import column, func, literal_column, or_, select, table
+from app import db
+from app.models import Command
+
+FTS_TABLE = 'commands_fts'
+FTS_CONTENT_VIEW = 'commands_fts_content'
+
+# 高亮标记：客户端按标记拆分后渲染，其余文本应照常转义
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# 片段包含的最大词数
+SNIPPET_TOKENS = 16
+# bm25 的列权重：name, command_text, command_type, owner
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 0.0)
+# 参与相关度排序的最新命中数
+COMMAND_SEARCH_RANK_WINDOW = int(os.getenv('COMMAND_SEARCH_RANK_WINDOW', '1000'))
+# 最多使用的检索词数
+MAX_QUERY_TERMS = 8
+
+_WORD_RE = re.compile(r'\w+')
+
+# 建立索引的DDL（幂等），由数据库迁移 command_search 执行
+SCHEMA_STATEMENTS = (
+    f"""CREATE VIEW IF NOT EXISTS {FTS_CONTENT_VIEW} AS
+        SELECT id, name, command_text, command_type, 'u' || user_id AS owner FROM commands""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, command_text, command_type, owner,
+        content='{FTS_CONTENT_VIEW}', content_rowid='id',
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS commands_fts_insert AFTER INSERT ON commands BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, command_text, command_type, owner)
+        VALUES (new.id, new.name, new.command_text, new.command_type, 'u' || new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS commands_fts_delete AFTER DELETE ON commands BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, command_text, command_type, owner)
+        VALUES ('delete', old.id, old.name, old.command_text, old.command_type, 'u' || old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS commands_fts_update
+        AFTER UPDATE OF name, command_text, command_type, user_id ON commands BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, command_text, command_type, owner)
+        VALUES ('delete', old.id, old.name, old.command_text, old.command_type, 'u' || old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, name, command_text, command_type, owner)
+        VALUES (new.id, new.name, new.command_text, new.command_type, 'u' || new.user_id);
+    END""",
+)
+
+@functools.lru_cache(maxsize=None)
+def fts5_supported():
+    """当前的SQLite库是否编译了FTS5"""
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+def create_search_index(connection):
+    """创建FTS表、内容视图与同步触发器，并从 commands 重建索引"""
+    for statement in SCHEMA_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def fts_enabled():
+    """命令表所在的数据库（分片模式下为用户分片）是否使用FTS检索"""
+    bind = db.session.get_bind(mapper=Command.__mapper__)
+    return bind.dialect.name == 'sqlite' and fts5_supported()
+
+def query_terms(q):
+    """规范化后的检索词（只保留字母数字，去掉FTS查询语法字符）"""
+    words = _WORD_RE.findall(unicodedata.normalize('NFKC', q or '').casefold())
+    return list(dict.fromkeys(words))[:MAX_QUERY_TERMS]
+
+def _match_expression(terms, user_id=None):
+    """每个检索词作为前缀短语在 name、command_text、command_type 中匹配，多个词需同时命中"""
+    phrases = ' AND '.join(f'"{term}"*' for term in terms)
+    expression = f'{{name command_text command_type}} : ({phrases})'
+    return f'owner : u{user_id} AND {expression}' if user_id is not None else expression
+
+def search(user_id, terms, command_type=None, limit=20, offset=0):
+    """
+    返回 [(命令, 名称高亮, 命令片段, 得分)]，按相关度排序
+    FTS不可用时高亮、片段与得分为None
+    """
+    conditions = [Command.user_id == user_id]
+    if command_type:
+        conditions.append(Command.command_type == command_type)
+
+    if not fts_enabled():
+        query = select(Command, None, None, None).where(
+            *conditions,
+            *[
+                or_(*(
+                    field.ilike(f'%{_escape_like(term)}%', escape='\\')
+                    for field in (Command.name, Command.command_text, Command.command_type)
+                ))
+                for term in terms
+            ]
+        ).order_by(Command.id)
+        return db.session.execute(query.limit(limit).offset(offset)).all()
+
+    fts = table(FTS_TABLE, column('rowid'))
+    fts_ref = literal_column(FTS_TABLE)
+
+    # 第一步：该用户最新的 COMMAND_SEARCH_RANK_WINDOW 条命中的id范围
+    window = select(fts.c.rowid.label('id')).where(
+        fts_ref.op('MATCH')(_match_expression(terms, user_id))
+    )
+    if command_type:
+        window = window.join(Command, Command.id == fts.c.rowid).where(Command.command_type == command_type)
+    window = window.order_by(fts.c.rowid.desc()).limit(COMMAND_SEARCH_RANK_WINDOW).cte('search_window')
+    lower = select(func.min(window.c.id)).scalar_subquery()
+    upper = select(func.max(window.c.id)).scalar_subquery()
+
+    # 第二步：范围内的命中按相关度排序；其他用户的条目由 user_id 条件排除
+    score = func.bm25(fts_ref, *BM25_WEIGHTS).label('score')
+    query = select(
+        Command,
+        func.highlight(fts_ref, 0, HIGHLIGHT_START, HIGHLIGHT_END).label('name_highlight'),
+        func.snippet(fts_ref, 1, HIGHLIGHT_START, HIGHLIGHT_END, '…', SNIPPET_TOKENS).label('snippet'),
+        score
+    ).join_from(fts, Command, Command.id == fts.c.rowid).where(
+        *conditions,
+        fts_ref.op('MATCH')(_match_expression(terms)),
+        fts.c.rowid.between(lower, upper)
+    ).order_by(score, Command.id)
+    return db.session.execute(query.limit(limit).offset(offset)).all()
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -0,0 +1,97 @@
+"""
+响应压缩
+
+按请求的 Accept-Encoding 协商 br（安装了 brotli 时）或 gzip：
+- 普通响应的正文不少于 COMPRESS_MIN_SIZE 字节时整体压缩；
+- 流式响应（大列表，见 app.serialization）逐块压缩，每块之后刷新，客户端可以边接收边解压。
+只处理JSON与文本；已带 Content-Encoding、没有正文（304等）或直接透传文件的响应不处理。
+弱ETag与编码无关，压缩前后不变。
+"""
+
+import os
+import time
+import zlib
+from flask import request
+from app.instrumentation import current_stats
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只使用gzip
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+# 普通响应的最小压缩字节数，更小的响应压缩收益抵不过开销
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+# 压缩级别：gzip 1~9，brotli 0~11（动态响应用较低的级别，压缩率已接近而耗时少得多）
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'text/html', 'text/plain', 'text/css')
+
+def available_encodings():
+    """服务器支持的编码，按优先顺序"""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+def _compressor(encoding):
+    """返回 (压缩一块, 刷新, 结束) 三个函数"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31：带gzip头与校验
+    compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def compress(data, encoding):
+    """压缩完整的正文"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    process, _, finish = _compressor(encoding)
+    return process(data) + finish()
+
+def _compress_stream(chunks, encoding):
+    process, flush, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield process(chunk) + flush()
+        yield finish()
+    finally:
+        # 客户端提前断开时也要关闭原来的生成器（结束其请求上下文）
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+def _compress_response(response):
+    if (
+        response.status_code < 200 or response.status_code in (204, 304)
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    # 压缩与否取决于 Accept-Encoding，共享缓存需要区分
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        stats = current_stats()
+        start = time.perf_counter()
+        response.set_data(compress(data, encoding))
+        if stats is not None:
+            stats.add('compress', time.perf_counter() - start)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """为应用注册响应压缩（在请求统计之后注册，压缩耗时计入 Server-Timing）"""
+    if COMPRESS_ENABLED:
+        app.after_request(_compress_response)
@@ -0,0 +1,73 @@
+"""
+条件请求（ETag / If-None-Match）辅助函数
+
+集合的版本由 条目数 + max(updated_at) + 最新删除记录id 组成，需要一次索引聚合查询（条目多时数十毫秒），
+使用共享缓存后端时缓存在用户命名空间中（见 app.cache），条目的新增、修改、删除提交后失效
+（进程内缓存无法感知其他worker的写入，可能返回过期的304，此时每次都查询）；
+客户端携带的 If-None-Match 命中时直接返回304，跳过解密与序列化。
+"""
+
+import hashlib
+from flask import request, jsonify, current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+from app.cache import cache, invalidate_after_commit
+from app.models import Command, DeletedEntry, Password
+from app.serialization import stream_response
+
+def collection_version(model, user_id, entity):
+    """用户某个集合（密码/命令）的版本标识"""
+    if not cache.shared:
+        return _query_version(model, user_id, entity)
+    key = cache.user_key(user_id, f'version:{entity}')
+    return cache.cached('version', key, lambda: _query_version(model, user_id, entity))
+
+def _query_version(model, user_id, entity):
+    count, last_updated = db.session.query(
+        func.count(model.id), func.max(model.updated_at)
+    ).filter(model.user_id == user_id).one()
+    last_deleted = db.session.query(func.max(DeletedEntry.id)).filter(
+        DeletedEntry.user_id == user_id,
+        DeletedEntry.entity == entity
+    ).scalar()
+    return f'{count}:{last_updated.isoformat() if last_updated else ""}:{last_deleted or 0}'
+
+# 条目写入时记下所属用户，提交后使其集合版本失效（flush前读取，已删除条目的属性此时仍可加载）
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_collections(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Password, Command, DeletedEntry)) and obj.user_id is not None:
+            invalidate_after_commit(session, obj.user_id)
+
+def key_fingerprint(master_key):
+    """主密钥指纹：解密结果依赖主密钥，换密钥后旧的ETag必须失效"""
+    return hashlib.sha256((master_key or '').encode('utf-8')).hexdigest()[:16]
+
+def make_etag(*parts):
+    """由若干组成部分生成ETag值"""
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def not_modified(etag):
+    """请求的 If-None-Match 与 etag 匹配时返回304响应，否则返回None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    return _with_validators(response, etag)
+
+def etag_json(payload, etag, status=200):
+    """返回带弱ETag的JSON响应"""
+    response = jsonify(payload)
+    response.status_code = status
+    return _with_validators(response, etag)
+
+def etag_stream(fields, key, chunks, etag, trailer=None):
+    """返回带弱ETag的流式JSON响应（见 app.serialization.stream_json）"""
+    return _with_validators(stream_response(fields, key, chunks, trailer), etag)
+
+def _with_validators(response, etag):
+    response.set_etag(etag, weak=True)
+    # 私有数据：只允许浏览器缓存，且每次使用前必须重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
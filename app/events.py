@@ -0,0 +1,356 @@
+"""
+条目变动通知（Server-Sent Events）
+
+GET /api/events 为登录用户保持一条 text/event-stream 连接，推送其密码与命令的变动：
+
+    id: 42
+    event: change
+    data: {"entity":"password","id":7,"action":"upsert","version":"2026-10-18T08:00:00.123456"}
+
+action 为 upsert / delete；version 为条目写入后的 updated_at，与本地副本相同时说明本地已是最新。
+客户端据此修补本地状态（删除直接移除，新增/修改通过 /changes?since= 增量取回），不必重新下载整个列表。
+一次写入中同一类条目的变动超过 EVENTS_MAX_PER_FLUSH 条（导入、批量操作）时合并为一条 action=resync 的通知。
+
+产生与分发：
+- 条目经ORM新增、修改、删除时，flush 钩子把通知写入 change_events 表（发件箱），与条目在同一事务中提交，
+  回滚的写入不会产生通知；所有修改条目的处理函数（单条、批量、导入）都不需要各自发布
+- 每个进程有一个后台线程轮询发件箱，把本进程订阅用户的新事件交给各连接（进程内发布/订阅）；
+  其他worker写入的事件最多延迟 EVENTS_POLL_INTERVAL 秒，本进程提交的写入立即唤醒轮询线程。
+  分片模式下发件箱在用户的分片中，只轮询有订阅者的分片
+- 没有新事件时每 EVENTS_HEARTBEAT_INTERVAL 秒发送一行注释，防止代理断开空闲连接
+- 重连时带上 Last-Event-ID 重放此后的事件；事件已超出保留期（EVENTS_RETENTION）或超过 EVENTS_REPLAY_LIMIT 条时
+  改为发送 resync，由客户端做一次增量同步。没有 Last-Event-ID 时先发送 ready，其id即为当前位置
+- 连接保持 EVENTS_STREAM_TIMEOUT 秒后由服务器结束，客户端带着 Last-Event-ID 重连（同时重新校验令牌）
+
+认证与其他接口相同（Authorization 头）：浏览器的 EventSource 不能设置请求头，前端用 fetch 读取事件流，令牌不出现在URL中。
+事件id在每个数据库（分片）内递增；PostgreSQL 上并发事务的提交顺序可能与id顺序不同，极少数情况下会漏掉一条通知，
+客户端下一次增量同步（带回退窗口，见 app.sync）会补上。每个连接占用一个worker线程，应使用线程worker并相应调大并发数。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+from app import db
+from app.auth.routes import token_required
+from app.metrics import change_events, event_streams
+from app.models import ChangeEvent, Command, Password
+from app.shards import shard_name, sharding_enabled, use_shard_name
+
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'true').lower() == 'true'
+# 轮询发件箱的间隔（秒），即其他worker写入的最大通知延迟
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '1'))
+# 空闲连接的心跳间隔（秒）
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv('EVENTS_HEARTBEAT_INTERVAL', '15'))
+# 单个连接的最长时间（秒），到期后客户端自动重连
+EVENTS_STREAM_TIMEOUT = float(os.getenv('EVENTS_STREAM_TIMEOUT', '300'))
+# 建议客户端断线后的重连等待（毫秒）
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', '3000'))
+# 事件保留时间（秒），超出后无法重放
+EVENTS_RETENTION = int(os.getenv('EVENTS_RETENTION', str(24 * 3600)))
+# 重连时最多重放的事件数，更多时改为 resync
+EVENTS_REPLAY_LIMIT = int(os.getenv('EVENTS_REPLAY_LIMIT', '500'))
+# 一次flush中同一用户同一类条目的变动超过这个数时合并为一条 resync
+EVENTS_MAX_PER_FLUSH = int(os.getenv('EVENTS_MAX_PER_FLUSH', '50'))
+# 每个连接积压的事件上限（客户端读取太慢），超出时丢弃积压并发送 resync
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '1000'))
+
+# 每次轮询查询的事件数
+POLL_BATCH_SIZE = 500
+# 同一分片两次清理过期事件的最短间隔（秒）
+PRUNE_INTERVAL = 600
+# 轮询持续出错时，错误日志的最短间隔（秒）
+ERROR_LOG_INTERVAL = 60
+
+# 产生通知的模型与条目类型（与删除记录一致）
+ENTITIES = {
+    Password: 'password',
+    Command: 'command',
+}
+
+logger = logging.getLogger('pmer.events')
+
+def _current_shard(session):
+    return session.info.get('pmer_shard') if sharding_enabled() else None
+
+# ---- 发件箱：随条目写入记录通知 ----
+
+# 本进程各分片上次清理的时间
+_last_prune = {}
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changes(session, flush_context, instances):
+    if not EVENTS_ENABLED:
+        return
+    # 新增条目的id在flush之后才有，这里只记下对象；已删除条目在flush前读取所属用户与id
+    pending = []
+    for obj in session.new:
+        if type(obj) in ENTITIES:
+            pending.append((obj, 'upsert', None))
+    for obj in session.dirty:
+        if type(obj) in ENTITIES and session.is_modified(obj):
+            pending.append((obj, 'upsert', None))
+    for obj in session.deleted:
+        if type(obj) in ENTITIES:
+            pending.append((obj, 'delete', (obj.user_id, obj.id)))
+    session.info['pmer_change_events'] = pending
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    pending = session.info.pop('pmer_change_events', None)
+    if not pending:
+        return
+
+    now = datetime.utcnow()
+    grouped = defaultdict(list)
+    for obj, action, deleted in pending:
+        if deleted:
+            (user_id, entity_id), version = deleted, None
+        else:
+            user_id, entity_id, version = obj.user_id, obj.id, obj.updated_at
+        grouped[user_id, ENTITIES[type(obj)]].append({
+            'user_id': user_id, 'entity': ENTITIES[type(obj)], 'entity_id': entity_id,
+            'action': action, 'version': version, 'created_at': now
+        })
+
+    rows = []
+    for (user_id, entity), changes in grouped.items():
+        if len(changes) > EVENTS_MAX_PER_FLUSH:
+            changes = [{
+                'user_id': user_id, 'entity': entity, 'entity_id': None,
+                'action': 'resync', 'version': None, 'created_at': now
+            }]
+        rows.extend(changes)
+    session.execute(insert(ChangeEvent), rows)
+    session.info.setdefault('pmer_events_written', []).extend((row['entity'], row['action']) for row in rows)
+    _prune(session, now)
+
+def _prune(session, now):
+    """按时间清理过期事件（每个分片每 PRUNE_INTERVAL 秒最多一次，在写入的事务中执行）"""
+    shard = _current_shard(session)
+    if time.monotonic() - _last_prune.get(shard, 0) < PRUNE_INTERVAL:
+        return
+    _last_prune[shard] = time.monotonic()
+    session.execute(delete(ChangeEvent).where(ChangeEvent.created_at < now - timedelta(seconds=EVENTS_RETENTION)))
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    written = session.info.pop('pmer_events_written', None)
+    if written:
+        for entity, action in written:
+            change_events.inc(entity=entity, action=action)
+        feed.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('pmer_change_events', None)
+    session.info.pop('pmer_events_written', None)
+
+# ---- 进程内发布/订阅 ----
+
+class Subscription:
+    """一条SSE连接：轮询线程填入 position 之后的事件，连接的生成器取出发送"""
+
+    def __init__(self, user_id, shard, position):
+        self.user_id = user_id
+        self.shard = shard
+        self.position = position
+        self._pending = deque()
+        self._resync_id = None
+        self._condition = threading.Condition()
+
+    def publish(self, event_id, payload):
+        with self._condition:
+            if event_id <= self.position:
+                return
+            self.position = event_id
+            if len(self._pending) >= EVENTS_QUEUE_SIZE:
+                # 客户端读取太慢：丢弃积压，改为让客户端重新同步
+                self._pending.clear()
+                self._resync_id = event_id
+            else:
+                self._pending.append((event_id, payload))
+            self._condition.notify()
+
+    def take(self, timeout):
+        """等待新事件，返回 (resync的事件id或None, [(事件id, 内容)])；超时返回 (None, [])"""
+        with self._condition:
+            if not self._pending and self._resync_id is None:
+                self._condition.wait(timeout)
+            resync_id, events = self._resync_id, list(self._pending)
+            self._resync_id = None
+            self._pending.clear()
+            return resync_id, events
+
+class ChangeFeed:
+    """本进程的订阅登记，以及把发件箱中的新事件分发给订阅者的轮询线程"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """清空订阅（派生子进程后调用：轮询线程与父进程的连接都不属于子进程）"""
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._wake = threading.Event()
+        self._thread = None
+        self._app = None
+        self._last_error_log = 0.0
+
+    def subscribe(self, user_id, position):
+        """登记订阅，轮询线程随后推送 position 之后的事件（包括重连时需要重放的部分）"""
+        subscription = Subscription(user_id, shard_name(user_id) if sharding_enabled() else None, position)
+        with self._lock:
+            self._subscriptions[subscription.shard].add(subscription)
+            self._app = current_app._get_current_object()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pmer-events', daemon=True)
+                self._thread.start()
+        event_streams.inc()
+        self.wake()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.shard)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.shard]
+        event_streams.dec()
+
+    def wake(self):
+        """立即轮询一次（本进程提交了写入或有新订阅）"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(EVENTS_POLL_INTERVAL)
+            self._wake.clear()
+            with self._lock:
+                shards = {shard: list(subscriptions) for shard, subscriptions in self._subscriptions.items()}
+                app = self._app
+            if not shards:
+                continue
+            with app.app_context():
+                try:
+                    for shard, subscriptions in shards.items():
+                        self._poll(shard, subscriptions)
+                except Exception:
+                    db.session.rollback()
+                    now = time.monotonic()
+                    if now - self._last_error_log >= ERROR_LOG_INTERVAL:
+                        self._last_error_log = now
+                        logger.warning('轮询变动通知失败，稍后重试', exc_info=True)
+                finally:
+                    # 结束读事务，下一轮才能看到新提交的事件
+                    db.session.remove()
+
+    def _poll(self, shard, subscriptions):
+        if shard is not None:
+            use_shard_name(shard)
+        by_user = defaultdict(list)
+        for subscription in subscriptions:
+            by_user[subscription.user_id].append(subscription)
+        after = min(subscription.position for subscription in subscriptions)
+
+        while True:
+            rows = db.session.execute(
+                select(ChangeEvent).where(
+                    ChangeEvent.id > after,
+                    ChangeEvent.user_id.in_(list(by_user))
+                ).order_by(ChangeEvent.id).limit(POLL_BATCH_SIZE)
+            ).scalars().all()
+            for row in rows:
+                payload = row.to_dict()
+                for subscription in by_user[row.user_id]:
+                    subscription.publish(row.id, payload)
+            if len(rows) < POLL_BATCH_SIZE:
+                return
+            after = rows[-1].id
+
+feed = ChangeFeed()
+
+# 预派生模型中子进程不继承父进程的订阅与轮询线程
+os.register_at_fork(after_in_child=feed.reset)
+
+# ---- SSE 端点 ----
+
+events_bp = Blueprint('events', __name__)
+
+def _format_event(event_id, name, data):
+    return f'id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+def _can_replay(user_id, last_event_id, latest):
+    """last_event_id 之后的事件是否都还在发件箱中，且不超过重放上限"""
+    if last_event_id > latest:
+        # 来自另一个数据库（如重新分片之后）的事件id
+        return False
+    oldest = db.session.scalar(select(func.min(ChangeEvent.id)))
+    if oldest is not None and oldest > last_event_id + 1:
+        # 紧随其后的事件可能已被清理
+        return False
+    missed = db.session.scalar(select(func.count()).select_from(
+        select(ChangeEvent.id).where(
+            ChangeEvent.user_id == user_id, ChangeEvent.id > last_event_id
+        ).limit(EVENTS_REPLAY_LIMIT + 1).subquery()
+    ))
+    return missed <= EVENTS_REPLAY_LIMIT
+
+def _stream(subscription, prelude):
+    """事件流的生成器（不持有请求上下文与数据库会话，事件由轮询线程填入）"""
+    deadline = time.monotonic() + EVENTS_STREAM_TIMEOUT
+    try:
+        yield prelude
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            resync_id, events = subscription.take(min(EVENTS_HEARTBEAT_INTERVAL, remaining))
+            if resync_id is None and not events:
+                yield ': heartbeat\n\n'
+                continue
+            chunks = [_format_event(resync_id, 'resync', {})] if resync_id is not None else []
+            chunks.extend(_format_event(event_id, 'change', payload) for event_id, payload in events)
+            yield ''.join(chunks)
+    finally:
+        feed.unsubscribe(subscription)
+
+@events_bp.route('/api/events', methods=['GET'])
+@token_required
+def stream_events(current_user, master_key):
+    """当前用户的条目变动通知（text/event-stream）"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'message': '无效的 Last-Event-ID'}), 400
+
+    latest = db.session.scalar(select(func.max(ChangeEvent.id))) or 0
+    prelude = f'retry: {EVENTS_RETRY_MS}\n\n'
+    if last_event_id is None:
+        position = latest
+        prelude += _format_event(latest, 'ready', {})
+    elif _can_replay(current_user.id, last_event_id, latest):
+        position = last_event_id
+    else:
+        position = latest
+        prelude += _format_event(latest, 'resync', {})
+
+    subscription = feed.subscribe(current_user.id, position)
+    response = Response(_stream(subscription, prelude), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 反向代理（nginx）不缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def init_events(app):
+    """注册变动通知端点（EVENTS_ENABLED=false 时不注册，也不记录通知）"""
+    if EVENTS_ENABLED:
+        app.register_blueprint(events_bp)
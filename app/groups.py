@@ -0,0 +1,125 @@
+"""
+条目分组计数（密码分类 / 命令类型）
+
+entry_groups 表按 (用户, 条目类型, 分组名) 保存条目数和最近变动时间，
+分类侧栏读取这张小表即可得到每个分组的条目数，不需要读取或解密整个密码库。
+
+计数随条目写入同步维护：flush 前根据会话中新增、删除以及修改了分组字段的条目算出各分组的增量，
+以 upsert（count = count + 增量）写入，与条目本身在同一事务中提交或回滚；
+增量在数据库中累加，并发写入同一分组也不会丢失更新。
+绕过ORM直接执行 INSERT/DELETE 的代码（如基准测试的批量生成）需要之后调用 rebuild_groups()。
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import delete, event, func, insert, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models import Command, EntryGroup, Password
+
+# 参与分组计数的模型：条目类型（与删除记录一致）与分组字段
+GROUPED_MODELS = {
+    Password: ('password', 'category'),
+    Command: ('command', 'command_type'),
+}
+
+def group_summary(user_id, entity):
+    """
+    用户某类条目的分组列表（按名称排序，不含未分组）与条目总数（含未分组）
+    返回 (分组列表, 总数)，分组为 EntryGroup
+    """
+    groups = EntryGroup.query.filter(
+        EntryGroup.user_id == user_id,
+        EntryGroup.entity == entity,
+        EntryGroup.count > 0
+    ).order_by(EntryGroup.name).all()
+    total = sum(group.count for group in groups)
+    return [group for group in groups if group.name], total
+
+def summary_version(groups, total):
+    """分组列表的版本标识（用于ETag），直接由结果计算，不再聚合条目表"""
+    return f'{total}|' + '|'.join(
+        f'{group.name}:{group.count}:{group.last_updated.isoformat() if group.last_updated else ""}'
+        for group in groups
+    )
+
+def rebuild_groups(connection, user_id=None):
+    """
+    按条目表重新统计分组（一次 GROUP BY），user_id 为空时统计所有用户
+    connection 可以是连接或会话，在调用方的事务中执行
+    """
+    for model, (entity, field) in GROUPED_MODELS.items():
+        name = func.coalesce(getattr(model, field), '')
+        totals = select(
+            model.user_id, literal(entity), name, func.count(), func.max(model.updated_at)
+        ).group_by(model.user_id, name)
+        stale = delete(EntryGroup).where(EntryGroup.entity == entity)
+        if user_id is not None:
+            totals = totals.where(model.user_id == user_id)
+            stale = stale.where(EntryGroup.user_id == user_id)
+        connection.execute(stale)
+        connection.execute(insert(EntryGroup).from_select(
+            ['user_id', 'entity', 'name', 'count', 'last_updated'], totals
+        ))
+
+def _committed_name(state, field):
+    """条目修改前的分组名（修改分组字段时旧值总会被加载，见下方的 active_history）"""
+    attribute = state.attrs[field]
+    history = attribute.history
+    if history.added:
+        # 原值为 None 时 deleted 为空
+        return history.deleted[0] if history.deleted else None
+    # 未修改：当前值即已提交的值（已过期时从数据库加载）
+    return attribute.value
+
+def _group_key(obj, name):
+    entity, _ = GROUPED_MODELS[type(obj)]
+    return obj.user_id, entity, name or ''
+
+def _upsert(session):
+    dialect = session.get_bind(mapper=EntryGroup.__mapper__).dialect.name
+    statement = (postgresql_insert if dialect == 'postgresql' else sqlite_insert)(EntryGroup)
+    return statement.on_conflict_do_update(
+        index_elements=['user_id', 'entity', 'name'],
+        set_={
+            'count': EntryGroup.count + statement.excluded.count,
+            'last_updated': statement.excluded.last_updated
+        }
+    )
+
+@event.listens_for(Session, 'before_flush')
+def _count_group_changes(session, flush_context, instances):
+    # 增量为0的分组只更新最近变动时间
+    deltas = defaultdict(int)
+    for obj in session.new:
+        if type(obj) in GROUPED_MODELS:
+            deltas[_group_key(obj, getattr(obj, GROUPED_MODELS[type(obj)][1]))] += 1
+    for obj in session.deleted:
+        if type(obj) in GROUPED_MODELS:
+            deltas[_group_key(obj, _committed_name(inspect(obj), GROUPED_MODELS[type(obj)][1]))] -= 1
+    for obj in session.dirty:
+        if type(obj) not in GROUPED_MODELS or not session.is_modified(obj):
+            continue
+        field = GROUPED_MODELS[type(obj)][1]
+        old_key = _group_key(obj, _committed_name(inspect(obj), field))
+        new_key = _group_key(obj, getattr(obj, field))
+        deltas[old_key] -= 1
+        deltas[new_key] += 1
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    session.execute(_upsert(session), [
+        {'user_id': user_id, 'entity': entity, 'name': name, 'count': delta, 'last_updated': now}
+        for (user_id, entity, name), delta in deltas.items()
+    ])
+    emptied = {(user_id, entity) for (user_id, entity, _), delta in deltas.items() if delta < 0}
+    for user_id, entity in emptied:
+        session.execute(delete(EntryGroup).where(
+            EntryGroup.user_id == user_id, EntryGroup.entity == entity, EntryGroup.count <= 0
+        ))
+
+# 修改分组字段时加载旧值：条目过期（如提交之后）再赋值，也能得到正确的修改历史
+for _model, (_, _field) in GROUPED_MODELS.items():
+    event.listen(getattr(_model, _field), 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
@@ -0,0 +1,150 @@
+"""
+请求级性能统计
+
+每个请求记录：SQL条数与耗时、密钥派生耗时、加解密条数与耗时、JSON序列化与响应压缩耗时。
+结果通过 Server-Timing 响应头返回（浏览器开发者工具可直接查看），并输出一行JSON格式的日志；
+单个请求的SQL条数超过 QUERY_COUNT_WARNING 时记录警告，附上重复最多的语句，便于发现N+1查询。
+
+只统计请求线程中的调用；后台线程（重新加密、格式迁移等）没有请求上下文，不做记录。
+"""
+
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.serialization import JSONProvider
+
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'true').lower() == 'true'
+# 是否为每个请求输出一行统计日志
+REQUEST_LOG_ENABLED = os.getenv('REQUEST_LOG_ENABLED', 'true').lower() == 'true'
+# 单个请求的SQL条数超过该值时记录警告
+QUERY_COUNT_WARNING = int(os.getenv('QUERY_COUNT_WARNING', '30'))
+
+# Server-Timing 中的各项：数据库、密钥派生、解密、加密、JSON序列化、响应压缩
+TIMING_METRICS = ('db', 'kdf', 'decrypt', 'encrypt', 'serialize', 'compress')
+# 只记录耗时、不记录次数的项
+UNCOUNTED_METRICS = ('serialize', 'compress')
+
+request_logger = logging.getLogger('pmer.request')
+
+class RequestStats:
+    """一个请求内累计的耗时（秒）与次数"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.statements = Counter()
+
+    def add(self, metric, duration, count=1):
+        self.durations[metric] += duration
+        self.counts[metric] += count
+
+    def to_dict(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            **{f'{metric}_ms': round(self.durations[metric] * 1000, 2) for metric in TIMING_METRICS},
+            **{f'{metric}_count': self.counts[metric] for metric in TIMING_METRICS if metric not in UNCOUNTED_METRICS}
+        }
+
+def current_stats():
+    """当前请求的统计对象；不在请求中或未启用时返回None"""
+    if not has_request_context():
+        return None
+    return g.get('pmer_stats')
+
+def instrumented(metric, count=None):
+    """
+    统计被装饰函数的耗时，计入当前请求的 metric 项
+    count(result) 返回本次调用处理的条数，默认为1
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            stats = current_stats()
+            if stats is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            stats.add(metric, time.perf_counter() - start, count(result) if count else 1)
+            return result
+        return wrapper
+    return decorator
+
+class InstrumentedJSONProvider(JSONProvider):
+    """统计 jsonify 序列化耗时的JSON提供者"""
+
+    def encode(self, obj, indent=False):
+        stats = current_stats()
+        if stats is None:
+            return super().encode(obj, indent)
+        start = time.perf_counter()
+        result = super().encode(obj, indent)
+        stats.add('serialize', time.perf_counter() - start)
+        return result
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('pmer_query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    starts = conn.info.get('pmer_query_start')
+    if stats is None or not starts:
+        return
+    stats.add('db', time.perf_counter() - starts.pop())
+    stats.statements[statement] += 1
+
+def _start_request():
+    g.pmer_stats = RequestStats()
+
+def _finish_request(response):
+    stats = g.pop('pmer_stats', None)
+    if stats is None:
+        return response
+
+    summary = stats.to_dict()
+    timings = [
+        f'{metric};dur={summary[f"{metric}_ms"]}'
+        + (f';desc="{stats.counts[metric]}"' if metric not in UNCOUNTED_METRICS else '')
+        for metric in TIMING_METRICS if stats.counts[metric]
+    ]
+    timings.append(f'total;dur={summary["total_ms"]}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+
+    request_logger.info('%s', json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        **summary
+    }, ensure_ascii=False))
+
+    if stats.counts['db'] > QUERY_COUNT_WARNING:
+        statement, repeated = stats.statements.most_common(1)[0]
+        request_logger.warning(
+            '%s %s 执行了 %s 条SQL（可能存在N+1查询），重复最多的语句执行了 %s 次: %s',
+            request.method, request.path, stats.counts['db'], repeated, ' '.join(statement.split())[:200]
+        )
+    return response
+
+def init_instrumentation(app):
+    """为应用注册请求统计"""
+    if not INSTRUMENTATION_ENABLED:
+        return
+    app.json = InstrumentedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if REQUEST_LOG_ENABLED and not request_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
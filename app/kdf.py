@@ -0,0 +1,122 @@
+"""
+密钥派生（KDF）子系统
+
+- 主密钥派生参数按用户存储（算法 + JSON参数），便于以后升级到更强的算法/更高的成本
+- 登录口令哈希在参数过期时于登录成功后透明重算
+- 所有昂贵的派生都经过一个有界线程池执行，超出并发和排队上限时直接拒绝（429）
+"""
+
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash
+from app.instrumentation import instrumented
+from app.metrics import kdf_duration, kdf_rejections
+
+# 旧用户（未记录参数）使用的派生参数，必须与历史实现保持一致，否则无法解密已有数据
+LEGACY_KDF_ALGORITHM = 'pbkdf2_sha256'
+LEGACY_KDF_PARAMS = {'iterations': 100000}
+
+# 新用户默认的主密钥派生参数
+KDF_ALGORITHM = os.getenv('KDF_ALGORITHM', LEGACY_KDF_ALGORITHM)
+KDF_ITERATIONS = int(os.getenv('KDF_ITERATIONS', '100000'))
+KDF_SCRYPT_N = int(os.getenv('KDF_SCRYPT_N', str(2 ** 15)))
+KDF_SCRYPT_R = int(os.getenv('KDF_SCRYPT_R', '8'))
+KDF_SCRYPT_P = int(os.getenv('KDF_SCRYPT_P', '1'))
+
+# 登录口令哈希方法（werkzeug格式，如 scrypt / pbkdf2:sha256:600000）
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+
+# 并发派生上限、排队上限，以及拒绝时建议客户端等待的秒数
+KDF_MAX_CONCURRENCY = int(os.getenv('KDF_MAX_CONCURRENCY', str(os.cpu_count() or 1)))
+KDF_MAX_QUEUE = int(os.getenv('KDF_MAX_QUEUE', str(KDF_MAX_CONCURRENCY * 2)))
+KDF_RETRY_AFTER = int(os.getenv('KDF_RETRY_AFTER', '1'))
+
+class KdfBusyError(Exception):
+    """密钥派生并发已满，请求应以429拒绝"""
+
+    def __init__(self, retry_after=KDF_RETRY_AFTER):
+        super().__init__('密钥派生繁忙')
+        self.retry_after = retry_after
+
+def _pbkdf2_sha256(password, salt, params):
+    return hashlib.pbkdf2_hmac(
+        'sha256',
+        password.encode(),
+        salt.encode(),
+        params['iterations']
+    ).hex()
+
+def _scrypt(password, salt, params):
+    n, r, p = params['n'], params['r'], params['p']
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt.encode(),
+        n=n, r=r, p=p,
+        maxmem=256 * n * r * p,
+        dklen=32
+    ).hex()
+
+ALGORITHMS = {
+    'pbkdf2_sha256': _pbkdf2_sha256,
+    'scrypt': _scrypt,
+}
+
+def default_kdf():
+    """返回新用户使用的 (算法, 参数)"""
+    if KDF_ALGORITHM == 'scrypt':
+        return 'scrypt', {'n': KDF_SCRYPT_N, 'r': KDF_SCRYPT_R, 'p': KDF_SCRYPT_P}
+    return 'pbkdf2_sha256', {'iterations': KDF_ITERATIONS}
+
+def load_kdf(algorithm, params_json):
+    """从用户记录中的字段解析派生参数，未记录时返回历史默认值"""
+    if not algorithm:
+        return LEGACY_KDF_ALGORITHM, dict(LEGACY_KDF_PARAMS)
+    return algorithm, json.loads(params_json) if params_json else {}
+
+def derive_key(password, salt, algorithm, params):
+    """按指定算法派生主密钥（十六进制字符串），在当前线程同步执行"""
+    try:
+        fn = ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError(f'不支持的密钥派生算法: {algorithm}')
+    return fn(password, salt, params)
+
+@functools.lru_cache(maxsize=None)
+def password_hash_prefix(method):
+    """werkzeug哈希串中 '$' 之前的方法描述（补全默认成本参数后的形式）"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+def password_hash_outdated(password_hash):
+    """登录口令哈希是否使用了与当前配置不同的方法或成本"""
+    return password_hash.split('$', 1)[0] != password_hash_prefix(PASSWORD_HASH_METHOD)
+
+_executor = ThreadPoolExecutor(max_workers=KDF_MAX_CONCURRENCY, thread_name_prefix='pmer-kdf')
+# 正在执行与排队中的派生总数上限，超过即拒绝，避免无限排队
+_admission = threading.BoundedSemaphore(KDF_MAX_CONCURRENCY + KDF_MAX_QUEUE)
+
+@instrumented('kdf')
+def run_bounded(fn, *args):
+    """
+    在有界的KDF线程池中执行昂贵的派生/哈希计算并等待结果
+    并发和排队都已满时抛出 KdfBusyError
+    """
+    if not _admission.acquire(blocking=False):
+        kdf_rejections.inc()
+        raise KdfBusyError()
+    try:
+        return _executor.submit(_timed, fn, *args).result()
+    finally:
+        _admission.release()
+
+def _timed(fn, *args):
+    """在KDF线程中执行并记录计算耗时（不含排队等待）"""
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        kdf_duration.observe(time.perf_counter() - start, operation=fn.__name__)
@@ -0,0 +1,459 @@
+"""
+运行指标（Prometheus 文本格式）
+
+进程内的指标注册表，支持计数器、仪表和固定分桶的直方图，多线程安全。
+通过 /metrics 以 Prometheus 文本格式导出：各蓝图路由的请求数与延迟、状态码、
+登录与密钥派生耗时、解密失败次数、缓存命中情况、变动通知与SSE连接数，
+以及用户数与密码库大小分布（只在设置了 METRICS_TOKEN 时导出，按 METRICS_VAULT_STATS_TTL 缓存）。
+
+多进程部署（gunicorn 等预派生模型）时设置 METRICS_DIR：每个进程定期把自己的数值快照
+写入该目录下的独立文件，/metrics 读取全部文件后合并。计数器与直方图累加所有进程
+（包括已退出的进程，保证计数单调）；仪表只累加仍存活的进程。
+其他进程的数值最多滞后 METRICS_FLUSH_INTERVAL 秒；重新部署前应清空该目录。
+"""
+
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Blueprint, Response, g, jsonify, request
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# 设置后 /metrics 要求 Authorization: Bearer <METRICS_TOKEN>；未设置时不导出用户数与密码库大小
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# 用户数与密码库大小的统计结果缓存的秒数
+METRICS_VAULT_STATS_TTL = float(os.getenv('METRICS_VAULT_STATS_TTL', '60'))
+# 多进程共享的快照目录；为空时只导出当前进程的数值
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+# 每个进程写入快照的最短间隔（秒）
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# 请求延迟与密钥派生耗时的分桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+KDF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8)
+# 每个用户密码条目数的分桶上限
+VAULT_SIZE_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """指标基类：按标签值元组保存数值"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+            # 没有标签的指标从0开始导出，而不是在第一次发生前缺失
+            if not self.labelnames:
+                self._values[()] = self._zero()
+
+    def _zero(self):
+        return 0
+
+    def snapshot(self):
+        """[(标签值元组, 数值)] 的副本，用于写入快照文件与导出"""
+        with self._lock:
+            return [(key, self._copy(value)) for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(current, value):
+        return current + value
+
+    def render(self, samples):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in sorted(samples.items()):
+            lines.append(f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}')
+        return lines
+
+class Counter(Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    """
+    固定分桶的直方图
+    每组标签保存 [各桶计数..., 总和, 总数]，桶计数不累计，导出时再转换为累计值
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _zero(self):
+        return [0] * (len(self.buckets) + 3)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = self._zero()
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    @staticmethod
+    def merge(current, value):
+        return [a + b for a, b in zip(current, value)]
+
+    def render(self, samples):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, data in sorted(samples.items()):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data[:-2]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", _format_value(float(bound)))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {_format_value(float(data[-2]))}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {data[-1]}')
+        return lines
+
+class Registry:
+    """指标注册表，负责多进程快照的写入与合并"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._path = None
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """注册抓取时调用的函数，返回 [(指标, {标签值元组: 数值})]；结果不写入快照"""
+        self._collectors.append(collector)
+        return collector
+
+    def reset(self):
+        """清空本进程的数值（派生子进程后调用，避免重复计入父进程的数值）"""
+        for metric in self._metrics.values():
+            metric.reset()
+        self._path = None
+        self._last_flush = 0.0
+
+    def _snapshot_path(self):
+        if self._path is None:
+            # 文件名带上启动时间，pid被复用时不会覆盖已退出进程的计数
+            self._path = os.path.join(METRICS_DIR, f'pmer_{os.getpid()}_{time.time_ns()}.json')
+        return self._path
+
+    def flush(self, force=False):
+        """把本进程的数值写入快照文件（未配置 METRICS_DIR 时不做任何事）"""
+        if not METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < METRICS_FLUSH_INTERVAL:
+            return
+        if not self._lock.acquire(blocking=force):
+            # 其他线程正在写入
+            return
+        try:
+            self._last_flush = now
+            data = {
+                'pid': os.getpid(),
+                'metrics': {name: metric.snapshot() for name, metric in self._metrics.items()}
+            }
+            path = self._snapshot_path()
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        finally:
+            self._lock.release()
+
+    def _load_snapshots(self):
+        """读取所有进程的快照；本进程直接使用内存中的数值"""
+        if not METRICS_DIR:
+            yield True, {name: metric.snapshot() for name, metric in self._metrics.items()}
+            return
+
+        self.flush(force=True)
+        own_path = self._snapshot_path()
+        for path in glob.glob(os.path.join(METRICS_DIR, 'pmer_*.json')):
+            if path == own_path:
+                yield True, {name: metric.snapshot() for name, metric in self._metrics.items()}
+                continue
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # 正在被替换或已被清理
+                continue
+            yield _process_alive(data.get('pid')), data.get('metrics', {})
+
+    def collect(self):
+        """合并所有进程的数值，返回 [(指标, {标签值元组: 数值})]"""
+        merged = {name: {} for name in self._metrics}
+        for alive, snapshot in self._load_snapshots():
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                # 已退出进程的仪表值（如进行中的请求数）已无意义
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                values = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    values[key] = metric.merge(values[key], value) if key in values else value
+
+        results = [(self._metrics[name], values) for name, values in merged.items()]
+        for collector in self._collectors:
+            results.extend(collector())
+        return results
+
+    def render(self):
+        lines = []
+        for metric, samples in self.collect():
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'pmer_http_requests_total', '按路由与状态码统计的请求数',
+    ('blueprint', 'route', 'method', 'status')
+)
+http_request_duration = registry.histogram(
+    'pmer_http_request_duration_seconds', '按路由统计的请求处理耗时（秒）',
+    ('blueprint', 'route', 'method')
+)
+http_requests_in_progress = registry.gauge(
+    'pmer_http_requests_in_progress', '正在处理的请求数', ('blueprint',)
+)
+login_duration = registry.histogram(
+    'pmer_login_duration_seconds', '登录各步骤的耗时（秒）', ('step', 'outcome'), buckets=KDF_BUCKETS
+)
+kdf_duration = registry.histogram(
+    'pmer_kdf_duration_seconds', '密钥派生与口令哈希的计算耗时（秒），不含排队', ('operation',), buckets=KDF_BUCKETS
+)
+kdf_rejections = registry.counter(
+    'pmer_kdf_rejections_total', '因密钥派生并发已满而拒绝（429）的次数'
+)
+decrypt_failures = registry.counter(
+    'pmer_decrypt_failures_total', '解密失败的条目数', ('reason',)
+)
+cache_requests = registry.counter(
+    'pmer_cache_requests_total', '按命名空间统计的缓存查询次数（result: hit / miss）', ('namespace', 'result')
+)
+cache_errors = registry.counter(
+    'pmer_cache_errors_total', '缓存后端出错（按未命中处理）的次数', ('operation',)
+)
+change_events = registry.counter(
+    'pmer_change_events_total', '记录的条目变动通知数', ('entity', 'action')
+)
+event_streams = registry.gauge(
+    'pmer_event_streams', '打开的变动通知（SSE）连接数'
+)
+
+# 登录相关的端点及其在 pmer_login_duration_seconds 中的步骤名
+LOGIN_ENDPOINTS = {'auth.login': 'password', 'auth.verify_2fa': 'totp'}
+
+def _login_outcome(status):
+    if status < 300:
+        return 'success'
+    if status == 429:
+        return 'busy'
+    if status in (400, 401, 403):
+        return 'rejected'
+    return 'error'
+
+_vault_stats = {'expires': 0.0, 'samples': []}
+_vault_stats_lock = threading.Lock()
+
+@registry.add_collector
+def _collect_vault_sizes():
+    """
+    用户数、条目总数与每个用户的条目数分布（所有进程共享同一个库，无需合并）
+    未设置 METRICS_TOKEN 时不导出：任何人都能读取 /metrics
+    """
+    if not METRICS_TOKEN:
+        return []
+    with _vault_stats_lock:
+        if time.monotonic() >= _vault_stats['expires']:
+            _vault_stats['samples'] = _count_vault_sizes()
+            _vault_stats['expires'] = time.monotonic() + METRICS_VAULT_STATS_TTL
+        return _vault_stats['samples']
+
+def _count_vault_sizes():
+    """从分组计数表（entry_groups，见 app.groups）统计，查询量与分组数成正比，不扫描条目表"""
+    from sqlalchemy import func, select
+    from app import db
+    from app.models import User, EntryGroup
+    from app.shards import all_shards, sharding_enabled, use_shard_name
+
+    users = Gauge('pmer_users', '用户数')
+    entries = Gauge('pmer_vault_entries', '按类型统计的条目总数', ('kind',))
+    vault_size = Histogram(
+        'pmer_vault_size_entries', '每个用户的密码条目数分布', buckets=VAULT_SIZE_BUCKETS
+    )
+
+    user_count = db.session.scalar(select(func.count(User.id))) or 0
+    users.set(user_count)
+    counts = []
+    command_count = 0
+    # 分片模式下逐个分片统计
+    for shard in all_shards() if sharding_enabled() else [None]:
+        if shard is not None:
+            use_shard_name(shard)
+        counts += db.session.execute(
+            select(EntryGroup.user_id, func.sum(EntryGroup.count))
+            .where(EntryGroup.entity == 'password', EntryGroup.count > 0)
+            .group_by(EntryGroup.user_id)
+        ).all()
+        command_count += db.session.scalar(
+            select(func.sum(EntryGroup.count)).where(EntryGroup.entity == 'command')
+        ) or 0
+    entries.set(sum(count for _, count in counts), kind='password')
+    entries.set(command_count, kind='command')
+    for _, count in counts:
+        vault_size.observe(count)
+    # 没有任何条目的用户
+    for _ in range(user_count - len(counts)):
+        vault_size.observe(0)
+
+    return [(metric, dict(metric.snapshot())) for metric in (users, entries, vault_size)]
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def export_metrics():
+    """Prometheus 抓取端点"""
+    if METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(header.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return jsonify({'message': '缺少或无效的指标令牌'}), 401
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+def _route_labels():
+    rule = request.url_rule
+    return request.blueprint or '', rule.rule if rule else 'unmatched', request.method
+
+def _start_request():
+    g.pmer_metrics_start = time.perf_counter()
+    http_requests_in_progress.inc(blueprint=request.blueprint or '')
+
+def _record_status(response):
+    g.pmer_metrics_status = response.status_code
+    return response
+
+def _finish_request(exc):
+    start = g.pop('pmer_metrics_start', None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+    # 未处理的异常不会经过 after_request
+    status = g.pop('pmer_metrics_status', 500)
+    blueprint, route, method = _route_labels()
+
+    http_requests_in_progress.dec(blueprint=blueprint)
+    http_requests.inc(blueprint=blueprint, route=route, method=method, status=status)
+    http_request_duration.observe(duration, blueprint=blueprint, route=route, method=method)
+    step = LOGIN_ENDPOINTS.get(request.endpoint)
+    if step:
+        login_duration.observe(duration, step=step, outcome=_login_outcome(status))
+
+    registry.flush()
+
+def init_metrics(app):
+    """注册请求指标与 /metrics 端点"""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+    app.register_blueprint(metrics_bp)
+
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        atexit.register(registry.flush, force=True)
+
+# 预派生模型中子进程从父进程继承的数值不属于自己
+os.register_at_fork(after_in_child=registry.reset)
@@ -1,6 +1,8 @@
 from datetime import datetime
+from sqlalchemy import insert_sentinel
 from app import db
-import hashlib
+from app import kdf
+from app.ciphertext import FernetToken
 import os
 import json
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -15,6 +17,9 @@ class User(db.Model):
     salt = db.Column(db.String(64), nullable=False)
     two_factor_secret = db.Column(db.String(128))  # 2FA密钥
     two_factor_enabled = db.Column(db.Boolean, default=False)  # 是否启用2FA
+    kdf_algorithm = db.Column(db.String(32))  # 主密钥派生算法，为空表示历史默认（PBKDF2-SHA256, 100000轮）
+    kdf_params = db.Column(db.Text)  # 主密钥派生参数（JSON）
+    key_version = db.Column(db.Integer, default=0)  # 主密钥版本，修改密码时递增，旧令牌随之失效
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -22,32 +27,70 @@ class User(db.Model):
     passwords = db.relationship('Password', backref='owner', lazy='dynamic', cascade='all, delete-orphan')
     # 关联命令条目
     commands = db.relationship('Command', backref='owner', lazy='dynamic', cascade='all, delete-orphan')
+    # 关联删除记录（增量同步用）
+    deleted_entries = db.relationship('DeletedEntry', lazy='dynamic', cascade='all, delete-orphan')
+    # 关联重新加密任务
+    rekey_jobs = db.relationship('RekeyJob', lazy='dynamic', cascade='all, delete-orphan')
+    # 关联盲索引令牌（搜索用）
+    search_tokens = db.relationship('PasswordSearchToken', lazy='dynamic', cascade='all, delete-orphan')
+    # 关联分组计数（分类/命令类型）
+    entry_groups = db.relationship('EntryGroup', lazy='dynamic', cascade='all, delete-orphan')
+    # 关联变动通知（/api/events）
+    change_events = db.relationship('ChangeEvent', lazy='dynamic', cascade='all, delete-orphan')
     
     def __init__(self, username, email, password):
         self.username = username
         self.email = email
         self.salt = os.urandom(16).hex()
+        # 新用户使用当前配置的主密钥派生参数
+        self.upgrade_kdf()
+        self.key_version = 0
         self.set_password(password)
     
     def set_password(self, password):
         """设置密码哈希"""
-        self.password_hash = generate_password_hash(password + self.salt)
+        self.password_hash = kdf.run_bounded(
+            generate_password_hash, password + self.salt, kdf.PASSWORD_HASH_METHOD
+        )
     
     def check_password(self, password):
         """验证密码"""
-        return check_password_hash(self.password_hash, password + self.salt)
+        return kdf.run_bounded(check_password_hash, self.password_hash, password + self.salt)
+
+    def rehash_password_if_needed(self, password):
+        """
+        登录成功后调用：口令哈希的方法或成本已过期时用当前配置重新计算
+        返回是否发生了重算（调用方负责提交）
+        """
+        if not kdf.password_hash_outdated(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
     
+    def upgrade_kdf(self):
+        """
+        把主密钥派生参数换成当前默认值
+        只能在密码库随后会被重新加密时调用（修改密码），否则已有数据将无法解密
+        """
+        algorithm, params = kdf.default_kdf()
+        self.kdf_algorithm = algorithm
+        self.kdf_params = json.dumps(params)
+
     def generate_master_key(self, password):
-        """从用户密码派生主密钥"""
-        # 使用PBKDF2派生密钥
-        key = hashlib.pbkdf2_hmac(
-            'sha256', 
-            password.encode(), 
-            self.salt.encode(), 
-            100000  # 迭代次数
-        ).hex()
-        return key
+        """从用户密码派生主密钥（按用户记录的派生参数）"""
+        algorithm, params = kdf.load_kdf(self.kdf_algorithm, self.kdf_params)
+        return kdf.run_bounded(kdf.derive_key, password, self.salt, algorithm, params)
     
+    def kdf_info(self):
+        """客户端自行派生主密钥所需的参数（客户端解密模式），盐不是机密"""
+        algorithm, params = kdf.load_kdf(self.kdf_algorithm, self.kdf_params)
+        return {
+            'algorithm': algorithm,
+            'params': params,
+            'salt': self.salt,
+            'key_version': self.key_version or 0
+        }
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -60,9 +103,20 @@ class User(db.Model):
 
 class Password(db.Model):
     __tablename__ = 'passwords'
+    __table_args__ = (
+        # 分页与分类筛选使用的复合索引：WHERE user_id=? [AND category=?] AND id>? ORDER BY id
+        db.Index('ix_passwords_user_category_id', 'user_id', 'category', 'id'),
+        db.Index('ix_passwords_user_id_id', 'user_id', 'id'),
+        # 增量同步：WHERE user_id=? AND updated_at>=?
+        db.Index('ix_passwords_user_updated', 'user_id', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    encrypted_data = db.Column(db.Text, nullable=False)  # 加密的JSON数据（包含title, url, username, password, notes）
+    # 加密的摘要（title, url, username），列表只解密这一列
+    # encrypted_secret 为空的旧格式条目在这一列中包含全部字段，由后台迁移逐步拆分
+    # 两列都以原始字节保存Fernet令牌（见 app.ciphertext），明文为 crypto.pack_record 的紧凑记录
+    encrypted_data = db.Column(FernetToken, nullable=False)
+    encrypted_secret = db.Column(FernetToken)  # 加密的机密（password, notes），查看详情时才解密
     category = db.Column(db.String(64))  # 明文分类，用于筛选
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -70,8 +124,13 @@ class Password(db.Model):
     # 外键关联
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    def __init__(self, encrypted_data, category, user_id):
+    # 批量插入的哨兵列（插入时由SQLAlchemy填写，之后不再使用）：SQLite 不保证多行 INSERT ... RETURNING 的返回顺序，
+    # 借助这一列把返回的id对应回各个对象，flush 时同一批新增条目才能合并为少数几条多行INSERT，而不是逐行插入
+    _sentinel = insert_sentinel('_sentinel')
+
+    def __init__(self, encrypted_data, category, user_id, encrypted_secret=None):
         self.encrypted_data = encrypted_data
+        self.encrypted_secret = encrypted_secret
         self.category = category
         self.user_id = user_id
 
@@ -93,8 +152,46 @@ class Password(db.Model):
 
         return base_dict
 
+    def to_ciphertext_dict(self, include_secret=False):
+        """
+        返回原样密文的条目（客户端解密模式），服务器不做任何解密
+        include_secret=False 时不读取机密列（列表查询中该列是延迟加载的）；
+        encrypted_secret 为空的旧格式条目，encrypted_data 中包含全部字段
+        """
+        base_dict = {
+            'id': self.id,
+            'category': self.category,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'encrypted_data': self.encrypted_data
+        }
+        if include_secret:
+            base_dict['encrypted_secret'] = self.encrypted_secret
+        return base_dict
+
+class PasswordSearchToken(db.Model):
+    """
+    密码条目的盲索引令牌
+    令牌是用主密钥派生的密钥对规范化后的检索词（及其前缀）计算的HMAC，服务器看不到明文检索词
+    """
+    __tablename__ = 'password_search_tokens'
+    __table_args__ = (
+        db.Index('ix_password_search_tokens_user_token', 'user_id', 'token'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+    password_id = db.Column(db.Integer, db.ForeignKey('passwords.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # 外键关联
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
 class Command(db.Model):
     __tablename__ = 'commands'
+    __table_args__ = (
+        # 增量同步：WHERE user_id=? AND updated_at>=?
+        db.Index('ix_commands_user_updated', 'user_id', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)  # 命令名称
@@ -106,6 +203,9 @@ class Command(db.Model):
     # 外键关联
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    # 批量插入的哨兵列（见 Password._sentinel）
+    _sentinel = insert_sentinel('_sentinel')
+
     def __init__(self, name, command_type, command_text, user_id):
         self.name = name
         self.command_type = command_type
@@ -121,4 +221,125 @@ class Command(db.Model):
             'command_text': self.command_text,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class DeletedEntry(db.Model):
+    """删除记录（墓碑），供增量同步接口告知客户端哪些条目已被删除"""
+    __tablename__ = 'deleted_entries'
+    __table_args__ = (
+        db.Index('ix_deleted_entries_user_entity_time', 'user_id', 'entity', 'deleted_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)  # 条目类型：password / command
+    entity_id = db.Column(db.Integer, nullable=False)  # 被删除条目的id
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 外键关联
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    def __init__(self, entity, entity_id, user_id):
+        self.entity = entity
+        self.entity_id = entity_id
+        self.user_id = user_id
+
+class EntryGroup(db.Model):
+    """
+    用户的条目分组（密码分类 / 命令类型）及其条目数，由 app.groups 随条目写入同步维护
+    name 为空字符串表示未分组的条目；last_updated 为组内条目最近一次新增、修改或删除的时间
+    """
+    __tablename__ = 'entry_groups'
+    __table_args__ = (
+        db.Index('ix_entry_groups_user_entity_name', 'user_id', 'entity', 'name', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)  # 条目类型：password / command
+    name = db.Column(db.String(64), nullable=False, default='')  # 分类或命令类型
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 外键关联
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'count': self.count,
+            'last_updated': self.last_updated.isoformat() if self.last_updated else None
+        }
+
+class ChangeEvent(db.Model):
+    """
+    条目变动通知的发件箱，由 app.events 随条目写入在同一事务中记录，供 /api/events 推送与断线重放
+    action 为 upsert / delete，或 resync（一次写入变动过多，客户端应走增量同步，此时 entity_id 为空）
+    version 为条目写入后的 updated_at（删除与 resync 时为空）
+    """
+    __tablename__ = 'change_events'
+    __table_args__ = (
+        db.Index('ix_change_events_user_id', 'user_id', 'id'),
+        db.Index('ix_change_events_created_at', 'created_at'),
+        # 事件id只增不减（不复用已清理的id），客户端以它作为 Last-Event-ID
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)  # 条目类型：password / command
+    entity_id = db.Column(db.Integer)
+    action = db.Column(db.String(16), nullable=False)
+    version = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 外键关联
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'id': self.entity_id,
+            'action': self.action,
+            'version': self.version.isoformat() if self.version else None
+        }
+
+class RekeyJob(db.Model):
+    """
+    修改主密码后的密码库重新加密任务
+    旧主密钥用新主密钥加密后保存在 wrapped_keys 中，任务完成后清除；
+    last_id 为已处理到的条目id，每个批次与进度在同一事务中提交，崩溃后可从断点继续
+    """
+    __tablename__ = 'rekey_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default='running')  # running / done / superseded
+    wrapped_keys = db.Column(db.Text)  # 用新主密钥加密的旧主密钥列表（JSON）
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # 外键关联
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+
+    def __init__(self, user_id, wrapped_keys, total):
+        self.user_id = user_id
+        self.wrapped_keys = wrapped_keys
+        self.total = total
+        self.status = 'running'
+        self.last_id = 0
+        self.processed = 0
+        self.failed = 0
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 passwords_bp = Blueprint('passwords', __name__, url_prefix='/api/passwords')
 
-from . import routes
\ No newline at end of file
+from . import routes, transfer
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+加密密码条目的盲索引（blind index）
+
+标题、URL主机名、用户名经规范化、切分为检索词，再对每个检索词的前缀计算
+HMAC-SHA256（密钥由主密钥派生），截断后存入 password_search_tokens。
+搜索时对查询词做同样的计算，用 (user_id, token) 索引直接定位命中的条目，只解密命中结果。
+
+注意：盲索引会向数据库暴露“哪些条目共享同一检索词/前缀”这类相等性信息，
+但不暴露检索词本身；令牌随主密钥变化，修改密码后由重新加密任务一并重建。
+"""
+
+import hashlib
+import hmac
+import re
+import unicodedata
+from urllib.parse import urlsplit
+from sqlalchemy import delete, insert, select, func
+from app import db
+from app.models import Password, PasswordSearchToken
+
+# 参与索引的字段
+INDEXED_FIELDS = ('title', 'url', 'username')
+# 前缀长度范围：短于下限的查询词不参与搜索，长于上限的词按上限截断
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 16
+# 截断后的令牌长度（十六进制字符数）
+TOKEN_LENGTH = 32
+
+_WORD_RE = re.compile(r'\w+')
+
+def _index_key(master_key):
+    """从主密钥派生盲索引专用的HMAC密钥（与加密密钥分离）"""
+    return hmac.new(master_key.encode('utf-8'), b'pmer-blind-index-v1', hashlib.sha256).digest()
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+def _url_terms(url):
+    """URL只索引主机名：完整主机名（去掉www.）及其各级标签"""
+    url = _normalize(url).strip()
+    if not url:
+        return []
+    host = urlsplit(url if '//' in url else '//' + url).hostname or ''
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host:
+        return []
+    return [host] + [label for label in host.split('.') if label]
+
+def extract_terms(data):
+    """从条目明文中提取规范化后的检索词"""
+    terms = set(_WORD_RE.findall(_normalize(data.get('title'))))
+    terms.update(_url_terms(data.get('url')))
+    username = _normalize(data.get('username')).strip()
+    if username:
+        terms.add(username)
+        terms.update(_WORD_RE.findall(username))
+    return terms
+
+def _token(key, term):
+    return hmac.new(key, term.encode('utf-8'), hashlib.sha256).hexdigest()[:TOKEN_LENGTH]
+
+def entry_tokens(data, master_key):
+    """计算一个条目的全部盲索引令牌（各检索词的前缀）"""
+    key = _index_key(master_key)
+    tokens = set()
+    for term in extract_terms(data):
+        for length in range(MIN_PREFIX_LENGTH, min(len(term), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(_token(key, term[:length]))
+    return tokens
+
+def query_tokens(query, master_key):
+    """把搜索词转换为令牌列表；过短的词被忽略"""
+    key = _index_key(master_key)
+    tokens = []
+    for term in _WORD_RE.findall(_normalize(query)):
+        if len(term) < MIN_PREFIX_LENGTH:
+            continue
+        tokens.append(_token(key, term[:MAX_PREFIX_LENGTH]))
+    return list(dict.fromkeys(tokens))
+
+def index_entries(user_id, entries, master_key):
+    """
+    重建若干条目的盲索引（加入当前事务，由调用方提交）
+    entries 为 [(password_id, 明文字典)]
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    delete_entries([password_id for password_id, _ in entries])
+    rows = [
+        {'user_id': user_id, 'password_id': password_id, 'token': token}
+        for password_id, data in entries
+        for token in entry_tokens(data, master_key)
+    ]
+    if rows:
+        db.session.execute(insert(PasswordSearchToken), rows)
+
+def missing():
+    """查询条件：条目还没有任何盲索引令牌（功能上线前保存的条目；没有可索引检索词的条目也会命中）"""
+    return ~select(PasswordSearchToken.id).where(PasswordSearchToken.password_id == Password.id).exists()
+
+def delete_entries(password_ids):
+    """删除若干条目的盲索引"""
+    password_ids = list(password_ids)
+    for i in range(0, len(password_ids), 500):
+        db.session.execute(
+            delete(PasswordSearchToken).where(PasswordSearchToken.password_id.in_(password_ids[i:i + 500]))
+        )
+
+def search(user_id, tokens, limit, after_id=None):
+    """返回同时命中所有令牌的条目id（按id升序）"""
+    statement = select(PasswordSearchToken.password_id).where(
+        PasswordSearchToken.user_id == user_id,
+        PasswordSearchToken.token.in_(tokens)
+    )
+    if after_id is not None:
+        statement = statement.where(PasswordSearchToken.password_id > after_id)
+    statement = statement.group_by(PasswordSearchToken.password_id).having(
+        func.count(func.distinct(PasswordSearchToken.token)) == len(tokens)
+    ).order_by(PasswordSearchToken.password_id).limit(limit)
+    return [row[0] for row in db.session.execute(statement)]
@@ -0,0 +1,99 @@
+"""
+把旧的文本令牌改写为二进制存储（SQLite）
+
+只做base64解码，不需要主密钥，也不改变令牌内容，因此可以在应用启动后直接在后台运行，
+按id顺序分批处理整张表。条件更新保证与并发写入（用户修改、重新加密任务）互不覆盖。
+数据库迁移 binary_tokens 只记录结构变更，不在持有写锁的迁移事务中改写数据（见 app.schema）；
+FernetToken 同时能读取文本与二进制令牌，转换完成前条目照常可读。
+"""
+
+import os
+import threading
+from sqlalchemy import func, or_, select, update
+from app import db
+from app.models import Password
+from app.ciphertext import stored, unchanged
+from app.shards import sharding_enabled
+
+# 每个事务检查的条目数
+TOKEN_CONVERT_CHUNK_SIZE = int(os.getenv('TOKEN_CONVERT_CHUNK_SIZE', '1000'))
+# 是否在应用启动时启动后台转换
+TOKEN_CONVERT_ON_STARTUP = os.getenv('TOKEN_CONVERT_ON_STARTUP', 'true').lower() == 'true'
+
+_started = threading.Event()
+
+def has_text_tokens():
+    """是否还有以文本保存的令牌（转换完成后每次启动只需这一次查询）"""
+    return db.session.execute(
+        select(Password.id).where(or_(
+            func.typeof(stored(Password.encrypted_data)) == 'text',
+            func.typeof(stored(Password.encrypted_secret)) == 'text'
+        )).limit(1)
+    ).first() is not None
+
+def convert_tokens(chunk_size=None):
+    """把所有仍以文本保存的令牌改写为二进制，返回改写的条目数"""
+    chunk_size = chunk_size or TOKEN_CONVERT_CHUNK_SIZE
+    converted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(
+                Password.id,
+                stored(Password.encrypted_data).label('encrypted_data'),
+                stored(Password.encrypted_secret).label('encrypted_secret')
+            ).where(Password.id > last_id).order_by(Password.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return converted
+
+        for row in rows:
+            if not isinstance(row.encrypted_data, str) and not isinstance(row.encrypted_secret, str):
+                continue
+            # 赋值的仍是同一个令牌字符串，由 FernetToken 以二进制写入；不改变 updated_at
+            result = db.session.execute(
+                update(Password).where(
+                    Password.id == row.id,
+                    unchanged(Password.encrypted_data, row.encrypted_data),
+                    unchanged(Password.encrypted_secret, row.encrypted_secret)
+                ).values(
+                    encrypted_data=row.encrypted_data,
+                    encrypted_secret=row.encrypted_secret,
+                    updated_at=Password.updated_at
+                )
+            )
+            converted += result.rowcount
+        db.session.commit()
+        last_id = rows[-1].id
+
+def launch_token_conversion(app):
+    """在后台线程中执行一次转换（每个进程只启动一次）"""
+    # 分片中的令牌由 shard_database.py 拆分时已写成二进制；PostgreSQL 的列在迁移中已改为 bytea
+    if not TOKEN_CONVERT_ON_STARTUP or sharding_enabled() or _started.is_set():
+        return
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            return
+    _started.set()
+
+    thread = threading.Thread(
+        target=_run_conversion,
+        args=(app,),
+        name='pmer-token-convert',
+        daemon=True
+    )
+    thread.start()
+
+def _run_conversion(app):
+    with app.app_context():
+        try:
+            if not has_text_tokens():
+                return
+            converted = convert_tokens()
+            if converted:
+                app.logger.info('已把 %s 个条目的令牌改写为二进制存储', converted)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('令牌存储格式转换中断，将在下次启动时继续')
+        finally:
+            db.session.remove()
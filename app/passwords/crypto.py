@@ -0,0 +1,220 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken
+from app.instrumentation import instrumented
+
+# Fernet对象缓存配置：最多缓存的主密钥数量，以及缓存有效期（默认与JWT有效期一致，24小时）
+FERNET_CACHE_SIZE = int(os.getenv('FERNET_CACHE_SIZE', '256'))
+FERNET_CACHE_TTL = int(os.getenv('FERNET_CACHE_TTL', str(24 * 60 * 60)))
+
+# 批量解密线程池大小；cryptography 在AES/HMAC运算时会释放GIL，多核可以并行
+DECRYPT_WORKERS = int(os.getenv('DECRYPT_WORKERS', str(os.cpu_count() or 1)))
+# 少于该数量的批次直接在当前线程解密，线程池调度开销得不偿失
+PARALLEL_DECRYPT_THRESHOLD = int(os.getenv('PARALLEL_DECRYPT_THRESHOLD', '64'))
+
+# 记录明文的格式版本（首字节）；首字节为 '{' 的是旧格式的JSON文本
+RECORD_JSON = 0x01        # 紧凑JSON（短字段名、无空白）
+RECORD_JSON_ZLIB = 0x02   # zlib压缩后的紧凑JSON
+# 序列化后超过该字节数才尝试压缩（通常只有较长的备注会达到）
+RECORD_COMPRESS_THRESHOLD = int(os.getenv('RECORD_COMPRESS_THRESHOLD', '256'))
+
+# 紧凑记录中的字段名缩写；未列出的字段保留原名
+FIELD_CODES = {'title': 't', 'url': 'u', 'username': 'n', 'password': 'p', 'notes': 'm'}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+
+# 批量解密的单条结果：成功时 data 为解密后的字典，失败时 error 为错误代码
+DecryptResult = namedtuple('DecryptResult', ['data', 'error'])
+
+def get_encryption_key(master_key):
+    """从主密钥生成Fernet加密密钥"""
+    # Fernet需要32位URL安全的base64编码密钥
+    try:
+        # 尝试将主密钥作为十六进制字符串处理
+        key_bytes = bytes.fromhex(master_key)
+    except ValueError:
+        # 如果不是有效的十六进制字符串，直接使用UTF-8编码
+        # 使用SHA-256生成固定长度的字节
+        key_bytes = hashlib.sha256(master_key.encode('utf-8')).digest()
+
+    # 确保长度为32字节
+    key_bytes = key_bytes[:32].ljust(32, b'\0')
+    key = base64.urlsafe_b64encode(key_bytes)
+    return key
+
+class FernetCache:
+    """
+    进程内的Fernet对象LRU缓存
+    以主密钥的SHA-256摘要为键（不在内存中用明文主密钥做键），
+    条目在写入后 ttl 秒过期，与携带该主密钥的令牌同时失效
+    """
+
+    def __init__(self, maxsize=FERNET_CACHE_SIZE, ttl=FERNET_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, master_key):
+        digest = hashlib.sha256(master_key.encode('utf-8')).digest()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                fernet, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(digest)
+                    return fernet
+                del self._entries[digest]
+
+        # 在锁外构造，避免阻塞其他线程
+        fernet = Fernet(get_encryption_key(master_key))
+
+        with self._lock:
+            self._entries[digest] = (fernet, now + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return fernet
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fernet_cache = FernetCache()
+
+def get_fernet(master_key):
+    """获取主密钥对应的Fernet对象（带缓存）"""
+    return fernet_cache.get(master_key)
+
+def pack_record(data_dict):
+    """
+    把条目字典序列化为带版本号的紧凑记录（加密前）
+    较大的记录先用zlib压缩，压缩后没有变小则保持原样
+    """
+    body = json.dumps(
+        {FIELD_CODES.get(key, key): value for key, value in data_dict.items()},
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    if len(body) > RECORD_COMPRESS_THRESHOLD:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            return bytes((RECORD_JSON_ZLIB,)) + compressed
+    return bytes((RECORD_JSON,)) + body
+
+def unpack_record(raw):
+    """解析 pack_record 生成的记录（兼容旧格式的JSON文本），格式错误时抛出 ValueError"""
+    if raw[:1] == b'{':
+        return json.loads(raw.decode('utf-8'))
+
+    version, body = raw[:1], raw[1:]
+    if version == bytes((RECORD_JSON_ZLIB,)):
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(str(e)) from e
+    elif version != bytes((RECORD_JSON,)):
+        raise ValueError('未知的记录格式')
+    return {FIELD_NAMES.get(key, key): value for key, value in json.loads(body.decode('utf-8')).items()}
+
+@instrumented('encrypt')
+def encrypt_password_data(data_dict, master_key):
+    """
+    使用主密钥加密密码数据（紧凑记录格式）
+    data_dict 包含: title, url, username, password, notes
+    """
+    f = get_fernet(master_key)
+    encrypted = f.encrypt(pack_record(data_dict))
+    return encrypted.decode()
+
+@instrumented('decrypt')
+def decrypt_password_data(encrypted_data, master_key):
+    """
+    使用主密钥解密密码数据
+    返回包含 title, url, username, password, notes 的字典
+    """
+    f = get_fernet(master_key)
+    return unpack_record(f.decrypt(encrypted_data.encode()))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_crypto_executor():
+    """获取（惰性创建）进程内共享的加解密线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DECRYPT_WORKERS,
+                    thread_name_prefix='pmer-crypto'
+                )
+    return _executor
+
+def _decrypt_chunk(fernet, encrypted_chunk):
+    """在单个线程内顺序解密一组密文，逐条记录错误而不中断整个批次"""
+    results = []
+    for encrypted_data in encrypted_chunk:
+        try:
+            decrypted = fernet.decrypt(encrypted_data.encode())
+            results.append(DecryptResult(unpack_record(decrypted), None))
+        except InvalidToken:
+            # 密钥不匹配或密文被篡改
+            results.append(DecryptResult(None, 'invalid_token'))
+        except (ValueError, TypeError, AttributeError):
+            # 解密成功但内容不是合法的记录，或密文本身为空/类型错误
+            results.append(DecryptResult(None, 'malformed'))
+    return results
+
+def _run_chunked(chunk_fn, fernet, items):
+    """
+    把 items 分块交给 chunk_fn(fernet, chunk) 处理并按原顺序拼接结果
+    小批次直接在当前线程执行，大批次分发到线程池并行执行
+    """
+    if len(items) < PARALLEL_DECRYPT_THRESHOLD or DECRYPT_WORKERS <= 1:
+        return chunk_fn(fernet, items)
+
+    # 每个线程分到约两块，兼顾负载均衡与调度开销
+    chunk_size = max(16, -(-len(items) // (DECRYPT_WORKERS * 2)))
+    executor = get_crypto_executor()
+    futures = [
+        executor.submit(chunk_fn, fernet, items[i:i + chunk_size])
+        for i in range(0, len(items), chunk_size)
+    ]
+
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
+
+@instrumented('decrypt', count=len)
+def decrypt_password_batch(encrypted_list, master_key):
+    """
+    批量解密密码数据
+    大批次按块分发到线程池并行解密，返回与输入顺序一致的 DecryptResult 列表
+    """
+    encrypted_list = list(encrypted_list)
+    if not encrypted_list:
+        return []
+    return _run_chunked(_decrypt_chunk, get_fernet(master_key), encrypted_list)
+
+def _encrypt_chunk(fernet, data_chunk):
+    return [
+        fernet.encrypt(pack_record(data_dict)).decode()
+        for data_dict in data_chunk
+    ]
+
+@instrumented('encrypt', count=len)
+def encrypt_password_batch(data_list, master_key):
+    """批量加密密码数据，返回与输入顺序一致的密文列表"""
+    data_list = list(data_list)
+    if not data_list:
+        return []
+    return _run_chunked(_encrypt_chunk, get_fernet(master_key), data_list)
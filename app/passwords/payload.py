@@ -0,0 +1,215 @@
+"""
+密码条目的摘要/机密拆分存储
+
+新格式把条目拆成两列分别加密：encrypted_data 只包含摘要（title, url, username），
+encrypted_secret 包含机密（password, notes）。列表与搜索只解密摘要列，
+查看详情或复制密码时才解密机密列。
+
+encrypted_secret 为空的旧格式条目照常可读；所有写入都直接写成新格式，
+用户登录拿到主密钥后，后台线程再按id顺序分批拆分剩余的旧格式条目（在线迁移），
+同时为盲索引上线前保存、还没有索引的条目建立索引（搜索才能找到它们）。
+"""
+
+import os
+import threading
+from flask import current_app
+from sqlalchemy import select, update
+from app import db
+from app.models import Password
+from app.ciphertext import stored, to_token, unchanged
+from app.passwords.crypto import DecryptResult, encrypt_password_batch, decrypt_password_batch
+from app.passwords.rekey import decrypt_with_rotation
+from app.metrics import decrypt_failures
+from app.passwords import blind_index
+from app.shards import use_shard
+
+SUMMARY_FIELDS = ('title', 'url', 'username')
+SECRET_FIELDS = ('password', 'notes')
+# 客户端提交的条目中必须是字符串的字段（未提供或为null时按空字符串处理）
+TEXT_FIELDS = SUMMARY_FIELDS + SECRET_FIELDS + ('category',)
+
+# 在线迁移时每个事务拆分的条目数
+SPLIT_CHUNK_SIZE = int(os.getenv('SPLIT_CHUNK_SIZE', '200'))
+
+# 本进程中正在迁移的用户id，避免重复启动
+_running = set()
+_running_lock = threading.Lock()
+
+def invalid_fields(data):
+    """校验条目字段类型，返回错误信息，有效时返回None（加密与建立盲索引前调用）"""
+    for field in TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f'字段 {field} 必须是字符串'
+    return None
+
+def split_entry(data):
+    """把条目明文拆分为 (摘要, 机密) 两个字典"""
+    return (
+        {field: data.get(field, '') for field in SUMMARY_FIELDS},
+        {field: data.get(field, '') for field in SECRET_FIELDS}
+    )
+
+def encrypt_entries(data_list, master_key):
+    """批量加密条目明文，返回 [(摘要密文, 机密密文)]，顺序与输入一致"""
+    parts = []
+    for data in data_list:
+        parts.extend(split_entry(data))
+    encrypted = encrypt_password_batch(parts, master_key)
+    return list(zip(encrypted[0::2], encrypted[1::2]))
+
+def decrypt_entries(user_id, rows, master_key, include_secret=True, rotation=True):
+    """
+    批量解密条目（rows 需有 encrypted_data / encrypted_secret 属性），返回 DecryptResult 列表
+    include_secret=False 时只解密摘要列，旧格式条目的机密字段也会被去掉；
+    rotation=False 时不回退到重新加密任务的旧密钥（用于校验导入的密文）
+    """
+    rows = list(rows)
+    ciphertexts = [row.encrypted_data for row in rows]
+    with_secret = []
+    if include_secret:
+        with_secret = [i for i, row in enumerate(rows) if row.encrypted_secret is not None]
+        ciphertexts += [rows[i].encrypted_secret for i in with_secret]
+
+    if rotation:
+        decrypted = decrypt_with_rotation(user_id, ciphertexts, master_key)
+    else:
+        decrypted = decrypt_password_batch(ciphertexts, master_key)
+
+    results = decrypted[:len(rows)]
+    for i, secret in zip(with_secret, decrypted[len(rows):]):
+        if results[i].error:
+            continue
+        if secret.error:
+            results[i] = secret
+        else:
+            results[i] = DecryptResult({**results[i].data, **secret.data}, None)
+
+    for result in results:
+        if result.error:
+            decrypt_failures.inc(reason=result.error)
+
+    if not include_secret:
+        results = [
+            result if result.error else DecryptResult(
+                {key: value for key, value in result.data.items() if key not in SECRET_FIELDS}, None
+            )
+            for result in results
+        ]
+    return results
+
+def has_legacy_entries(user_id):
+    """用户是否还有旧格式（未拆分）的条目"""
+    return db.session.execute(
+        select(Password.id).where(
+            Password.user_id == user_id,
+            Password.encrypted_secret.is_(None)
+        ).limit(1)
+    ).first() is not None
+
+def has_unindexed_entries(user_id):
+    """用户是否还有缺少盲索引的条目"""
+    return db.session.execute(
+        select(Password.id).where(Password.user_id == user_id, blind_index.missing()).limit(1)
+    ).first() is not None
+
+def launch_entry_migration(user_id, master_key):
+    """登录拿到主密钥后调用：在后台线程中拆分用户剩余的旧格式条目，并为缺少盲索引的条目建立索引"""
+    if not has_legacy_entries(user_id) and not has_unindexed_entries(user_id):
+        return
+
+    with _running_lock:
+        if user_id in _running:
+            return
+        _running.add(user_id)
+
+    app = current_app._get_current_object()
+    thread = threading.Thread(
+        target=_run_migration,
+        args=(app, user_id, master_key),
+        name=f'pmer-split-{user_id}',
+        daemon=True
+    )
+    thread.start()
+
+def _run_migration(app, user_id, master_key):
+    try:
+        with app.app_context():
+            try:
+                use_shard(user_id)
+                migrate_user(user_id, master_key)
+                index_user(user_id, master_key)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('用户 %s 的条目格式迁移中断，将在下次登录时继续', user_id)
+            finally:
+                db.session.remove()
+    finally:
+        with _running_lock:
+            _running.discard(user_id)
+
+def migrate_user(user_id, master_key):
+    """把用户的旧格式条目拆分为摘要/机密两列（同时重建其盲索引），返回迁移的条目数"""
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Password.id, stored(Password.encrypted_data).label('encrypted_data')).where(
+                Password.user_id == user_id,
+                Password.encrypted_secret.is_(None),
+                Password.id > last_id
+            ).order_by(Password.id).limit(SPLIT_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return migrated
+
+        # 无法解密的条目保持原样，不影响其他条目
+        results = decrypt_with_rotation(user_id, [to_token(row.encrypted_data) for row in rows], master_key)
+        pending = [(row, result.data) for row, result in zip(rows, results) if not result.error]
+        encrypted = encrypt_entries([data for _, data in pending], master_key)
+
+        indexed = []
+        for (row, data), (summary, secret) in zip(pending, encrypted):
+            # 条件更新：条目在此期间被修改（已写成新格式）时跳过；不改变 updated_at
+            result = db.session.execute(
+                update(Password).where(
+                    Password.id == row.id,
+                    unchanged(Password.encrypted_data, row.encrypted_data),
+                    Password.encrypted_secret.is_(None)
+                ).values(encrypted_data=summary, encrypted_secret=secret, updated_at=Password.updated_at)
+            )
+            if result.rowcount:
+                indexed.append((row.id, data))
+            migrated += result.rowcount
+        blind_index.index_entries(user_id, indexed, master_key)
+        db.session.commit()
+        last_id = rows[-1].id
+
+def index_user(user_id, master_key):
+    """
+    为用户缺少盲索引的条目建立索引（只解密 encrypted_data），返回建立索引的条目数
+    没有可索引检索词的条目每次都会被重新检查，这类条目很少，且只需解密一列
+    """
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Password.id, Password.encrypted_data).where(
+                Password.user_id == user_id,
+                Password.id > last_id,
+                blind_index.missing()
+            ).order_by(Password.id).limit(SPLIT_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return indexed
+
+        results = decrypt_with_rotation(user_id, [row.encrypted_data for row in rows], master_key)
+        decrypted = {row.id: result.data for row, result in zip(rows, results) if not result.error}
+        # 期间被修改（写入请求已重建索引）或删除的条目跳过
+        still_missing = set(db.session.scalars(
+            select(Password.id).where(Password.id.in_(list(decrypted)), blind_index.missing())
+        ))
+        entries = [(password_id, data) for password_id, data in decrypted.items() if password_id in still_missing]
+        blind_index.index_entries(user_id, entries, master_key)
+        db.session.commit()
+        indexed += len(entries)
+        last_id = rows[-1].id
@@ -0,0 +1,206 @@
+"""
+修改主密码后的密码库重新加密（re-key）
+
+修改密码时，旧主密钥被新主密钥加密后随任务记录一起保存（与密码修改同一事务提交）。
+后台线程按id顺序分批把条目从旧密钥轮换到新密钥，每批与进度在同一事务中提交；
+进程崩溃后，用户下次登录拿到新主密钥时自动从断点继续。
+盲索引令牌同样由主密钥派生，随每个条目一起重建。
+任务运行期间密码库不加锁：读取时新密钥解密失败的条目会回退到旧密钥，
+写入一律使用新密钥，后台批次用条件更新避免覆盖用户刚写入的数据。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from cryptography.fernet import InvalidToken, MultiFernet
+from flask import current_app
+from sqlalchemy import select, update
+from app import db
+from app.models import Password, RekeyJob
+from app.ciphertext import stored, to_token, unchanged
+from app.passwords.crypto import get_fernet, decrypt_password_batch, unpack_record
+from app.passwords import blind_index
+from app.shards import use_shard
+
+# 每个事务重新加密的条目数
+REKEY_CHUNK_SIZE = int(os.getenv('REKEY_CHUNK_SIZE', '200'))
+
+# 本进程中正在运行的任务 (user_id, 任务id)，避免同一任务被重复启动；分片模式下任务id只在分片内唯一
+_running = set()
+_running_lock = threading.Lock()
+
+def active_job(user_id):
+    """返回用户正在进行的重新加密任务"""
+    return RekeyJob.query.filter_by(user_id=user_id, status='running').order_by(RekeyJob.id.desc()).first()
+
+def active_job_progress(user_id):
+    """用户正在进行的任务的 (id, last_id)，没有任务时返回None；只查询两列，供每个列表请求使用"""
+    return db.session.query(RekeyJob.id, RekeyJob.last_id).filter_by(
+        user_id=user_id, status='running'
+    ).order_by(RekeyJob.id.desc()).first()
+
+def unwrap_old_keys(job, master_key):
+    """用当前主密钥解出任务保存的旧主密钥列表；没有任务或主密钥不匹配时返回空列表"""
+    if not job or not job.wrapped_keys:
+        return []
+    try:
+        return json.loads(get_fernet(master_key).decrypt(job.wrapped_keys.encode()))
+    except InvalidToken:
+        return []
+
+def create_rekey_job(user_id, old_key, new_key):
+    """
+    创建重新加密任务（只加入会话，由调用方与密码修改一起提交）
+    上一个任务尚未完成时，它的旧密钥一并转入新任务，旧任务标记为 superseded
+    """
+    old_keys = [old_key]
+    previous = active_job(user_id)
+    if previous:
+        old_keys += unwrap_old_keys(previous, old_key)
+        previous.status = 'superseded'
+        previous.wrapped_keys = None
+        previous.finished_at = datetime.utcnow()
+
+    # 去重并排除新密钥本身
+    old_keys = [key for key in dict.fromkeys(old_keys) if key != new_key]
+    wrapped_keys = get_fernet(new_key).encrypt(json.dumps(old_keys).encode()).decode()
+
+    job = RekeyJob(
+        user_id=user_id,
+        wrapped_keys=wrapped_keys,
+        total=Password.query.filter_by(user_id=user_id).count()
+    )
+    db.session.add(job)
+    return job
+
+def launch_rekey(user_id, job_id, new_key):
+    """在后台线程中执行任务（本进程内同一任务只运行一份）"""
+    with _running_lock:
+        if (user_id, job_id) in _running:
+            return
+        _running.add((user_id, job_id))
+
+    app = current_app._get_current_object()
+    thread = threading.Thread(
+        target=_run_job,
+        args=(app, user_id, job_id, new_key),
+        name=f'pmer-rekey-{job_id}',
+        daemon=True
+    )
+    thread.start()
+
+def resume_rekey(user_id, master_key):
+    """登录拿到主密钥后调用：继续该用户未完成的任务"""
+    job = active_job(user_id)
+    if job and unwrap_old_keys(job, master_key):
+        launch_rekey(user_id, job.id, master_key)
+
+def _run_job(app, user_id, job_id, new_key):
+    try:
+        with app.app_context():
+            try:
+                use_shard(user_id)
+                _process(job_id, new_key)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('重新加密任务 %s 中断，将在用户下次登录时继续', job_id)
+            finally:
+                db.session.remove()
+    finally:
+        with _running_lock:
+            _running.discard((user_id, job_id))
+
+def _process(job_id, new_key):
+    job = db.session.get(RekeyJob, job_id)
+    if not job or job.status != 'running':
+        return
+
+    new_fernet = get_fernet(new_key)
+    rotator = MultiFernet([new_fernet] + [get_fernet(key) for key in unwrap_old_keys(job, new_key)])
+
+    while True:
+        rows = db.session.execute(
+            # 读取原始存储值，条件更新时才能与数据库中的值（文本或二进制）精确比较
+            select(
+                Password.id,
+                stored(Password.encrypted_data).label('encrypted_data'),
+                stored(Password.encrypted_secret).label('encrypted_secret')
+            ).where(
+                Password.user_id == job.user_id,
+                Password.id > job.last_id
+            ).order_by(Password.id).limit(REKEY_CHUNK_SIZE)
+        ).all()
+
+        if not rows:
+            job.status = 'done'
+            job.wrapped_keys = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        failed = 0
+        for row in rows:
+            token = to_token(row.encrypted_data).encode()
+            try:
+                # 已经是新密钥加密的条目（例如任务期间用户修改过）无需处理
+                new_fernet.decrypt(token)
+                continue
+            except InvalidToken:
+                pass
+            try:
+                plaintext = rotator.decrypt(token)
+                # 摘要与机密两列总是一起写入，一并轮换
+                secret = None
+                if row.encrypted_secret is not None:
+                    secret = rotator.rotate(to_token(row.encrypted_secret).encode()).decode()
+            except InvalidToken:
+                failed += 1
+                continue
+            rotated = new_fernet.encrypt(plaintext).decode()
+
+            # 条件更新：条目在此期间被修改时保留用户写入的版本；不改变 updated_at
+            result = db.session.execute(
+                update(Password).where(
+                    Password.id == row.id,
+                    unchanged(Password.encrypted_data, row.encrypted_data),
+                    unchanged(Password.encrypted_secret, row.encrypted_secret)
+                ).values(encrypted_data=rotated, encrypted_secret=secret, updated_at=Password.updated_at)
+            )
+            if result.rowcount:
+                # 盲索引令牌由主密钥派生，随密文一起重建
+                blind_index.index_entries(job.user_id, [(row.id, unpack_record(plaintext))], new_key)
+
+        job.last_id = rows[-1].id
+        job.processed += len(rows) - failed
+        job.failed += failed
+        db.session.commit()
+
+        # 提交后属性过期，重新读取状态：任务可能已被新的密码修改取代
+        if job.status != 'running':
+            return
+
+def decrypt_with_rotation(user_id, encrypted_list, master_key):
+    """
+    批量解密，重新加密任务进行中时对新密钥解密失败的条目回退到旧密钥
+    没有进行中的任务时与 decrypt_password_batch 完全相同
+    """
+    encrypted_list = list(encrypted_list)
+    results = decrypt_password_batch(encrypted_list, master_key)
+
+    retry = [i for i, result in enumerate(results) if result.error == 'invalid_token']
+    if not retry:
+        return results
+
+    for old_key in unwrap_old_keys(active_job(user_id), master_key):
+        retried = decrypt_password_batch([encrypted_list[i] for i in retry], old_key)
+        remaining = []
+        for i, result in zip(retry, retried):
+            if result.error:
+                remaining.append(i)
+            else:
+                results[i] = result
+        retry = remaining
+        if not retry:
+            break
+    return results
@@ -1,127 +1,330 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from app import db
-from app.models import Password
+from app.models import Password, RekeyJob
 from app.passwords import passwords_bp
 from app.auth.routes import token_required
-import json
-from cryptography.fernet import Fernet
-import base64
-
-def get_encryption_key(master_key):
-    """从主密钥生成Fernet加密密钥"""
-    # Fernet需要32位URL安全的base64编码密钥
-    try:
-        # 尝试将主密钥作为十六进制字符串处理
-        key_bytes = bytes.fromhex(master_key)
-    except ValueError:
-        # 如果不是有效的十六进制字符串，直接使用UTF-8编码
-        import hashlib
-        # 使用SHA-256生成固定长度的字节
-        key_bytes = hashlib.sha256(master_key.encode('utf-8')).digest()
-
-    # 确保长度为32字节
-    key_bytes = key_bytes[:32].ljust(32, b'\0')
-    key = base64.urlsafe_b64encode(key_bytes)
-    return key
+from app.conditional import collection_version, key_fingerprint, make_etag, not_modified, etag_json, etag_stream
+from app.sync import parse_since, new_cursor, record_deletion, deleted_since
+from app.batch import parse_batch_operations, batch_result, invalid_operation
+from app.passwords.rekey import active_job_progress, decrypt_with_rotation
+from app.passwords.payload import SECRET_FIELDS, TEXT_FIELDS, encrypt_entries, decrypt_entries, invalid_fields
+from app.passwords import blind_index
+from app.groups import group_summary, summary_version
+from app.serialization import JSON_STREAM_CHUNK_SIZE, stream_response
+from app.shards import use_shard
+from sqlalchemy.orm import defer
+from sqlalchemy.exc import SQLAlchemyError
+
+# 列表分页的最大每页条数
+MAX_PAGE_SIZE = 200
+
+# 重建盲索引时每个事务处理的条目数
+REINDEX_CHUNK_SIZE = 500
+
+# 加密存储的字段
+SENSITIVE_FIELDS = ('title', 'url', 'username', 'password', 'notes')
+
+# 客户端解密模式：?mode=ciphertext 时返回原样密文，由客户端用自己派生的主密钥解密
+CIPHERTEXT_MODE = 'ciphertext'
+
+def ciphertext_mode():
+    return request.args.get('mode') == CIPHERTEXT_MODE
+
+def rekey_state(user_id):
+    """
+    重新加密任务的进度标识（无任务时为空字符串）
+    任务轮换密文时不改变 updated_at，密文响应的ETag需要包含进度；
+    任务进行中部分条目仍是旧密钥加密的，客户端应回退到服务器解密
+    """
+    job = active_job_progress(user_id)
+    return f'{job.id}:{job.last_id}' if job else ''
 
-def encrypt_password_data(data_dict, master_key):
+def sealed_fields(data, master_key, user_id, required=()):
     """
-    使用主密钥加密密码数据（JSON序列化）
-    data_dict 包含: title, url, username, password, notes
+    校验客户端加密后上传的条目（encrypted_data + encrypted_secret）
+    密文必须能用当前主密钥解密（否则写入后无法读取），且包含 required 中的字段；
+    返回 (解密后的明文字典, 错误信息)，解密结果同时用于维护盲索引
     """
-    key = get_encryption_key(master_key)
-    f = Fernet(key)
-    json_str = json.dumps(data_dict, ensure_ascii=False)
-    encrypted = f.encrypt(json_str.encode('utf-8'))
-    return encrypted.decode()
+    if not isinstance(data.get('encrypted_data'), str) or not isinstance(data.get('encrypted_secret'), str):
+        return None, '客户端加密的条目需要同时提供 encrypted_data 与 encrypted_secret'
+    candidate = Password(
+        encrypted_data=data['encrypted_data'],
+        encrypted_secret=data['encrypted_secret'],
+        category='',
+        user_id=user_id
+    )
+    result = decrypt_entries(user_id, [candidate], master_key, rotation=False)[0]
+    if result.error:
+        return None, '密文无法用当前主密钥解密'
+    if not all(result.data.get(field) for field in required):
+        return None, '缺少必要字段'
+    error = invalid_fields(result.data)
+    if error:
+        return None, error
+    return result.data, None
+
+def decrypt_rows(passwords, master_key, user_id, include_secret=False):
+    """
+    批量解密密码条目（重新加密任务进行中时自动回退到旧密钥）
+    默认只解密摘要字段，include_secret=True 时同时解密 password / notes
+    返回 (解密成功的条目字典列表, 解密失败的 [{'id', 'error'}] 列表)，顺序与输入一致
+    """
+    results = decrypt_entries(user_id, passwords, master_key, include_secret)
+
+    decrypted_passwords = []
+    errors = []
+    for pwd, result in zip(passwords, results):
+        if result.error:
+            errors.append({'id': pwd.id, 'error': result.error})
+        else:
+            decrypted_passwords.append(pwd.to_dict(result.data))
+
+    if errors:
+        current_app.logger.warning('解密失败的密码条目: %s', [e['id'] for e in errors])
+
+    return decrypted_passwords, errors
+
+def row_chunks(query, user_id):
+    """按块读取用户条目的查询结果，供流式列表使用"""
+    # 流式输出时请求的会话已在 teardown 中移除，需要为新会话重新选定分片
+    use_shard(user_id)
+    result = db.session.scalars(query.statement, execution_options={'yield_per': JSON_STREAM_CHUNK_SIZE})
+    try:
+        yield from result.partitions()
+    finally:
+        # 客户端提前断开时生成器被关闭，释放游标
+        result.close()
 
-def decrypt_password_data(encrypted_data, master_key):
+def decrypted_chunks(query, master_key, user_id, errors, include_secret=False):
     """
-    使用主密钥解密密码数据
-    返回包含 title, url, username, password, notes 的字典
+    按块读取并解密条目：每块解密后立即输出，不在内存中保留整个密码库
+    解密失败的条目追加到 errors（在列表之后输出）
     """
-    key = get_encryption_key(master_key)
-    f = Fernet(key)
-    decrypted = f.decrypt(encrypted_data.encode())
-    json_str = decrypted.decode('utf-8')
-    return json.loads(json_str)
+    for rows in row_chunks(query, user_id):
+        decrypted, failed = decrypt_rows(rows, master_key, user_id, include_secret)
+        errors.extend(failed)
+        yield decrypted
 
 @passwords_bp.route('/', methods=['GET'])
 @token_required
 def get_all_passwords(current_user, master_key):
-    """获取用户的所有密码条目（解密后返回）"""
-    passwords = Password.query.filter_by(user_id=current_user.id).all()
+    """
+    获取用户的密码条目（只返回解密后的摘要字段，不含 password / notes）
+    支持游标分页：limit（每页条数）、after_id（上一页最后一条的id）、category（分类筛选）
+    未提供limit时返回全部条目（兼容旧客户端）
+    mode=ciphertext 时返回摘要列的原样密文与主密钥派生参数，服务器不做解密
+    """
+    sealed = ciphertext_mode()
+    if not sealed and not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    limit = request.args.get('limit', type=int)
+    after_id = request.args.get('after_id', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    category = request.args.get('category')
+
+    # 集合未变化时直接返回304，跳过解密与序列化
+    rekey = rekey_state(current_user.id) if sealed else ''
+    etag = make_etag(
+        CIPHERTEXT_MODE if sealed else 'summary',
+        collection_version(Password, current_user.id, 'password'),
+        rekey if sealed else key_fingerprint(master_key),
+        request.query_string.decode()
+    )
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    # 列表不需要机密列，不从数据库读取
+    query = Password.query.filter_by(user_id=current_user.id).options(defer(Password.encrypted_secret))
+    if category:
+        query = query.filter_by(category=category)
+
+    # 总数只走索引计数，不解密任何数据
+    total = query.order_by(None).count()
+
+    if after_id is not None:
+        query = query.filter(Password.id > after_id)
+    query = query.order_by(Password.id)
+
+    if limit is None:
+        # 未分页的完整列表逐块读取、解密并流式输出
+        if sealed:
+            return etag_stream({
+                'errors': [],
+                'total': total,
+                'next_cursor': None,
+                'kdf': current_user.kdf_info(),
+                'rekey_active': bool(rekey)
+            }, 'passwords', (
+                [pwd.to_ciphertext_dict() for pwd in rows] for rows in row_chunks(query, current_user.id)
+            ), etag)
+        errors = []
+        return etag_stream(
+            {'total': total, 'next_cursor': None}, 'passwords',
+            decrypted_chunks(query, master_key, current_user.id, errors), etag,
+            trailer=lambda: {'errors': errors}
+        )
 
+    # 多取一条用于判断是否还有下一页
+    next_cursor = None
+    passwords = query.limit(limit + 1).all()
+    if len(passwords) > limit:
+        passwords = passwords[:limit]
+        next_cursor = passwords[-1].id
+
+    if sealed:
+        return etag_json({
+            'passwords': [pwd.to_ciphertext_dict() for pwd in passwords],
+            'errors': [],
+            'total': total,
+            'next_cursor': next_cursor,
+            'kdf': current_user.kdf_info(),
+            'rekey_active': bool(rekey)
+        }, etag)
+
+    # 只解密当前页条目的摘要列
+    decrypted_passwords, errors = decrypt_rows(passwords, master_key, current_user.id)
+
+    return etag_json({
+        'passwords': decrypted_passwords,
+        'errors': errors,
+        'total': total,
+        'next_cursor': next_cursor
+    }, etag)
+
+@passwords_bp.route('/changes', methods=['GET'])
+@token_required
+def get_password_changes(current_user, master_key):
+    """
+    增量同步：返回 since 之后新增/修改的条目（解密后）以及被删除条目的id
+    未提供 since 时返回全部条目（首次同步）
+    """
     if not master_key:
         return jsonify({'message': '缺少主密钥，请重新登录'}), 400
 
-    # 解密所有密码条目
-    decrypted_passwords = []
-    for pwd in passwords:
-        try:
-            decrypted_data = decrypt_password_data(pwd.encrypted_data, master_key)
-            decrypted_passwords.append(pwd.to_dict(decrypted_data))
-        except Exception as e:
-            print(f"Error decrypting password {pwd.id}: {e}")
-            # 如果解密失败，跳过该条目或返回错误
-            continue
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'message': '无效的同步游标'}), 400
 
-    return jsonify({
-        'passwords': decrypted_passwords
-    }), 200
+    cursor = new_cursor()
+
+    query = Password.query.filter_by(user_id=current_user.id)
+    if since:
+        query = query.filter(Password.updated_at >= since)
+    query = query.order_by(Password.updated_at)
+
+    # 同步用于在客户端保存完整副本，包含机密字段；首次同步是整个密码库，逐块解密并流式输出
+    errors = []
+    return stream_response({
+        'deleted': deleted_since(current_user.id, 'password', since) if since else [],
+        'cursor': cursor
+    }, 'upserted', decrypted_chunks(query, master_key, current_user.id, errors, include_secret=True),
+        trailer=lambda: {'errors': errors})
 
 @passwords_bp.route('/<int:password_id>', methods=['GET'])
 @token_required
 def get_password(current_user, master_key, password_id):
-    """获取特定密码条目（解密后返回）"""
+    """获取特定密码条目（解密后返回；mode=ciphertext 时返回两列的原样密文）"""
     password = Password.query.filter_by(id=password_id, user_id=current_user.id).first()
 
     if not password:
         return jsonify({'message': '密码条目不存在'}), 404
 
+    if ciphertext_mode():
+        rekey = rekey_state(current_user.id)
+        etag = make_etag(CIPHERTEXT_MODE, password.id, password.updated_at.isoformat(), rekey)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return etag_json({**password.to_ciphertext_dict(include_secret=True), 'rekey_active': bool(rekey)}, etag)
+
     if not master_key:
         return jsonify({'message': '缺少主密钥，请重新登录'}), 400
 
-    try:
-        decrypted_data = decrypt_password_data(password.encrypted_data, master_key)
-        return jsonify(password.to_dict(decrypted_data)), 200
-    except Exception as e:
+    etag = make_etag(password.id, password.updated_at.isoformat(), key_fingerprint(master_key))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    result = decrypt_entries(current_user.id, [password], master_key)[0]
+    if result.error:
+        return jsonify({'message': '解密失败，主密钥可能不正确'}), 400
+    return etag_json(password.to_dict(result.data), etag)
+
+@passwords_bp.route('/<int:password_id>/secret', methods=['GET'])
+@token_required
+def get_password_secret(current_user, master_key, password_id):
+    """只解密并返回条目的机密字段（password / notes），用于复制密码等操作"""
+    password = Password.query.filter_by(id=password_id, user_id=current_user.id).first()
+
+    if not password:
+        return jsonify({'message': '密码条目不存在'}), 404
+
+    if not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    # 新格式条目只解密机密列；旧格式条目只能整体解密
+    ciphertext = password.encrypted_secret or password.encrypted_data
+    result = decrypt_with_rotation(current_user.id, [ciphertext], master_key)[0]
+    if result.error:
         return jsonify({'message': '解密失败，主密钥可能不正确'}), 400
 
+    response = jsonify({'id': password.id, **{field: result.data.get(field, '') for field in SECRET_FIELDS}})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @passwords_bp.route('/', methods=['POST'])
 @token_required
 def create_password(current_user, master_key):
-    """创建新的密码条目"""
+    """创建新的密码条目（也接受客户端加密后的 encrypted_data + encrypted_secret）"""
     data = request.get_json()
+    sealed = 'encrypted_data' in data
 
     # 验证必要字段
-    if not all(k in data for k in ('title', 'password')):
+    if not sealed and not all(k in data for k in ('title', 'password')):
         return jsonify({'message': '缺少必要字段'}), 400
 
+    error = invalid_fields(data)
+    if error:
+        return jsonify({'message': error}), 400
+
     if not master_key:
         return jsonify({'message': '缺少主密钥，请重新登录'}), 400
 
     try:
-        # 准备要加密的数据
-        sensitive_data = {
-            'title': data['title'],
-            'url': data.get('url', ''),
-            'username': data.get('username', ''),
-            'password': data['password'],
-            'notes': data.get('notes', '')
-        }
-
-        # 加密敏感数据
-        encrypted_data = encrypt_password_data(sensitive_data, master_key)
+        if sealed:
+            # 客户端已加密：只校验密文，明文用于维护盲索引
+            sensitive_data, error = sealed_fields(data, master_key, current_user.id, required=('title', 'password'))
+            if error:
+                return jsonify({'message': error}), 400
+            encrypted_data, encrypted_secret = data['encrypted_data'], data['encrypted_secret']
+        else:
+            # 准备要加密的数据
+            sensitive_data = {
+                'title': data['title'],
+                'url': data.get('url', ''),
+                'username': data.get('username', ''),
+                'password': data['password'],
+                'notes': data.get('notes', '')
+            }
+
+            # 摘要与机密分别加密
+            encrypted_data, encrypted_secret = encrypt_entries([sensitive_data], master_key)[0]
 
         # 创建新密码条目
         new_password = Password(
             encrypted_data=encrypted_data,
+            encrypted_secret=encrypted_secret,
             category=data.get('category', ''),
             user_id=current_user.id
         )
 
         db.session.add(new_password)
+        db.session.flush()
+        blind_index.index_entries(current_user.id, [(new_password.id, sensitive_data)], master_key)
         db.session.commit()
 
         # 返回时包含解密后的数据
@@ -137,7 +340,7 @@ def create_password(current_user, master_key):
 @passwords_bp.route('/<int:password_id>', methods=['PUT'])
 @token_required
 def update_password(current_user, master_key, password_id):
-    """更新密码条目"""
+    """更新密码条目（客户端加密模式下上传合并后的完整密文 encrypted_data + encrypted_secret）"""
     password = Password.query.filter_by(id=password_id, user_id=current_user.id).first()
 
     if not password:
@@ -148,29 +351,43 @@ def update_password(current_user, master_key, password_id):
 
     data = request.get_json()
 
+    error = invalid_fields(data)
+    if error:
+        return jsonify({'message': error}), 400
+
     try:
-        # 先解密现有数据
-        decrypted_data = decrypt_password_data(password.encrypted_data, master_key)
-
-        # 更新敏感字段
-        if 'title' in data:
-            decrypted_data['title'] = data['title']
-        if 'url' in data:
-            decrypted_data['url'] = data['url']
-        if 'username' in data:
-            decrypted_data['username'] = data['username']
-        if 'password' in data:
-            decrypted_data['password'] = data['password']
-        if 'notes' in data:
-            decrypted_data['notes'] = data['notes']
-
-        # 重新加密
-        password.encrypted_data = encrypt_password_data(decrypted_data, master_key)
+        if 'encrypted_data' in data:
+            decrypted_data, error = sealed_fields(data, master_key, current_user.id, required=('title',))
+            if error:
+                return jsonify({'message': error}), 400
+            password.encrypted_data, password.encrypted_secret = data['encrypted_data'], data['encrypted_secret']
+        else:
+            # 先解密现有数据
+            result = decrypt_entries(current_user.id, [password], master_key)[0]
+            if result.error:
+                return jsonify({'message': '解密失败，主密钥可能不正确'}), 400
+            decrypted_data = result.data
+
+            # 更新敏感字段
+            if 'title' in data:
+                decrypted_data['title'] = data['title']
+            if 'url' in data:
+                decrypted_data['url'] = data['url']
+            if 'username' in data:
+                decrypted_data['username'] = data['username']
+            if 'password' in data:
+                decrypted_data['password'] = data['password']
+            if 'notes' in data:
+                decrypted_data['notes'] = data['notes']
+
+            # 重新加密（旧格式条目同时转换为新格式）
+            password.encrypted_data, password.encrypted_secret = encrypt_entries([decrypted_data], master_key)[0]
 
         # 更新分类（明文字段）
         if 'category' in data:
             password.category = data['category']
 
+        blind_index.index_entries(current_user.id, [(password.id, decrypted_data)], master_key)
         db.session.commit()
 
         return jsonify({
@@ -191,16 +408,238 @@ def delete_password(current_user, master_key, password_id):
     if not password:
         return jsonify({'message': '密码条目不存在'}), 404
 
+    blind_index.delete_entries([password_id])
     db.session.delete(password)
+    record_deletion(current_user.id, 'password', password_id)
     db.session.commit()
 
     return jsonify({'message': '密码条目删除成功'}), 200
 
+@passwords_bp.route('/batch', methods=['POST'])
+@token_required
+def batch_passwords(current_user, master_key):
+    """
+    批量创建/更新/删除密码条目
+    整批在一个事务中提交，加解密在线程池中并行执行，每个操作返回独立的结果状态
+    """
+    if not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    operations, error = parse_batch_operations(request.get_json(silent=True))
+    if error:
+        return jsonify({'message': error}), 400
+
+    results = [None] * len(operations)
+
+    # 一次性载入所有被更新/删除的条目
+    target_ids = list({
+        op['id'] for op in operations
+        if isinstance(op, dict) and isinstance(op.get('id'), int)
+    })
+    existing = {}
+    for i in range(0, len(target_ids), 500):
+        rows = Password.query.filter(
+            Password.user_id == current_user.id,
+            Password.id.in_(target_ids[i:i + 500])
+        ).all()
+        existing.update((pwd.id, pwd) for pwd in rows)
+
+    # 并行解密需要更新的条目
+    update_ids = [
+        pid for pid in {op['id'] for op in operations if isinstance(op, dict) and op.get('op') == 'update'}
+        if pid in existing
+    ]
+    decrypted = {}
+    decrypt_errors = set()
+    decrypt_results = decrypt_entries(
+        current_user.id, [existing[pid] for pid in update_ids], master_key
+    )
+    for pid, result in zip(update_ids, decrypt_results):
+        if result.error:
+            decrypt_errors.add(pid)
+        else:
+            decrypted[pid] = result.data
+
+    # 按顺序应用操作，先只修改内存中的数据
+    pending = []  # (index, 明文数据, 已有条目或None, 分类)
+    deleted = []
+    deleted_ids = set()
+    for index, op in enumerate(operations):
+        invalid = invalid_operation(index, op, TEXT_FIELDS)
+        if invalid:
+            results[index] = invalid
+            continue
+
+        if op['op'] == 'create':
+            if not all(k in op for k in ('title', 'password')):
+                results[index] = batch_result(index, 400, '缺少必要字段')
+                continue
+            data = {field: op.get(field, '') for field in SENSITIVE_FIELDS}
+            pending.append((index, data, None, op.get('category', '')))
+            continue
+
+        pid = op['id']
+        if pid not in existing or pid in deleted_ids:
+            results[index] = batch_result(index, 404, '密码条目不存在', id=pid)
+            continue
+
+        if op['op'] == 'delete':
+            deleted.append(existing[pid])
+            deleted_ids.add(pid)
+            results[index] = batch_result(index, 200, id=pid)
+            continue
+
+        if pid in decrypt_errors:
+            results[index] = batch_result(index, 400, '解密失败，主密钥可能不正确', id=pid)
+            continue
+        data = decrypted[pid]
+        for field in SENSITIVE_FIELDS:
+            if field in op:
+                data[field] = op[field]
+        pending.append((index, data, existing[pid], op.get('category')))
+
+    # 并行加密所有新增/修改的数据
+    encrypted = encrypt_entries([data for _, data, _, _ in pending], master_key)
+
+    try:
+        created = []
+        indexed = []  # (条目, 明文) 需要重建盲索引的条目
+        for (index, data, password, category), (encrypted_data, encrypted_secret) in zip(pending, encrypted):
+            if password is None:
+                password = Password(
+                    encrypted_data=encrypted_data,
+                    encrypted_secret=encrypted_secret,
+                    category=category,
+                    user_id=current_user.id
+                )
+                created.append((index, password))
+                indexed.append((password, data))
+                continue
+            password.encrypted_data = encrypted_data
+            password.encrypted_secret = encrypted_secret
+            if category is not None:
+                password.category = category
+            if password.id not in deleted_ids:
+                indexed.append((password, data))
+            results[index] = batch_result(index, 200, id=password.id)
+
+        # 新增条目在flush时按哨兵列合并为多行INSERT（见 Password._sentinel），分组计数与变动通知照常由flush钩子维护
+        db.session.add_all([password for _, password in created])
+        blind_index.delete_entries(deleted_ids)
+        for password in deleted:
+            db.session.delete(password)
+            record_deletion(current_user.id, 'password', password.id)
+        db.session.flush()
+
+        blind_index.index_entries(
+            current_user.id,
+            {password.id: data for password, data in indexed}.items(),
+            master_key
+        )
+
+        for index, password in created:
+            results[index] = batch_result(index, 201, id=password.id)
+
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.exception('批量操作失败')
+        return jsonify({'message': f'批量操作失败: {str(e)}'}), 400
+
+    failed = sum(1 for result in results if result['status'] >= 400)
+    return jsonify({
+        'results': results,
+        'succeeded': len(results) - failed,
+        'failed': failed
+    }), 200
+
+@passwords_bp.route('/search', methods=['GET'])
+@token_required
+def search_passwords(current_user, master_key):
+    """
+    通过盲索引搜索密码条目（标题、URL主机名、用户名，支持前缀匹配）
+    查询参数: q（搜索词，多个词需同时命中）、limit、after_id
+    只解密命中条目的摘要列
+    """
+    if not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    tokens = blind_index.query_tokens(request.args.get('q', ''), master_key)
+    if not tokens:
+        return jsonify({'message': f'搜索词至少需要 {blind_index.MIN_PREFIX_LENGTH} 个字符'}), 400
+
+    limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+    after_id = request.args.get('after_id', type=int)
+
+    # 多取一条用于判断是否还有下一页
+    ids = blind_index.search(current_user.id, tokens, limit + 1, after_id)
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = ids[-1]
+
+    passwords = Password.query.filter(
+        Password.user_id == current_user.id,
+        Password.id.in_(ids)
+    ).options(defer(Password.encrypted_secret)).order_by(Password.id).all() if ids else []
+    decrypted_passwords, errors = decrypt_rows(passwords, master_key, current_user.id)
+
+    return jsonify({
+        'passwords': decrypted_passwords,
+        'errors': errors,
+        'next_cursor': next_cursor
+    }), 200
+
+@passwords_bp.route('/search/reindex', methods=['POST'])
+@token_required
+def reindex_passwords(current_user, master_key):
+    """为用户的全部条目重建盲索引，分块提交（缺少索引的条目在登录后由后台任务自动补建，见 app.passwords.payload）"""
+    if not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    indexed = 0
+    failed = 0
+    last_id = 0
+    while True:
+        passwords = Password.query.filter(
+            Password.user_id == current_user.id,
+            Password.id > last_id
+        ).options(defer(Password.encrypted_secret)).order_by(Password.id).limit(REINDEX_CHUNK_SIZE).all()
+        if not passwords:
+            break
+
+        results = decrypt_entries(current_user.id, passwords, master_key, include_secret=False)
+        entries = [(pwd.id, result.data) for pwd, result in zip(passwords, results) if not result.error]
+        blind_index.index_entries(current_user.id, entries, master_key)
+        db.session.commit()
+
+        indexed += len(entries)
+        failed += len(passwords) - len(entries)
+        last_id = passwords[-1].id
+
+    return jsonify({'message': '索引重建完成', 'indexed': indexed, 'failed': failed}), 200
+
 @passwords_bp.route('/categories', methods=['GET'])
 @token_required
 def get_categories(current_user, master_key):
-    """获取用户的所有密码分类"""
-    categories = db.session.query(Password.category).filter_by(user_id=current_user.id).distinct().all()
-    return jsonify({
-        'categories': [category[0] for category in categories if category[0]]
-    }), 200
\ No newline at end of file
+    """
+    获取用户的密码分类及各分类的条目数：{name, count, last_updated}
+    total 为全部条目数（含未分类），侧栏不需要读取整个密码库
+    """
+    categories, total = group_summary(current_user.id, 'password')
+    etag = make_etag('categories', summary_version(categories, total))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return etag_json({
+        'categories': [category.to_dict() for category in categories],
+        'total': total
+    }, etag)
+
+@passwords_bp.route('/rekey', methods=['GET'])
+@token_required
+def get_rekey_status(current_user, master_key):
+    """查询最近一次修改密码后的重新加密进度"""
+    job = RekeyJob.query.filter_by(user_id=current_user.id).order_by(RekeyJob.id.desc()).first()
+    return jsonify({'job': job.to_dict() if job else None}), 200
@@ -0,0 +1,248 @@
+"""
+密码库的流式导出与导入（NDJSON，每行一个JSON对象）
+
+导出格式:
+    {"type": "header", "format": "pmer-export", "version": 2, "encrypted": false, ...}
+    {"type": "entry", "title": ..., "password": ..., "category": ..., ...}
+    {"type": "error", "id": 12, "error": "invalid_token"}
+    {"type": "footer", "count": 1000, "errors": 0}
+
+encrypted=true 时条目行只包含原样的密文（encrypted_data，以及新格式条目的 encrypted_secret），
+只能由同一主密钥导入。
+版本1的导出（摘要/机密拆分存储之前）中密文条目只有包含全部字段的 encrypted_data，
+导入时作为旧格式条目写入，用户下次登录后由后台任务拆分（见 app.passwords.payload）；
+明文导出的条目行两个版本相同。导入不检查 header，两个版本都可以直接导入。
+字段类型不正确的条目行记入导入结果的 failures，不影响其他条目。
+导出与导入都按固定大小分块处理，内存占用与密码库大小无关。
+"""
+
+import json
+import os
+from datetime import datetime
+from flask import request, jsonify, current_app, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import Password
+from app.passwords import passwords_bp
+from app.auth.routes import token_required
+from app.passwords.payload import encrypt_entries, decrypt_entries, invalid_fields
+from app.passwords import blind_index
+from app.shards import use_shard
+
+# 导出时每次从数据库读取、解密的条目数
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '500'))
+# 导入时每个事务写入的条目数
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+# 导入结果中最多返回的失败行数
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+EXPORT_FORMAT = 'pmer-export'
+# 版本2：密文导出中新增 encrypted_secret（摘要/机密拆分存储）
+EXPORT_VERSION = 2
+
+def _ndjson(obj):
+    return json.dumps(obj, ensure_ascii=False) + '\n'
+
+def _invalid_sealed(entry):
+    """校验密文条目行的字段类型（明文字段在解密后校验），返回错误信息，有效时返回None"""
+    if not isinstance(entry['encrypted_data'], str):
+        return '字段 encrypted_data 必须是字符串'
+    for field in ('encrypted_secret', 'category'):
+        if entry.get(field) is not None and not isinstance(entry[field], str):
+            return f'字段 {field} 必须是字符串'
+    return None
+
+@passwords_bp.route('/export', methods=['GET'])
+@token_required
+def export_passwords(current_user, master_key):
+    """
+    流式导出密码库（NDJSON）
+    查询参数 encrypted=true 时导出原样密文，否则导出解密后的条目
+    """
+    encrypted = request.args.get('encrypted', 'false').lower() == 'true'
+    if not encrypted and not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    user_id = current_user.id
+    # 只选择需要的列，避免ORM对象堆积在会话中
+    statement = select(
+        Password.id, Password.encrypted_data, Password.encrypted_secret, Password.category,
+        Password.created_at, Password.updated_at
+    ).where(Password.user_id == user_id).order_by(Password.id).execution_options(
+        yield_per=EXPORT_CHUNK_SIZE
+    )
+
+    def generate():
+        # 流式输出时请求的会话已在 teardown 中移除，需要为新会话重新选定分片
+        use_shard(user_id)
+        yield _ndjson({
+            'type': 'header',
+            'format': EXPORT_FORMAT,
+            'version': EXPORT_VERSION,
+            'encrypted': encrypted,
+            'exported_at': datetime.utcnow().isoformat()
+        })
+
+        count = 0
+        errors = 0
+        cursor = db.session.execute(statement)
+        try:
+            for rows in cursor.partitions():
+                if encrypted:
+                    results = [None] * len(rows)
+                else:
+                    results = decrypt_entries(user_id, rows, master_key)
+
+                lines = []
+                for row, result in zip(rows, results):
+                    if result is not None and result.error:
+                        errors += 1
+                        lines.append(_ndjson({'type': 'error', 'id': row.id, 'error': result.error}))
+                        continue
+
+                    entry = {
+                        'type': 'entry',
+                        'id': row.id,
+                        'category': row.category,
+                        'created_at': row.created_at.isoformat(),
+                        'updated_at': row.updated_at.isoformat()
+                    }
+                    if result is None:
+                        entry['encrypted_data'] = row.encrypted_data
+                        if row.encrypted_secret is not None:
+                            entry['encrypted_secret'] = row.encrypted_secret
+                    else:
+                        entry.update(result.data)
+                    lines.append(_ndjson(entry))
+                    count += 1
+                yield ''.join(lines)
+        finally:
+            # 客户端中途断开时生成器被关闭，释放读连接
+            cursor.close()
+
+        yield _ndjson({'type': 'footer', 'count': count, 'errors': errors})
+
+    filename = f'pmer-export-{datetime.utcnow():%Y%m%d%H%M%S}.ndjson'
+    return current_app.response_class(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@passwords_bp.route('/import', methods=['POST'])
+@token_required
+def import_passwords(current_user, master_key):
+    """
+    流式导入密码库（NDJSON，格式同导出）
+    逐行读取请求体，每 IMPORT_CHUNK_SIZE 条并行加密/校验后在一个事务中批量写入
+    """
+    if not master_key:
+        return jsonify({'message': '缺少主密钥，请重新登录'}), 400
+
+    user_id = current_user.id
+    imported = 0
+    failures = []
+    failed_count = 0
+    chunk = []  # (行号, 条目)
+
+    def fail(line_no, message):
+        nonlocal failed_count
+        failed_count += 1
+        if len(failures) < IMPORT_MAX_REPORTED_ERRORS:
+            failures.append({'line': line_no, 'message': message})
+
+    def flush_chunk():
+        """加密明文条目、校验密文条目，然后在一个事务中写入本块"""
+        nonlocal imported
+        plain = [(line_no, entry) for line_no, entry in chunk if 'encrypted_data' not in entry]
+        sealed = [(line_no, entry) for line_no, entry in chunk if 'encrypted_data' in entry]
+
+        plain_data = [
+            {field: entry.get(field, '') for field in ('title', 'url', 'username', 'password', 'notes')}
+            for _, entry in plain
+        ]
+        encrypted = encrypt_entries(plain_data, master_key)
+        rows = [
+            (Password(
+                encrypted_data=encrypted_data,
+                encrypted_secret=encrypted_secret,
+                category=entry.get('category') or '',
+                user_id=user_id
+            ), data)
+            for (_, entry), data, (encrypted_data, encrypted_secret) in zip(plain, plain_data, encrypted)
+        ]
+
+        # 密文条目必须能用当前主密钥解密，否则导入后无法读取
+        candidates = [
+            Password(
+                encrypted_data=entry['encrypted_data'],
+                encrypted_secret=entry.get('encrypted_secret'),
+                category=entry.get('category') or '',
+                user_id=user_id
+            )
+            for _, entry in sealed
+        ]
+        checks = decrypt_entries(user_id, candidates, master_key, rotation=False)
+        for (line_no, _), password, result in zip(sealed, candidates, checks):
+            if result.error:
+                fail(line_no, '密文无法用当前主密钥解密')
+                continue
+            error = invalid_fields(result.data)
+            if error:
+                fail(line_no, error)
+                continue
+            rows.append((password, result.data))
+
+        db.session.add_all([password for password, _ in rows])
+        db.session.flush()
+        blind_index.index_entries(user_id, [(password.id, data) for password, data in rows], master_key)
+        db.session.commit()
+        imported += len(rows)
+        chunk.clear()
+
+    try:
+        for line_no, line in enumerate(iter(request.stream.readline, b''), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                fail(line_no, '无效的JSON')
+                continue
+
+            if not isinstance(entry, dict) or entry.get('type', 'entry') != 'entry':
+                # 跳过 header / footer / error 行
+                continue
+            if 'encrypted_data' not in entry and not all(k in entry for k in ('title', 'password')):
+                fail(line_no, '缺少必要字段')
+                continue
+            # 密文条目的明文字段在解密校验后检查
+            error = _invalid_sealed(entry) if 'encrypted_data' in entry else invalid_fields(entry)
+            if error:
+                fail(line_no, error)
+                continue
+
+            chunk.append((line_no, entry))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                flush_chunk()
+
+        if chunk:
+            flush_chunk()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.exception('导入失败')
+        return jsonify({
+            'message': f'导入失败: {str(e)}',
+            'imported': imported,
+            'failed': failed_count,
+            'failures': failures
+        }), 400
+
+    return jsonify({
+        'message': '导入完成',
+        'imported': imported,
+        'failed': failed_count,
+        'failures': failures
+    }), 200
@@ -0,0 +1,241 @@
+"""
+数据库结构版本与迁移
+
+每个数据库（中心库和每个分片）中的 schema_version 表记录已执行的迁移。
+应用启动时只查询一次版本号：已是最新时不做任何DDL（取代每次启动都执行的 create_all）；
+落后时按 SCHEMA_AUTO_MIGRATE 自动升级，或拒绝启动并提示先运行 migrate_database.py。
+
+迁移按版本号顺序执行，每一步都先检查表/列/索引是否已存在，因此：
+- 新数据库从第1步开始建出与当前模型一致的结构，之后的步骤都不做任何事；
+- 没有版本表的旧数据库（此前由 create_all 创建）可以直接升级，已有的部分会被跳过。
+升级在一个事务中进行并持有写锁（SQLite: BEGIN IMMEDIATE，PostgreSQL: 事务级咨询锁），
+多个进程同时启动时只有一个执行迁移，其余等待后发现已是最新版本。
+
+新增模型字段或索引时，在 MIGRATIONS 末尾追加一步。
+"""
+
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Integer, LargeBinary, MetaData, String, Table, func, insert, inspect, select, text
+)
+from sqlalchemy.schema import CreateColumn
+from app import db, models  # 导入 models 使模型的表注册到 metadata
+
+# 启动时发现结构落后是否自动升级；为 false 时需要先运行 migrate_database.py
+SCHEMA_AUTO_MIGRATE = os.getenv('SCHEMA_AUTO_MIGRATE', 'true').lower() == 'true'
+
+# PostgreSQL 迁移咨询锁的键
+SCHEMA_LOCK_KEY = 0x706d6572
+
+# 版本表不属于模型的 metadata，不参与任何 create_all
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(64), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+
+class SchemaOutdatedError(RuntimeError):
+    """数据库结构落后于代码且未启用自动升级"""
+
+class Migrator:
+    """
+    迁移步骤使用的DDL操作，都是幂等的
+    tables 为本数据库包含的表（分片只包含条目表），范围之外的操作直接跳过
+    """
+
+    def __init__(self, connection, tables=None):
+        self.connection = connection
+        self.tables = tables
+
+    def in_scope(self, table_name):
+        return self.tables is None or table_name in self.tables
+
+    def columns(self, table_name):
+        return {column['name']: column for column in inspect(self.connection).get_columns(table_name)}
+
+    def create_tables(self, *names):
+        """按当前模型创建尚不存在的表（连同模型中声明的索引）"""
+        tables = [db.metadata.tables[name] for name in names if self.in_scope(name)]
+        db.metadata.create_all(self.connection, tables=tables, checkfirst=True)
+
+    def add_column(self, table_name, column_name):
+        """按当前模型的列定义为已有的表添加列"""
+        if not self.in_scope(table_name) or column_name in self.columns(table_name):
+            return
+        table = db.metadata.tables[table_name]
+        preparer = self.connection.dialect.identifier_preparer
+        column_ddl = CreateColumn(table.c[column_name]).compile(dialect=self.connection.dialect)
+        self.connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}'))
+
+    def create_index(self, table_name, index_name):
+        if not self.in_scope(table_name):
+            return
+        index = next(index for index in db.metadata.tables[table_name].indexes if index.name == index_name)
+        index.create(self.connection, checkfirst=True)
+
+def _initial(m):
+    m.create_tables('users', 'passwords', 'commands')
+
+def _password_list_indexes(m):
+    m.create_index('passwords', 'ix_passwords_user_category_id')
+    m.create_index('passwords', 'ix_passwords_user_id_id')
+
+def _user_kdf_params(m):
+    m.add_column('users', 'kdf_algorithm')
+    m.add_column('users', 'kdf_params')
+
+def _incremental_sync(m):
+    m.create_tables('deleted_entries')
+    m.create_index('passwords', 'ix_passwords_user_updated')
+    m.create_index('commands', 'ix_commands_user_updated')
+
+def _rekey_jobs(m):
+    m.add_column('users', 'key_version')
+    m.create_tables('rekey_jobs')
+
+def _blind_index(m):
+    m.create_tables('password_search_tokens')
+
+def _split_secret(m):
+    m.add_column('passwords', 'encrypted_secret')
+
+def _binary_tokens(m):
+    """
+    令牌改为以原始字节存储：PostgreSQL 的文本列需要改为 bytea（在SQL中完成base64url解码）；
+    SQLite 的列类型不受约束，不需要任何DDL。仍是文本的令牌由启动后的后台任务逐批改写
+    （见 app.passwords.convert），不在持有写锁的迁移事务中改写整张表
+    """
+    if not m.in_scope('passwords'):
+        return
+    if m.connection.dialect.name == 'postgresql':
+        columns = m.columns('passwords')
+        for name in ('encrypted_data', 'encrypted_secret'):
+            if not isinstance(columns[name]['type'], LargeBinary):
+                m.connection.execute(text(
+                    f'ALTER TABLE passwords ALTER COLUMN {name} TYPE bytea '
+                    f"USING decode(translate({name}, '-_', '+/'), 'base64')"
+                ))
+
+def _command_search(m):
+    """命令库全文检索：SQLite FTS5 索引与同步触发器；其他数据库使用 LIKE 检索，不需要结构"""
+    from app.commands.search import create_search_index, fts5_supported
+    if m.in_scope('commands') and m.connection.dialect.name == 'sqlite' and fts5_supported():
+        create_search_index(m.connection)
+
+def _entry_groups(m):
+    """分类/命令类型的条目计数表，按已有条目回填"""
+    from app.groups import rebuild_groups
+    if not m.in_scope('entry_groups'):
+        return
+    m.create_tables('entry_groups')
+    rebuild_groups(m.connection)
+
+def _change_events(m):
+    m.create_tables('change_events')
+
+def _insert_sentinels(m):
+    """批量插入的哨兵列（见 Password._sentinel），旧数据保持为空"""
+    m.add_column('passwords', '_sentinel')
+    m.add_column('commands', '_sentinel')
+
+MIGRATIONS = (
+    Migration(1, 'initial', _initial),
+    Migration(2, 'password_list_indexes', _password_list_indexes),
+    Migration(3, 'user_kdf_params', _user_kdf_params),
+    Migration(4, 'incremental_sync', _incremental_sync),
+    Migration(5, 'rekey_jobs', _rekey_jobs),
+    Migration(6, 'blind_index', _blind_index),
+    Migration(7, 'split_secret', _split_secret),
+    Migration(8, 'binary_tokens', _binary_tokens),
+    Migration(9, 'command_search', _command_search),
+    Migration(10, 'entry_groups', _entry_groups),
+    Migration(11, 'change_events', _change_events),
+    Migration(12, 'insert_sentinels', _insert_sentinels),
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def current_version(connection):
+    """数据库的结构版本，没有版本表时为0"""
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+@contextmanager
+def _migration_transaction(engine):
+    """持有数据库写锁的迁移事务，DDL与版本记录一起提交或回滚"""
+    if engine.dialect.name == 'sqlite':
+        # pysqlite 默认不为DDL开启事务，改为手动 BEGIN IMMEDIATE：立即取得写锁，DDL也可回滚
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.exec_driver_sql('ROLLBACK')
+                raise
+            connection.exec_driver_sql('COMMIT')
+        return
+
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+        yield connection
+
+def pending_migrations(engine):
+    with engine.connect() as connection:
+        version = current_version(connection)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+def upgrade(engine, tables=None):
+    """
+    把数据库升级到最新版本，返回执行了的迁移列表
+    已是最新版本时只做一次版本查询
+    """
+    if not pending_migrations(engine):
+        return []
+
+    with _migration_transaction(engine) as connection:
+        # 取得锁后重新读取版本：其他进程可能已经完成了升级
+        version = current_version(connection)
+        schema_version.create(connection, checkfirst=True)
+        applied = []
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            migration.apply(Migrator(connection, tables))
+            connection.execute(insert(schema_version).values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+            ))
+            applied.append(migration)
+        return applied
+
+def _check_database(app, name, engine, tables=None):
+    if not SCHEMA_AUTO_MIGRATE:
+        pending = pending_migrations(engine)
+        if pending:
+            raise SchemaOutdatedError(
+                f'{name}结构落后 {len(pending)} 个版本（最新为 {LATEST_VERSION}），请先运行 python migrate_database.py'
+            )
+        return
+    for migration in upgrade(engine, tables):
+        app.logger.info('%s已执行数据库迁移 %s: %s', name, migration.version, migration.name)
+
+def check_schema(app):
+    """
+    启动时检查中心库和各分片的结构版本，按配置自动升级或拒绝启动
+    分片也在这里升级，请求中只会遇到已是最新版本的分片（user 模式的新分片见 app.shards.create_shard）
+    """
+    with app.app_context():
+        _check_database(app, '中心库', db.engine)
+
+    from app.shards import SHARDED_TABLES, shard_engine, sharding_enabled, startup_shards
+    if not sharding_enabled():
+        return
+    for name in startup_shards():
+        with shard_engine(name) as engine:
+            _check_database(app, f'分片 {name} ', engine, SHARDED_TABLES)
@@ -0,0 +1,96 @@
+"""
+JSON序列化
+
+JSONProvider 在安装了 orjson 时用它编码和解析（直接生成UTF-8字节），否则使用标准库；
+两种实现输出相同的JSON：不转义非ASCII字符、不排序键，日期时间统一为 ISO 8601（与 to_dict 一致），
+因此列表可以直接传入数据库中的 datetime，不必逐条调用 isoformat()。
+
+大列表用 stream_json 逐块编码：先输出其他字段，再每次编码一块条目（如每次解密的一批），
+不需要在内存中拼出完整的响应体；流式输出发生在请求统计结束之后，不计入 serialize 耗时。
+"""
+
+import json
+import os
+from datetime import date
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+# orjson（默认，未安装时自动回退）/ stdlib
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'orjson').lower()
+# 流式列表每次编码的条目数
+JSON_STREAM_CHUNK_SIZE = int(os.getenv('JSON_STREAM_CHUNK_SIZE', '500'))
+
+def _default(o):
+    """标准库无法直接编码的类型；日期与 orjson 一样输出 ISO 8601"""
+    if isinstance(o, date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask 的JSON提供者，所有编码都经过 encode（返回字节）"""
+
+    ensure_ascii = False
+    sort_keys = False
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = orjson is not None and JSON_ENCODER == 'orjson'
+
+    def encode(self, obj, indent=False):
+        """把对象编码为UTF-8字节"""
+        if self.fast:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, default=self.default, option=option)
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=False,
+            **({'indent': 2} if indent else {'separators': (',', ':')})
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+def stream_json(fields, key, chunks, trailer=None):
+    """
+    逐块生成 {**fields, key: [条目...], **trailer()} 的JSON字节
+    chunks 为条目列表的可迭代对象，每块编码一次；
+    trailer 在全部条目输出后调用，返回追加在列表之后的字段（如逐块累计的解密错误）
+    """
+    encode = current_app.json.encode
+
+    def members(values):
+        return b''.join(encode(name) + b':' + encode(value) + b',' for name, value in values.items())
+
+    yield b'{' + members(fields) + encode(key) + b':['
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        body = encode(chunk)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    tail = trailer() if trailer else {}
+    yield b']' + (b',' + members(tail)[:-1] if tail else b'') + b'}\n'
+
+def stream_response(fields, key, chunks, trailer=None):
+    """返回流式JSON响应（在请求上下文中生成，期间可以继续查询数据库）"""
+    return current_app.response_class(
+        stream_with_context(stream_json(fields, key, chunks, trailer)), mimetype=current_app.json.mimetype
+    )
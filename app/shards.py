@@ -0,0 +1,166 @@
+"""
+按用户分片的SQLite存储（可选）
+
+所有用户共用一个SQLite文件时，任何一次提交都要争用同一把数据库写锁。
+分片模式下 users 表留在中心库（DATABASE_URI），每个用户的条目相关表
+（密码、命令、删除记录、重新加密任务、盲索引、分组计数、变动通知）存放在独立的SQLite文件中：
+- SHARD_MODE=hash：按 user_id 取模分布到 SHARD_COUNT 个分片文件
+- SHARD_MODE=user：每个用户一个文件
+不同分片的写入互不阻塞，写吞吐随活跃用户数（分片数）增长。
+
+路由对蓝图处理函数透明：认证装饰器调用 use_shard() 为当前会话选定用户的分片，
+之后涉及条目表的查询和写入由 RoutingSession.get_bind 自动发往该分片，users 表仍走中心库。
+后台线程在操作某个用户的数据前同样需要调用 use_shard()。
+
+条目id只在分片内唯一（跨用户可能重复），接口中的id本来就只在用户范围内使用。
+已有的单文件数据库用 shard_database.py 拆分。
+"""
+
+import glob
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.util import find_tables
+from app import db, RoutingSession, SQLITE_BUSY_TIMEOUT, DB_POOL_TIMEOUT, _apply_sqlite_pragmas
+from app.schema import upgrade
+
+# none（不分片）/ hash（固定数量的分片文件）/ user（每个用户一个文件）
+SHARD_MODE = os.getenv('SHARD_MODE', 'none').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '16'))
+SHARD_DIR = os.getenv('SHARD_DIR', 'shards')
+# 每个分片的连接数
+SHARD_POOL_SIZE = int(os.getenv('SHARD_POOL_SIZE', '4'))
+# 同时保持打开的分片引擎数（user 模式下分片数量不固定）
+SHARD_ENGINE_CACHE_SIZE = int(os.getenv('SHARD_ENGINE_CACHE_SIZE', '256'))
+
+# 存放在用户分片中的表
+SHARDED_TABLES = (
+    'passwords', 'commands', 'deleted_entries', 'rekey_jobs', 'password_search_tokens', 'entry_groups',
+    'change_events'
+)
+
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
+
+def sharding_enabled():
+    return SHARD_MODE in ('hash', 'user')
+
+def shard_name(user_id):
+    """用户所在分片的名称"""
+    if SHARD_MODE == 'user':
+        return f'user_{user_id}'
+    return f'shard_{user_id % SHARD_COUNT:03d}'
+
+def shard_path(name):
+    return os.path.join(SHARD_DIR, f'{name}.db')
+
+def all_shards():
+    """所有已创建的分片名称，按名称排序（hash 模式的分片在启动时全部创建，user 模式的分片在注册用户后创建）"""
+    prefix = 'user_' if SHARD_MODE == 'user' else 'shard_'
+    return sorted(
+        os.path.basename(path)[:-len('.db')]
+        for path in glob.glob(os.path.join(SHARD_DIR, f'{prefix}*.db'))
+    )
+
+def sharded_tables():
+    return [db.metadata.tables[name] for name in SHARDED_TABLES]
+
+def startup_shards():
+    """启动时检查并升级的分片：hash 模式为全部分片（尚不存在的在升级时创建），user 模式为已创建的分片"""
+    if SHARD_MODE == 'hash':
+        return [shard_name(index) for index in range(SHARD_COUNT)]
+    return all_shards()
+
+def _create_engine(name):
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    engine = create_engine(
+        f'sqlite:///{os.path.abspath(shard_path(name))}',
+        pool_size=SHARD_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={'timeout': SQLITE_BUSY_TIMEOUT / 1000, 'check_same_thread': False}
+    )
+    event.listen(engine, 'connect', partial(_apply_sqlite_pragmas, read_only=False))
+    return engine
+
+@contextmanager
+def shard_engine(name):
+    """分片的临时引擎（启动检查与迁移脚本使用，不占用分片引擎缓存）"""
+    engine = _create_engine(name)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+def engine_for(name):
+    """
+    分片的引擎（惰性创建）
+    分片在启动时（见 app.schema.check_schema）或注册用户后（见 create_shard）就已升级到最新版本，
+    这里的检查只做一次版本查询；仍然保留是为了覆盖运行期间从备份恢复或拆分脚本新建的分片
+    """
+    with _engines_lock:
+        engine = _engines.get(name)
+        if engine is not None:
+            _engines.move_to_end(name)
+            return engine
+
+        engine = _create_engine(name)
+        upgrade(engine, tables=SHARDED_TABLES)
+        _engines[name] = engine
+
+        # 关闭最久未使用的分片引擎；正在使用的连接归还时才会真正关闭
+        while len(_engines) > SHARD_ENGINE_CACHE_SIZE:
+            _, evicted = _engines.popitem(last=False)
+            evicted.dispose()
+        return engine
+
+def create_shard(user_id):
+    """
+    注册用户后调用：user 模式下创建新用户的分片并执行建表迁移（hash 模式的分片已在启动时创建）
+    在响应发送后执行，建表不计入任何请求，也不会留到用户的第一个请求中
+    """
+    if SHARD_MODE == 'user':
+        engine_for(shard_name(user_id))
+
+def use_shard(user_id):
+    """为当前会话选定用户的分片（未启用分片时不做任何事）"""
+    if sharding_enabled():
+        use_shard_name(shard_name(user_id))
+
+def use_shard_name(name):
+    """
+    按分片名称选定分片（遍历所有分片的维护任务直接使用）
+    切换到另一个分片时清空会话中的对象：不同分片的主键可能重复
+    """
+    session = db.session()
+    if session.info.get('pmer_shard') not in (None, name):
+        session.expunge_all()
+    session.info['pmer_shard'] = name
+
+def _statement_tables(mapper, clause):
+    if mapper is not None:
+        return [mapper.local_table]
+    if clause is not None:
+        return find_tables(clause, include_crud=True)
+    return []
+
+def route(session, mapper, clause):
+    """RoutingSession 的分片路由：涉及条目表时返回所选分片的引擎，否则返回None"""
+    if not any(table.name in SHARDED_TABLES for table in _statement_tables(mapper, clause)):
+        return None
+    name = session.info.get('pmer_shard')
+    if name is None:
+        raise RuntimeError('访问条目表前需要先调用 use_shard() 选定用户分片')
+    return engine_for(name)
+
+def configure_sharding(app):
+    """启用分片时为会话注册分片路由"""
+    if not sharding_enabled():
+        return
+    if SHARD_MODE == 'hash' and SHARD_COUNT < 1:
+        raise ValueError('SHARD_COUNT 必须大于0')
+    RoutingSession.shard_router = staticmethod(route)
+    app.logger.info('分片存储已启用: mode=%s dir=%s', SHARD_MODE, os.path.abspath(SHARD_DIR))
@@ -0,0 +1,40 @@
+"""
+增量同步辅助函数
+
+客户端保存上次同步返回的 cursor，下次带上 since=<cursor> 只拉取此后变化的条目：
+upserted 为新增或修改过的条目，deleted 为已删除条目的id。
+客户端应先应用 deleted 再应用 upserted（SQLite可能复用已删除条目的id）。
+"""
+
+import os
+from datetime import datetime, timedelta
+from app import db
+from app.models import DeletedEntry
+
+# cursor 相对服务器当前时间回退的秒数。
+# updated_at 在flush时生成、提交稍晚，回退一个窗口可避免漏掉正在提交的事务；
+# 代价是窗口内的条目可能被重复返回，客户端按id覆盖即可
+SYNC_CURSOR_SKEW = timedelta(seconds=int(os.getenv('SYNC_CURSOR_SKEW', '5')))
+
+def parse_since(value):
+    """解析 since 参数（ISO 8601时间），未提供时返回None；格式错误抛出ValueError"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def new_cursor():
+    """生成本次同步的cursor，必须在查询之前调用"""
+    return (datetime.utcnow() - SYNC_CURSOR_SKEW).isoformat()
+
+def record_deletion(user_id, entity, entity_id):
+    """记录一条删除（随当前事务一起提交）"""
+    db.session.add(DeletedEntry(entity=entity, entity_id=entity_id, user_id=user_id))
+
+def deleted_since(user_id, entity, since):
+    """返回 since 之后被删除的条目id列表"""
+    rows = db.session.query(DeletedEntry.entity_id).filter(
+        DeletedEntry.user_id == user_id,
+        DeletedEntry.entity == entity,
+        DeletedEntry.deleted_at >= since
+    ).distinct().all()
+    return [row[0] for row in rows]
@@ -0,0 +1,121 @@
+"""
+客户端解密模式的服务器CPU对比
+
+同一个合成密码库分别以服务端解密（默认）和 mode=ciphertext（只返回密文）请求列表，
+测量每个列表请求在服务器上消耗的CPU时间与响应大小。
+CPU时间在WSGI调用外层用 time.thread_time() 测量，只包含服务器处理请求的部分，
+不含测试客户端构造请求和解析响应的开销。
+
+用法:
+    python -m bench.client_decryption --passwords 5000 --page-sizes 50 500
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from bench.suite import ClientDriver, login
+from bench.vault import seed_user
+
+MODES = ('server', 'ciphertext')
+
+class CpuMeter:
+    """包装 app.wsgi_app，记录当前线程最近一次请求消耗的CPU时间"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._local = threading.local()
+
+    def __call__(self, environ, start_response):
+        start = time.thread_time()
+        try:
+            # 测试客户端在同一线程中读完响应体，流式响应的序列化也计入
+            return list(self.wsgi_app(environ, start_response))
+        finally:
+            self._local.last = time.thread_time() - start
+
+    @property
+    def last(self):
+        return self._local.last
+
+def measure(driver, meter, token, mode, page_size, password_ids, requests, rng):
+    """顺序发送 requests 个列表请求，返回每个请求的服务器CPU毫秒数与平均响应字节数"""
+    cpu_ms = []
+    sizes = []
+    # 只从能取满一页的位置开始，使每个请求处理的条目数相同
+    starts = password_ids[:max(1, len(password_ids) - page_size)]
+    suffix = '&mode=ciphertext' if mode == 'ciphertext' else ''
+    for _ in range(requests):
+        after_id = rng.choice(starts)
+        status, body = driver.request('GET', f'/api/passwords/?limit={page_size}&after_id={after_id}{suffix}', token)
+        if status != 200:
+            raise RuntimeError(f'列表请求失败: {status} {body}')
+        cpu_ms.append(meter.last * 1000)
+        sizes.append(len(json.dumps(body, ensure_ascii=False).encode()))
+    return cpu_ms, statistics.fmean(sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description='对比服务端解密与客户端解密模式下列表请求的服务器CPU')
+    parser.add_argument('--passwords', type=int, default=2000, help='密码条目数')
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[50, 500], help='每页条数')
+    parser.add_argument('--requests', type=int, default=200, help='每种模式、每种页大小的请求数')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='把JSON结果写入文件')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    from app import create_app, db
+    app = create_app()
+    meter = app.wsgi_app = CpuMeter(app.wsgi_app)
+
+    with app.app_context():
+        seeded = seed_user('bench0', 'bench-password-0', args.passwords, 0, args.seed)
+        db.session.remove()
+
+    driver = ClientDriver(app)
+    token, status = login(driver, seeded)
+    if not token:
+        raise RuntimeError(f'登录失败: {status}')
+    _, body = driver.request('GET', '/api/passwords/', token)
+    password_ids = [0] + [entry['id'] for entry in body['passwords']]
+
+    results = {}
+    for page_size in args.page_sizes:
+        for mode in MODES:
+            rng = random.Random(f'{args.seed}:{page_size}')
+            measure(driver, meter, token, mode, page_size, password_ids, args.warmup, rng)
+            cpu_ms, size = measure(driver, meter, token, mode, page_size, password_ids, args.requests, rng)
+            cpu_ms.sort()
+            stats = results.setdefault(str(page_size), {})[mode] = {
+                'cpu_ms_mean': round(statistics.fmean(cpu_ms), 3),
+                'cpu_ms_p50': round(cpu_ms[len(cpu_ms) // 2], 3),
+                'cpu_ms_p99': round(cpu_ms[min(len(cpu_ms) - 1, int(len(cpu_ms) * 0.99))], 3),
+                'response_bytes': round(size)
+            }
+            print(
+                f'每页 {page_size:>4} 条 {mode:<10} 服务器CPU 平均 {stats["cpu_ms_mean"]:>8.3f} ms  '
+                f'p50 {stats["cpu_ms_p50"]:>8.3f} ms  p99 {stats["cpu_ms_p99"]:>8.3f} ms  '
+                f'响应 {stats["response_bytes"]:>8} 字节',
+                file=sys.stderr
+            )
+        server, sealed = results[str(page_size)]['server'], results[str(page_size)]['ciphertext']
+        if server['cpu_ms_mean']:
+            print(f'每页 {page_size} 条: 客户端解密模式的服务器CPU为服务端解密的 '
+                  f'{sealed["cpu_ms_mean"] / server["cpu_ms_mean"]:.0%}', file=sys.stderr)
+
+    output = {'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Fernet对象缓存的微基准测试
+
+对比每条记录都重新构造Fernet（旧实现）与使用缓存的Fernet对象时，
+解密一个10k条目的密码库的单条耗时。
+
+用法: python -m bench.fernet_cache [条目数]
+"""
+
+import sys
+import time
+import json
+from cryptography.fernet import Fernet
+from app.passwords.crypto import get_encryption_key, decrypt_password_data, fernet_cache
+
+MASTER_KEY = 'a3' * 32
+
+def decrypt_uncached(encrypted_data, master_key):
+    """旧实现：每条记录都重新派生密钥并构造Fernet"""
+    f = Fernet(get_encryption_key(master_key))
+    return json.loads(f.decrypt(encrypted_data.encode()).decode('utf-8'))
+
+def run(fn, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        fn(token, MASTER_KEY)
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    f = Fernet(get_encryption_key(MASTER_KEY))
+    tokens = [
+        f.encrypt(json.dumps({
+            'title': f'site-{i}',
+            'url': f'https://example{i}.com',
+            'username': f'user{i}',
+            'password': 'correct horse battery staple',
+            'notes': ''
+        }).encode()).decode()
+        for i in range(count)
+    ]
+
+    fernet_cache.clear()
+    uncached = run(decrypt_uncached, tokens)
+    cached = run(decrypt_password_data, tokens)
+
+    print(f'条目数: {count}')
+    print(f'无缓存: 总计 {uncached * 1000:.1f} ms, 单条 {uncached / count * 1e6:.2f} us')
+    print(f'有缓存: 总计 {cached * 1000:.1f} ms, 单条 {cached / count * 1e6:.2f} us')
+    print(f'加速比: {uncached / cached:.2f}x')
+
+if __name__ == '__main__':
+    main()
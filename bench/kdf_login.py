@@ -0,0 +1,82 @@
+"""
+登录密钥派生吞吐量基准测试
+
+一次完整登录（login -> verify_2fa）包含一次口令哈希校验和一次主密钥派生，
+本脚本在有界KDF线程池中重复执行这两步，报告每核每秒可完成的登录数，
+并演示突发请求超过并发+排队上限时被拒绝（429）的数量。
+
+用法: python -m bench.kdf_login [持续秒数]
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import kdf
+
+PASSWORD = 'correct horse battery staple'
+SALT = os.urandom(16).hex()
+
+def one_login(password_hash, algorithm, params):
+    kdf.run_bounded(check_password_hash, password_hash, PASSWORD + SALT)
+    kdf.run_bounded(kdf.derive_key, PASSWORD, SALT, algorithm, params)
+
+def measure(duration, clients, password_hash, algorithm, params):
+    """clients 个并发客户端持续登录 duration 秒，返回完成的登录数"""
+    done = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            one_login(password_hash, algorithm, params)
+            with lock:
+                done += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return done
+
+def burst(size, password_hash):
+    """同时发起 size 个口令校验，统计被拒绝的数量"""
+    rejected = 0
+    lock = threading.Lock()
+
+    def attempt():
+        nonlocal rejected
+        try:
+            kdf.run_bounded(check_password_hash, password_hash, PASSWORD + SALT)
+        except kdf.KdfBusyError:
+            with lock:
+                rejected += 1
+
+    with ThreadPoolExecutor(max_workers=size) as pool:
+        for _ in range(size):
+            pool.submit(attempt)
+    return rejected
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    cores = os.cpu_count() or 1
+    password_hash = generate_password_hash(PASSWORD + SALT, method=kdf.PASSWORD_HASH_METHOD)
+    algorithm, params = kdf.default_kdf()
+
+    print(f'口令哈希: {password_hash.split("$", 1)[0]}, 主密钥派生: {algorithm} {params}')
+    print(f'CPU核数: {cores}, KDF并发上限: {kdf.KDF_MAX_CONCURRENCY}, 排队上限: {kdf.KDF_MAX_QUEUE}')
+
+    for clients in sorted({1, kdf.KDF_MAX_CONCURRENCY}):
+        done = measure(duration, clients, password_hash, algorithm, params)
+        rate = done / duration
+        print(f'{clients} 个并发客户端: {rate:.1f} 次登录/秒, 每核 {rate / cores:.1f} 次登录/秒')
+
+    size = (kdf.KDF_MAX_CONCURRENCY + kdf.KDF_MAX_QUEUE) * 4
+    print(f'突发 {size} 个请求: {burst(size, password_hash)} 个被拒绝(429)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+大列表的序列化与压缩基准测试
+
+用一个含 --entries 个密码条目和命令的合成密码库，测量完整列表接口（不分页）的：
+- ms：服务器生成并传完整个响应的耗时（中位数，测试客户端读完流式响应）
+- bytes：响应正文字节数（按 Accept-Encoding 协商后的编码）
+- peak_kb：一次请求期间Python分配内存的峰值（tracemalloc，单独测量，不计入耗时）
+
+每种JSON编码器（orjson / stdlib）在独立的子进程中运行（JSON_ENCODER 在导入时读取），
+每个接口分别以 identity、gzip、br（安装了 brotli 时）请求。
+
+用法: python -m bench.serialization --entries 10000 --runs 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ENCODERS = ('orjson', 'stdlib')
+ENDPOINTS = (
+    ('commands', '/api/commands/'),
+    ('passwords', '/api/passwords/'),
+    ('ciphertext', '/api/passwords/?mode=ciphertext'),
+    ('changes', '/api/passwords/changes')
+)
+
+# 在子进程中执行：逐个接口、逐种编码测量
+CHILD = r'''
+import json, os, statistics, sys, time, tracemalloc
+from app import create_app
+from app.compression import available_encodings
+app = create_app()
+client = app.test_client()
+config = json.loads(os.environ['BENCH_CONFIG'])
+results = {'encoder': 'orjson' if app.json.fast else 'stdlib', 'endpoints': {}}
+for name, path in config['endpoints']:
+    for encoding in ('identity',) + available_encodings():
+        headers = {'Authorization': f'Bearer {config["token"]}', 'Accept-Encoding': encoding}
+        def fetch():
+            response = client.get(path, headers=headers)
+            body = response.get_data()
+            assert response.status_code == 200, response.status_code
+            return body
+        for _ in range(config['warmup']):
+            fetch()
+        durations = []
+        for _ in range(config['runs']):
+            start = time.perf_counter()
+            body = fetch()
+            durations.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        fetch()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results['endpoints'][f'{name}/{encoding}'] = {
+            'ms': round(statistics.median(durations), 1),
+            'bytes': len(body),
+            'peak_kb': round(peak / 1024)
+        }
+print(json.dumps(results))
+'''
+
+def prepare_database(directory, entries, seed):
+    """生成密码库并登录，返回 (数据库URI, 令牌)"""
+    from bench.suite import ClientDriver, login
+    from bench.vault import seed_user
+
+    database = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    os.environ['DATABASE_URI'] = database
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        seeded = seed_user('bench0', 'bench-password-0', entries, entries, seed)
+        db.session.remove()
+    token, status = login(ClientDriver(app), seeded)
+    if not token:
+        raise RuntimeError(f'登录失败: {status}')
+    return database, token
+
+def run_child(database, encoder, config):
+    env = dict(
+        os.environ, DATABASE_URI=database, JSON_ENCODER=encoder,
+        REQUEST_LOG_ENABLED='false', BENCH_CONFIG=json.dumps(config)
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'子进程失败:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='pmer 大列表序列化与压缩基准测试')
+    parser.add_argument('--entries', type=int, default=10000, help='密码条目数与命令数')
+    parser.add_argument('--runs', type=int, default=10, help='每个接口、每种编码的测量次数')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--encoders', nargs='+', choices=ENCODERS, default=list(ENCODERS))
+    parser.add_argument('--endpoints', nargs='+', choices=[name for name, _ in ENDPOINTS], default=[name for name, _ in ENDPOINTS])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='把JSON结果写入文件')
+    args = parser.parse_args()
+
+    database, token = prepare_database(tempfile.mkdtemp(), args.entries, args.seed)
+    config = {
+        'token': token, 'runs': args.runs, 'warmup': args.warmup,
+        'endpoints': [endpoint for endpoint in ENDPOINTS if endpoint[0] in args.endpoints]
+    }
+
+    results = {}
+    for encoder in args.encoders:
+        result = run_child(database, encoder, config)
+        if result['encoder'] != encoder:
+            print(f'警告: 未安装 {encoder}，实际使用 {result["encoder"]}', file=sys.stderr)
+        results[encoder] = result['endpoints']
+        for key, stats in result['endpoints'].items():
+            print(
+                f'{encoder:<7} {key:<22} {stats["ms"]:>8.1f} ms  {stats["bytes"]:>10} 字节  峰值内存 {stats["peak_kb"]:>7} KiB',
+                file=sys.stderr
+            )
+
+    output = {'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+冷启动基准测试
+
+每次运行都启动一个全新的Python进程，测量工作进程从零到处理完第一个请求的耗时：
+- import：导入 app 包（含Flask、SQLAlchemy、各蓝图的依赖）
+- create_app：创建应用（含数据库结构版本检查）
+- first_request：第一个已认证的列表请求（建立数据库连接、加载用户、解密一页）
+- process：子进程的总墙钟时间（含解释器自身的启动）
+
+两种数据库状态：
+- migrated：已是最新版本的数据库（正常的工作进程扩容/重启）
+- fresh：空数据库（启动时自动执行全部迁移；不发送请求）
+
+同时检查只在少数接口中使用的重量级模块（qrcode、PIL）没有在启动时被导入。
+
+用法: python -m bench.startup --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 应当延迟到首次使用时才导入的模块
+LAZY_MODULES = ('qrcode', 'PIL')
+STATES = ('migrated', 'fresh')
+
+# 在子进程中执行：测量导入、创建应用与第一个请求
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+token = os.environ.get('BENCH_TOKEN')
+if token:
+    response = app.test_client().get('/api/passwords/?limit=50', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.status_code
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (finished - created) * 1000,
+    'lazy_loaded': [name for name in json.loads(os.environ['BENCH_LAZY_MODULES']) if name in sys.modules]
+}))
+'''
+
+def prepare_database(directory, passwords):
+    """创建已迁移的数据库并生成一个用户，返回 (数据库URI, 令牌)"""
+    from bench.suite import ClientDriver, login
+    from bench.vault import seed_user
+
+    database = f'sqlite:///{os.path.join(directory, "migrated.db")}'
+    os.environ['DATABASE_URI'] = database
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        seeded = seed_user('bench0', 'bench-password-0', passwords, 0)
+        db.session.remove()
+    token, status = login(ClientDriver(app), seeded)
+    if not token:
+        raise RuntimeError(f'登录失败: {status}')
+    return database, token
+
+def run_child(database, token):
+    env = dict(os.environ, DATABASE_URI=database, BENCH_LAZY_MODULES=json.dumps(LAZY_MODULES))
+    env.pop('BENCH_TOKEN', None)
+    if token:
+        env['BENCH_TOKEN'] = token
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'子进程启动失败:\n{result.stderr}')
+    return {**json.loads(result.stdout.strip().splitlines()[-1]), 'process_ms': elapsed}
+
+def summarize(samples):
+    summary = {}
+    for metric in ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms'):
+        values = sorted(sample[metric] for sample in samples)
+        summary[metric] = {
+            'median': round(statistics.median(values), 1),
+            'min': round(values[0], 1),
+            'max': round(values[-1], 1)
+        }
+    summary['lazy_loaded'] = sorted({name for sample in samples for name in sample['lazy_loaded']})
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='pmer 冷启动基准测试')
+    parser.add_argument('--runs', type=int, default=10, help='每种数据库状态的启动次数')
+    parser.add_argument('--passwords', type=int, default=200, help='已迁移数据库中的密码条目数')
+    parser.add_argument('--states', nargs='+', choices=STATES, default=list(STATES))
+    parser.add_argument('--output', help='把JSON结果写入文件')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database, token = prepare_database(directory, args.passwords)
+
+    results = {}
+    for state in args.states:
+        samples = []
+        for i in range(args.runs):
+            if state == 'fresh':
+                samples.append(run_child(f'sqlite:///{os.path.join(directory, f"fresh-{i}.db")}', None))
+            else:
+                samples.append(run_child(database, token))
+        results[state] = stats = summarize(samples)
+        print(
+            f'{state:<9} 导入 {stats["import_ms"]["median"]:>7.1f} ms  创建应用 {stats["create_app_ms"]["median"]:>7.1f} ms  '
+            f'首个请求 {stats["first_request_ms"]["median"]:>7.1f} ms  进程总计 {stats["process_ms"]["median"]:>7.1f} ms（中位数）',
+            file=sys.stderr
+        )
+        if stats['lazy_loaded']:
+            print(f'警告: 启动时导入了应延迟加载的模块: {", ".join(stats["lazy_loaded"])}', file=sys.stderr)
+
+    output = {'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+密文存储格式的基准测试
+
+分别用旧格式（base64文本令牌、带完整字段名的JSON、单个密文包含全部字段）
+与新格式（二进制令牌、紧凑记录+zlib压缩、摘要/机密分列）填充同样的密码库，
+比较数据库文件大小与列表接口的延迟。
+
+用法: python -m bench.storage_format [条目数]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.models import User, Password
+from app.auth.routes import issue_token
+from app.passwords.crypto import get_fernet
+from app.passwords.payload import encrypt_entries
+
+PASSWORD = 'bench-password'
+PAGE_SIZE = 200
+PAGES = 50
+LONG_NOTES = '登录前需要先连接公司VPN，备用验证码保存在保险柜中。' * 20
+
+def make_entries(count):
+    return [{
+        'title': f'站点 {i}',
+        'url': f'https://www.example{i}.com/login',
+        'username': f'user{i}@example.com',
+        'password': 'correct horse battery staple',
+        # 约十分之一的条目带有较长的备注
+        'notes': LONG_NOTES if i % 10 == 0 else ''
+    } for i in range(count)]
+
+def seed(app, entries, legacy):
+    """创建用户并写入条目，返回该用户的JWT令牌"""
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password=PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        master_key = user.generate_master_key(PASSWORD)
+
+        # 两种格式使用相同的时间戳，避免索引大小不同影响结果
+        now = datetime.utcnow()
+        if legacy:
+            fernet = get_fernet(master_key)
+            connection = db.session.connection()
+            connection.exec_driver_sql(
+                'INSERT INTO passwords (encrypted_data, category, user_id, created_at, updated_at) '
+                "VALUES (?, '', ?, ?, ?)",
+                [
+                    (fernet.encrypt(json.dumps(entry, ensure_ascii=False).encode('utf-8')).decode(), user.id, str(now), str(now))
+                    for entry in entries
+                ]
+            )
+        else:
+            connection = db.session.connection()
+            connection.execute(insert(Password.__table__), [
+                {
+                    'encrypted_data': summary, 'encrypted_secret': secret, 'category': '',
+                    'user_id': user.id, 'created_at': now, 'updated_at': now
+                }
+                for summary, secret in encrypt_entries(entries, master_key)
+            ])
+        db.session.commit()
+        db.session.execute(db.text('VACUUM'))
+        return issue_token(user, master_key)
+
+def measure(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    timings = []
+    after_id = None
+    for _ in range(PAGES):
+        url = f'/api/passwords/?limit={PAGE_SIZE}' + (f'&after_id={after_id}' if after_id else '')
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append(time.perf_counter() - start)
+        after_id = response.get_json()['next_cursor']
+        if not after_id:
+            break
+
+    start = time.perf_counter()
+    client.get('/api/passwords/', headers=headers)
+    full = time.perf_counter() - start
+    return sum(timings) / len(timings), full
+
+def run(count, legacy):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URI'] = f'sqlite:///{path}'
+    app = create_app()
+    token = seed(app, make_entries(count), legacy)
+    page, full = measure(app.test_client(), token)
+    return os.path.getsize(path), page, full
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f'条目数: {count}（每页 {PAGE_SIZE} 条，测量前 {PAGES} 页）')
+    results = {}
+    for name, legacy in (('旧格式', True), ('新格式', False)):
+        size, page, full = results[name] = run(count, legacy)
+        print(f'{name}: 数据库 {size / 1024 / 1024:.1f} MiB, 单页 {page * 1000:.1f} ms, 全量列表 {full * 1000:.0f} ms')
+
+    old, new = results['旧格式'], results['新格式']
+    print(f'数据库体积: {new[0] / old[0]:.0%}，单页延迟: {new[1] / old[1]:.0%}，全量列表: {new[2] / old[2]:.0%}')
+
+if __name__ == '__main__':
+    main()
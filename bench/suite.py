@@ -0,0 +1,389 @@
+"""
+端到端基准测试套件
+
+用合成密码库（bench.vault）填充一个临时数据库，通过真实的 create_app() 测量
+登录（login -> verify_2fa）、列表、详情、创建、更新、命令检索等操作的吞吐量与 p50/p99 延迟。
+
+两种驱动：
+- client：进程内的 Flask 测试客户端，没有网络与HTTP解析开销，适合对比应用本身的改动
+- http：在本机启动多线程的 werkzeug 服务器，用多个线程并发发送真实的HTTP请求
+
+结果以JSON输出（含提交号与运行参数），可用 --compare 与之前保存的结果对比，
+p99 延迟或吞吐量的退化超过 --threshold 时以非零状态退出，便于在CI中发现性能回退。
+
+用法:
+    python -m bench.suite --passwords 10000 --output results.json
+    python -m bench.suite --passwords 10000 --compare results.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pyotp
+from werkzeug.serving import WSGIRequestHandler, make_server
+from bench.vault import COMMAND_TYPES, seed_users, make_password_entry
+
+# 列表场景的每页条数
+PAGE_SIZE = 50
+SCENARIOS = ('login', 'list', 'detail', 'secret', 'commands', 'search', 'create', 'update')
+DRIVERS = ('client', 'http')
+
+class ClientDriver:
+    """进程内测试客户端；每个线程使用独立的客户端"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """使用HTTP/1.1，客户端线程可以复用连接"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+class HttpDriver:
+    """在本机端口上运行多线程服务器，每个线程保持自己的连接"""
+
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, name='bench-http', daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        return connection
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # 服务器关闭了空闲连接，重新连接后重试一次
+            connection.close()
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        self.server.shutdown()
+
+class BenchUser:
+    """一个基准测试用户：凭据、登录后的令牌与条目id"""
+
+    def __init__(self, seeded):
+        self.seeded = seeded
+        self.token = None
+        self.password_ids = []
+
+def login(driver, seeded):
+    """完整登录流程，返回正式令牌；失败时返回 (None, 状态码)"""
+    status, body = driver.request('POST', '/api/auth/login', body={
+        'username': seeded.username, 'password': seeded.password
+    })
+    if status != 200 or not body.get('temp_token'):
+        return None, status
+    status, body = driver.request('POST', '/api/auth/verify-2fa', body={
+        'temp_token': body['temp_token'], 'code': pyotp.TOTP(seeded.totp_secret).now()
+    })
+    if status != 200:
+        return None, status
+    return body['token'], status
+
+def prepare_users(driver, seeded_users):
+    """登录所有用户并取得其条目id（不计入测量）"""
+    users = []
+    for seeded in seeded_users:
+        user = BenchUser(seeded)
+        user.token, status = login(driver, seeded)
+        if not user.token:
+            raise RuntimeError(f'用户 {seeded.username} 登录失败: {status}')
+        after_id = None
+        while True:
+            path = '/api/passwords/?limit=500' + (f'&after_id={after_id}' if after_id else '')
+            status, body = driver.request('GET', path, user.token)
+            user.password_ids.extend(entry['id'] for entry in body['passwords'])
+            after_id = body['next_cursor']
+            if not after_id:
+                break
+        users.append(user)
+    return users
+
+def scenario_ops(name, driver, users, rng_seed):
+    """返回 op(worker, i) -> 状态码；每个工作线程固定使用一个用户"""
+    rngs = {}
+
+    def context(worker):
+        if worker not in rngs:
+            rngs[worker] = random.Random(f'{rng_seed}:{name}:{worker}')
+        return users[worker % len(users)], rngs[worker]
+
+    def op_login(worker, i):
+        user, _ = context(worker)
+        return login(driver, user.seeded)[1]
+
+    def op_list(worker, i):
+        user, rng = context(worker)
+        # 从随机位置开始取一页，覆盖不同的游标位置
+        after_id = rng.choice(user.password_ids) if user.password_ids else 0
+        return driver.request('GET', f'/api/passwords/?limit={PAGE_SIZE}&after_id={after_id}', user.token)[0]
+
+    def op_detail(worker, i):
+        user, rng = context(worker)
+        return driver.request('GET', f'/api/passwords/{rng.choice(user.password_ids)}', user.token)[0]
+
+    def op_secret(worker, i):
+        user, rng = context(worker)
+        return driver.request('GET', f'/api/passwords/{rng.choice(user.password_ids)}/secret', user.token)[0]
+
+    def op_commands(worker, i):
+        user, _ = context(worker)
+        return driver.request('GET', '/api/commands/', user.token)[0]
+
+    def op_search(worker, i):
+        user, rng = context(worker)
+        # 命令类型 + 编号前缀，例如 "dock 12"
+        q = f'{rng.choice(COMMAND_TYPES)[:4]} {rng.randint(1, 999)}'
+        return driver.request('GET', f'/api/commands/search?q={q.replace(" ", "+")}&limit=20', user.token)[0]
+
+    def op_create(worker, i):
+        user, rng = context(worker)
+        entry, category = make_password_entry(rng, i)
+        return driver.request('POST', '/api/passwords/', user.token, {**entry, 'category': category})[0]
+
+    def op_update(worker, i):
+        user, rng = context(worker)
+        body = {'password': f'rotated-{i}', 'notes': f'更新于第 {i} 次'}
+        return driver.request('PUT', f'/api/passwords/{rng.choice(user.password_ids)}', user.token, body)[0]
+
+    return {
+        'login': op_login, 'list': op_list, 'detail': op_detail, 'secret': op_secret,
+        'commands': op_commands, 'search': op_search, 'create': op_create, 'update': op_update
+    }[name]
+
+# 各场景成功时的状态码
+EXPECTED_STATUS = {'create': 201}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_scenario(name, op, requests, concurrency, warmup):
+    """
+    concurrency 个线程共执行 requests 次 op，返回统计结果
+    吞吐量与延迟只统计成功的请求，被拒绝（如登录的429）或失败的请求计入 errors
+    """
+    expected = str(EXPECTED_STATUS.get(name, 200))
+    for i in range(warmup):
+        op(i % concurrency, -1 - i)
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(index):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                status = op(index, i)
+            except Exception:
+                status = 'exception'
+            elapsed = time.perf_counter() - start
+            with lock:
+                if str(status) == expected:
+                    latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(concurrency):
+            pool.submit(worker, index)
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': requests - len(latencies),
+        'statuses': statuses,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    database = args.database or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    os.environ['DATABASE_URI'] = database
+    from app import create_app, db
+    app = create_app()
+
+    start = time.perf_counter()
+    with app.app_context():
+        seeded_users = seed_users(args.users, args.passwords, args.commands, args.seed)
+        db.session.remove()
+    seed_seconds = time.perf_counter() - start
+    print(f'已生成 {args.users} 个用户 × {args.passwords} 个密码条目，用时 {seed_seconds:.1f} 秒', file=sys.stderr)
+
+    results = {}
+    for driver_name in args.drivers:
+        driver = ClientDriver(app) if driver_name == 'client' else HttpDriver(app)
+        try:
+            users = prepare_users(driver, seeded_users)
+            results[driver_name] = {}
+            for name in args.scenarios:
+                # 登录受KDF限制，单独使用较少的请求数
+                requests = args.login_requests if name == 'login' else args.requests
+                warmup = min(args.warmup, 2) if name == 'login' else args.warmup
+                stats = run_scenario(
+                    name, scenario_ops(name, driver, users, args.seed), requests, args.concurrency, warmup
+                )
+                results[driver_name][name] = stats
+                print(
+                    f'[{driver_name}] {name:<8} {stats["throughput_rps"]:>9.1f} 次/秒  '
+                    f'p50 {stats["p50_ms"]:>8.2f} ms  p99 {stats["p99_ms"]:>8.2f} ms  错误 {stats["errors"]}',
+                    file=sys.stderr
+                )
+        finally:
+            driver.close()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'database': database.split(':', 1)[0]
+        },
+        'config': {
+            'users': args.users,
+            'passwords': args.passwords,
+            'commands': args.commands,
+            'requests': args.requests,
+            'login_requests': args.login_requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'seed_seconds': round(seed_seconds, 2)
+        },
+        'results': results
+    }
+
+def compare(baseline, current, threshold):
+    """打印与基准结果的对比，返回退化的 (驱动, 场景, 指标) 列表"""
+    regressions = []
+    different = [
+        key for key in ('users', 'passwords', 'commands', 'concurrency')
+        if baseline.get('config', {}).get(key) != current['config'][key]
+    ]
+    if different:
+        print(f'注意: 运行参数与基准结果不同（{", ".join(different)}），对比结果可能没有意义', file=sys.stderr)
+    for driver_name, scenarios in current['results'].items():
+        for name, stats in scenarios.items():
+            base = baseline.get('results', {}).get(driver_name, {}).get(name)
+            if not base:
+                continue
+            changes = {
+                'p99_ms': stats['p99_ms'] / base['p99_ms'] - 1 if base['p99_ms'] else 0.0,
+                'throughput_rps': 1 - stats['throughput_rps'] / base['throughput_rps'] if base['throughput_rps'] else 0.0
+            }
+            print(
+                f'[{driver_name}] {name:<8} p50 {base["p50_ms"]:.2f} -> {stats["p50_ms"]:.2f} ms, '
+                f'p99 {base["p99_ms"]:.2f} -> {stats["p99_ms"]:.2f} ms ({changes["p99_ms"]:+.0%}), '
+                f'吞吐 {base["throughput_rps"]:.1f} -> {stats["throughput_rps"]:.1f} 次/秒',
+                file=sys.stderr
+            )
+            regressions.extend((driver_name, name, metric) for metric, change in changes.items() if change > threshold)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='pmer 端到端基准测试')
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--passwords', type=int, default=1000, help='每个用户的密码条目数（1000~100000）')
+    parser.add_argument('--commands', type=int, default=200, help='每个用户的命令数')
+    parser.add_argument('--requests', type=int, default=500, help='每个场景的请求数')
+    parser.add_argument('--login-requests', type=int, default=20, help='登录场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发线程数')
+    parser.add_argument('--warmup', type=int, default=10, help='每个场景开始测量前的预热请求数')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--drivers', nargs='+', choices=DRIVERS, default=list(DRIVERS))
+    parser.add_argument('--database', help='数据库URI，默认使用临时SQLite文件')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，相同种子生成相同的密码库')
+    parser.add_argument('--output', help='把JSON结果写入文件（默认输出到标准输出）')
+    parser.add_argument('--compare', help='与之前保存的JSON结果对比')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为退化的相对变化（默认20%%）')
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        if regressions:
+            print('性能退化: ' + ', '.join(f'{d}/{n}/{m}' for d, n, m in regressions), file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,54 @@
 """
 数据库迁移脚本
-将旧的密码表结构迁移到新的加密方案
+把中心库（DATABASE_URI）和所有分片升级到最新的结构版本（见 app.schema）；hash 模式下尚不存在的分片会被创建
 
-警告：这会删除现有数据库并重新创建！
-如果有重要数据，请先备份！
-"""
+迁移只添加表、列和索引并转换令牌存储格式，不会删除任何数据；可以重复执行。
+生产环境建议设置 SCHEMA_AUTO_MIGRATE=false，在部署新版本前运行本脚本，
+这样各个工作进程启动时只做一次版本查询。
 
-from app import create_app, db
-from app.models import User, Password
-import os
+用法:
+    python migrate_database.py           # 执行所有待执行的迁移
+    python migrate_database.py --status  # 只显示各数据库的版本
+    python migrate_database.py --check   # 有待执行的迁移时以状态1退出（用于部署检查）
+"""
 
-def migrate_database():
-    app = create_app()
+import sys
+from flask import Flask
+from app import db, configure_database
+from app.schema import LATEST_VERSION, pending_migrations, upgrade
+from app.shards import SHARDED_TABLES, shard_engine, sharding_enabled, startup_shards
 
+def databases(app):
+    """待检查的数据库: (名称, 引擎, 包含的表)；分片只包含条目表"""
     with app.app_context():
-        print("开始数据库迁移...")
-
-        # 删除旧表
-        print("删除旧表...")
-        db.drop_all()
-
-        # 创建新表
-        print("创建新表...")
-        db.create_all()
-
-        print("数据库迁移完成！")
-        print("\n注意：")
-        print("1. 所有旧密码数据已被删除")
-        print("2. 请重新注册用户并添加密码")
-        print("3. 新方案将加密 title, url, username, password, notes")
-        print("4. category 字段保持明文，用于分类筛选")
+        yield '中心库', db.engine, None
+    if sharding_enabled():
+        for name in startup_shards():
+            with shard_engine(name) as engine:
+                yield name, engine, SHARDED_TABLES
+
+def migrate_database(mode='upgrade'):
+    # 只初始化数据库，不创建完整应用（create_app 启动时会自行检查版本）
+    app = Flask(__name__)
+    configure_database(app)
+    db.init_app(app)
+
+    outdated = 0
+    for name, engine, tables in databases(app):
+        pending = pending_migrations(engine)
+        if mode != 'upgrade' or not pending:
+            outdated += bool(pending)
+            state = f'落后 {len(pending)} 个版本: ' + ', '.join(m.name for m in pending) if pending else '已是最新'
+            print(f'{name}: {state}')
+            continue
+        for migration in upgrade(engine, tables):
+            print(f'{name}: 已执行迁移 {migration.version} {migration.name}')
+
+    print(f'最新版本: {LATEST_VERSION}')
+    return outdated
 
 if __name__ == '__main__':
-    # 确认操作
-    confirm = input("警告：此操作将删除所有现有数据！是否继续？(yes/no): ")
-
-    if confirm.lower() == 'yes':
-        migrate_database()
-    else:
-        print("操作已取消")
+    args = sys.argv[1:]
+    if '--check' in args:
+        sys.exit(1 if migrate_database('check') else 0)
+    migrate_database('status' if '--status' in args else 'upgrade')
@@ -0,0 +1,75 @@
+"""
+把单文件数据库拆分为按用户分片的存储
+
+读取 DATABASE_URI 指向的数据库，把每个用户的条目相关表（密码、命令、删除记录、
+重新加密任务、盲索引）按原id复制到该用户所在的分片；users 表留在原库中作为中心库。
+可以重复执行：每个用户在分片中已有的数据会先被删除再复制。
+复制时密文统一写成二进制存储，旧的文本令牌随之转换。
+
+用法（分片参数必须与运行应用时的配置一致）:
+    SHARD_MODE=hash SHARD_COUNT=16 SHARD_DIR=shards python shard_database.py [--prune]
+
+--prune  复制完成后从中心库删除已复制的条目数据并 VACUUM 回收空间
+"""
+
+import sys
+from sqlalchemy import delete, select
+from app import create_app, db
+from app.models import User
+from app.shards import SHARD_DIR, SHARD_MODE, engine_for, shard_name, sharded_tables, sharding_enabled
+
+# 每次插入的行数
+COPY_CHUNK_SIZE = 2000
+
+def copy_user(source, user_id):
+    """把一个用户的条目数据复制到其分片，返回 {表名: 行数}"""
+    copied = {}
+    with engine_for(shard_name(user_id)).begin() as target:
+        # 先按依赖的逆序清空该用户在分片中的旧数据（盲索引引用密码条目）
+        for table in reversed(sharded_tables()):
+            target.execute(delete(table).where(table.c.user_id == user_id))
+
+        for table in sharded_tables():
+            result = source.execute(select(table).where(table.c.user_id == user_id).order_by(table.c.id))
+            copied[table.name] = 0
+            while True:
+                rows = result.mappings().fetchmany(COPY_CHUNK_SIZE)
+                if not rows:
+                    break
+                target.execute(table.insert(), [dict(row) for row in rows])
+                copied[table.name] += len(rows)
+    return copied
+
+def prune(source_engine, user_ids):
+    """从中心库删除已复制到分片的条目数据"""
+    with source_engine.begin() as connection:
+        for table in reversed(sharded_tables()):
+            for i in range(0, len(user_ids), 500):
+                connection.execute(delete(table).where(table.c.user_id.in_(user_ids[i:i + 500])))
+    with source_engine.connect() as connection:
+        connection.exec_driver_sql('VACUUM')
+
+def shard_database(prune_source=False):
+    app = create_app()
+
+    with app.app_context():
+        source_engine = db.engine
+        user_ids = db.session.scalars(select(User.id).order_by(User.id)).all()
+        print(f'分片模式: {SHARD_MODE}，分片目录: {SHARD_DIR}，用户数: {len(user_ids)}')
+
+        with source_engine.connect() as source:
+            for user_id in user_ids:
+                copied = copy_user(source, user_id)
+                print(f'用户 {user_id} -> {shard_name(user_id)}: ' + ', '.join(f'{name} {count}' for name, count in copied.items()))
+
+        if prune_source:
+            print('从中心库删除已复制的条目数据...')
+            prune(source_engine, user_ids)
+
+        print('拆分完成！')
+
+if __name__ == '__main__':
+    if not sharding_enabled():
+        print('请先设置 SHARD_MODE=hash 或 SHARD_MODE=user（以及 SHARD_COUNT / SHARD_DIR）')
+        sys.exit(1)
+    shard_database(prune_source='--prune' in sys.argv[1:])
@@ -0,0 +1,36 @@
+"""
+测试辅助：使用临时SQLite数据库创建应用，并注册一个已启用两步验证的用户
+
+app 的配置在导入时从环境变量读取，需要在导入 app 之前设置。
+"""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix='pmer-test-')
+os.environ['DATABASE_URI'] = f'sqlite:///{_tmp}/test.db'
+os.environ['ALLOW_REGISTRATION'] = 'true'
+os.environ.setdefault('REQUEST_LOG_ENABLED', 'false')
+
+import pyotp
+from app import create_app
+
+_app = None
+_users = 0
+
+def make_client(password='pw123456'):
+    """返回 (测试客户端, 带正式令牌的请求头)；每次调用注册一个新用户"""
+    global _app, _users
+    if _app is None:
+        _app = create_app()
+    _users += 1
+    username = f'user{_users}'
+    client = _app.test_client()
+    client.post('/api/auth/register', json={'username': username, 'email': f'{username}@example.com', 'password': password})
+    temp_token = client.post('/api/auth/login', json={'username': username, 'password': password}).json['temp_token']
+    headers = {'Authorization': f'Bearer {temp_token}'}
+    secret = client.post('/api/auth/setup-2fa', headers=headers).json['secret']
+    token = client.post('/api/auth/enable-2fa', headers=headers, json={
+        'code': pyotp.TOTP(secret).now(), 'password': password
+    }).json['token']
+    return client, {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,55 @@
+"""条目字段类型校验：非字符串的明文字段返回400（或记入失败列表），不会在加密或建立盲索引时出错"""
+
+import json
+import unittest
+from tests.helpers import make_client
+
+class EntryFieldTypeTest(unittest.TestCase):
+    def setUp(self):
+        self.client, self.headers = make_client()
+
+    def search(self, query):
+        response = self.client.get('/api/passwords/search', headers=self.headers, query_string={'q': query})
+        return [entry['title'] for entry in response.json['passwords']]
+
+    def test_create_rejects_non_string_field(self):
+        response = self.client.post('/api/passwords/', headers=self.headers, json={
+            'title': 'a', 'password': 'p', 'username': 5
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.json['message'])
+
+    def test_update_rejects_non_string_field(self):
+        created = self.client.post('/api/passwords/', headers=self.headers, json={'title': 'mail', 'password': 'p'})
+        password_id = created.json['password']['id']
+        response = self.client.put(f'/api/passwords/{password_id}', headers=self.headers, json={'url': 7})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.search('mail'), ['mail'])
+
+    def test_batch_rejects_only_the_bad_operation(self):
+        response = self.client.post('/api/passwords/batch', headers=self.headers, json={'operations': [
+            {'op': 'create', 'title': 'a', 'password': 'p', 'username': 5},
+            {'op': 'create', 'title': 'valid entry', 'password': 'p'},
+            {'op': 'create', 'title': ['x'], 'password': 'p'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.json['results']]
+        self.assertEqual(statuses, [400, 201, 400])
+        self.assertIn('username', response.json['results'][0]['message'])
+        self.assertEqual(self.search('valid'), ['valid entry'])
+
+    def test_import_reports_bad_lines_as_failures(self):
+        lines = [
+            {'type': 'entry', 'title': 'imported', 'password': 'p'},
+            {'type': 'entry', 'title': 'bad url', 'password': 'p', 'url': 7},
+            {'type': 'entry', 'title': ['x'], 'password': 'p'},
+        ]
+        body = ''.join(json.dumps(line) + '\n' for line in lines)
+        response = self.client.post('/api/passwords/import', headers=self.headers, data=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['imported'], 1)
+        self.assertEqual([failure['line'] for failure in response.json['failures']], [2, 3])
+        self.assertEqual(self.search('imported'), ['imported'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""导入：版本1的密文导出与字段类型不正确的条目行"""
+
+import json
+import unittest
+import jwt
+from tests.helpers import make_client
+from app.passwords.crypto import encrypt_password_data
+
+def ndjson(lines):
+    return ''.join(json.dumps(line) + '\n' for line in lines)
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.client, self.headers = make_client()
+        token = self.headers['Authorization'][len('Bearer '):]
+        self.master_key = jwt.decode(token, options={'verify_signature': False})['master_key']
+
+    def import_lines(self, lines):
+        return self.client.post('/api/passwords/import', headers=self.headers, data=ndjson(lines))
+
+    def test_version_1_encrypted_export(self):
+        # 版本1：整个条目在一个 encrypted_data 中，没有 encrypted_secret
+        encrypted_data = encrypt_password_data({
+            'title': 'legacy', 'url': '', 'username': 'u', 'password': 'secret', 'notes': ''
+        }, self.master_key)
+        response = self.import_lines([
+            {'type': 'header', 'format': 'pmer-export', 'version': 1, 'encrypted': True},
+            {'type': 'entry', 'encrypted_data': encrypted_data, 'category': 'old'},
+            {'type': 'footer', 'count': 1, 'errors': 0},
+        ])
+        self.assertEqual(response.json['imported'], 1)
+        found = self.client.get('/api/passwords/search', headers=self.headers, query_string={'q': 'legacy'}).json
+        password_id = found['passwords'][0]['id']
+        secret = self.client.get(f'/api/passwords/{password_id}/secret', headers=self.headers).json
+        self.assertEqual(secret['password'], 'secret')
+
+    def test_malformed_encrypted_lines_are_failures(self):
+        encrypted_data = encrypt_password_data({'title': 'sealed', 'password': 'p'}, self.master_key)
+        response = self.import_lines([
+            {'type': 'entry', 'encrypted_data': 7},
+            {'type': 'entry', 'encrypted_data': 'x', 'encrypted_secret': ['y']},
+            {'type': 'entry', 'encrypted_data': 'not a token'},
+            {'type': 'entry', 'title': 'ok', 'password': 'p', 'category': 3},
+            {'type': 'entry', 'title': 'ok', 'password': 'p'},
+            {'type': 'entry', 'encrypted_data': encrypted_data, 'category': ['x']},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['imported'], 1)
+        self.assertEqual(sorted(failure['line'] for failure in response.json['failures']), [1, 2, 3, 4, 6])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import { apiClient } from './client';
 import { API_ENDPOINTS } from '../utils/config';
-import type { AuthResponse, User } from '../types';
+import type { AuthResponse, KdfInfo, User } from '../types';
 
 export const authApi = {
   async register(username: string, email: string, password: string): Promise<AuthResponse> {
@@ -22,7 +22,7 @@ export const authApi = {
     return apiClient.get(API_ENDPOINTS.auth.profile);
   },
 
-  async changePassword(oldPassword: string, newPassword: string): Promise<{ message: string }> {
+  async changePassword(oldPassword: string, newPassword: string): Promise<{ message: string; token?: string; kdf?: KdfInfo }> {
     return apiClient.put(API_ENDPOINTS.auth.changePassword, {
       old_password: oldPassword,
       new_password: newPassword,
@@ -33,7 +33,7 @@ export const authApi = {
     return apiClient.post(API_ENDPOINTS.auth.setup2FA);
   },
 
-  async enable2FA(code: string, password?: string): Promise<{ message: string; token?: string; user?: User; auto_login?: boolean }> {
+  async enable2FA(code: string, password?: string): Promise<{ message: string; token?: string; user?: User; kdf?: KdfInfo; auto_login?: boolean }> {
     return apiClient.post(API_ENDPOINTS.auth.enable2FA, { code, password });
   },
 
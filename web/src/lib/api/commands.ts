@@ -1,6 +1,6 @@
 import { apiClient } from './client';
 import { API_ENDPOINTS } from '../utils/config';
-import type { Command } from '../types';
+import type { ChangesResponse, Command, CommandSearchResponse, EntryGroup } from '../types';
 
 export const commandsApi = {
   async getAll(): Promise<{ commands: Command[] }> {
@@ -34,7 +34,21 @@ export const commandsApi = {
     return apiClient.delete(API_ENDPOINTS.commands.delete(id));
   },
 
-  async getTypes(): Promise<{ types: string[] }> {
+  async getTypes(): Promise<{ types: EntryGroup[]; total: number }> {
     return apiClient.get(API_ENDPOINTS.commands.types);
   },
+
+  async search(q: string, type?: string, offset = 0): Promise<CommandSearchResponse> {
+    const params = new URLSearchParams({ q });
+    if (type) params.set('type', type);
+    if (offset) params.set('offset', String(offset));
+    return apiClient.get(`${API_ENDPOINTS.commands.search}?${params}`);
+  },
+
+  async getChanges(since?: string | null): Promise<ChangesResponse<Command>> {
+    const endpoint = since
+      ? `${API_ENDPOINTS.commands.changes}?since=${encodeURIComponent(since)}`
+      : API_ENDPOINTS.commands.changes;
+    return apiClient.get(endpoint);
+  },
 };
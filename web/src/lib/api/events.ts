@@ -0,0 +1,109 @@
+import { API_BASE_URL, API_ENDPOINTS } from '../utils/config';
+import type { ChangeEvent } from '../types';
+
+export interface ChangeListener {
+  onChange: (event: ChangeEvent) => void;
+  // 服务端要求重新同步（错过的通知已无法重放，或本连接积压过多）
+  onResync: () => void;
+}
+
+export interface ChangeSubscription {
+  // 事件流当前是否已连接：未连接时，写入后需要自行刷新
+  connected: () => boolean;
+  close: () => void;
+}
+
+// 解析一个事件块（以空行结束），返回 [事件名, 数据]；只有注释（心跳）时返回 null
+function parseBlock(block: string, state: { lastEventId: string | null; retry: number }) {
+  let name = 'message';
+  const data: string[] = [];
+  for (const line of block.split('\n')) {
+    if (!line || line.startsWith(':')) continue;
+    const colon = line.indexOf(':');
+    const field = colon < 0 ? line : line.slice(0, colon);
+    const value = colon < 0 ? '' : line.slice(colon + 1).replace(/^ /, '');
+    if (field === 'id') state.lastEventId = value;
+    else if (field === 'event') name = value;
+    else if (field === 'data') data.push(value);
+    else if (field === 'retry') state.retry = Number(value) || state.retry;
+  }
+  return data.length ? ([name, data.join('\n')] as const) : null;
+}
+
+export const eventsApi = {
+  // 订阅当前用户的条目变动通知。
+  // 用 fetch 读取事件流而不是 EventSource：EventSource 不能携带 Authorization 头，令牌不应放进URL。
+  // 断线或服务端结束连接后按 retry 间隔重连，并带上 Last-Event-ID 重放错过的通知
+  subscribe(listener: ChangeListener): ChangeSubscription {
+    const state = { lastEventId: null as string | null, retry: 3000 };
+    let controller: AbortController | null = null;
+    let timer: ReturnType<typeof setTimeout> | null = null;
+    let attempts = 0;
+    let open = false;
+    let closed = false;
+
+    const connect = async () => {
+      const token = localStorage.getItem('token');
+      if (!token || closed) return;
+      attempts++;
+      controller = new AbortController();
+      const headers: Record<string, string> = {
+        Authorization: `Bearer ${token}`,
+        Accept: 'text/event-stream',
+      };
+      if (state.lastEventId) {
+        headers['Last-Event-ID'] = state.lastEventId;
+      }
+
+      try {
+        const response = await fetch(`${API_BASE_URL}${API_ENDPOINTS.events}`, {
+          headers,
+          signal: controller.signal,
+        });
+        // 令牌失效：不再重连，由其他请求的401处理跳转登录
+        if (response.status === 401) return;
+        if (!response.ok || !response.body) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        open = true;
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const parsed = parseBlock(buffer.slice(0, boundary), state);
+            buffer = buffer.slice(boundary + 2);
+            if (!parsed) continue;
+            const [name, data] = parsed;
+            if (name === 'change') listener.onChange(JSON.parse(data));
+            else if (name === 'resync') listener.onResync();
+            // 首次连接失败后才连上：连接之前的变动没有通知
+            else if (name === 'ready' && attempts > 1) listener.onResync();
+          }
+        }
+      } catch (error) {
+        if (closed) return;
+        console.error('Change feed disconnected:', error);
+      } finally {
+        open = false;
+      }
+      if (!closed) {
+        timer = setTimeout(connect, state.retry);
+      }
+    };
+
+    connect();
+    return {
+      connected: () => open,
+      close: () => {
+        closed = true;
+        controller?.abort();
+        if (timer) clearTimeout(timer);
+      },
+    };
+  },
+};
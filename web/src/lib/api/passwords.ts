@@ -1,16 +1,112 @@
 import { apiClient } from './client';
 import { API_ENDPOINTS } from '../utils/config';
-import type { Password } from '../types';
+import { openRecord, sealRecord, type VaultKey } from '../crypto/fernet';
+import { getVaultKey } from '../crypto/vault';
+import type { ChangesResponse, EntryGroup, Password, PasswordsResponse, SealedPassword, SealedPasswordsResponse } from '../types';
+
+type PasswordFields = {
+  title?: string;
+  url?: string;
+  username?: string;
+  password?: string;
+  category?: string;
+  notes?: string;
+};
+
+/**
+ * 客户端解密模式下的列表：取原样密文在本地解密
+ * 重新加密任务进行中、本地主密钥版本过期或解密失败时返回 null，调用方回退到服务端解密
+ */
+async function getSealedPage(query: URLSearchParams): Promise<PasswordsResponse | null> {
+  const vault = await getVaultKey();
+  if (!vault) return null;
+
+  query.set('mode', 'ciphertext');
+  const response: SealedPasswordsResponse = await apiClient.get(`${API_ENDPOINTS.passwords.list}?${query.toString()}`);
+  if (response.rekey_active || response.kdf.key_version !== vault.keyVersion) return null;
+
+  try {
+    const passwords = await Promise.all(response.passwords.map((entry) => openSummary(vault.key, entry)));
+    return { passwords, errors: [], total: response.total, next_cursor: response.next_cursor };
+  } catch (error) {
+    console.error('本地解密失败，改用服务端解密:', error);
+    return null;
+  }
+}
+
+async function openSummary(key: VaultKey, entry: SealedPassword): Promise<Password> {
+  const { title, url, username } = await openRecord(key, entry.encrypted_data);
+  return {
+    id: entry.id,
+    category: entry.category,
+    created_at: entry.created_at,
+    updated_at: entry.updated_at,
+    title,
+    url,
+    username,
+  };
+}
+
+/** 取条目两列密文并在本地解密出完整明文，条目不能在本地解密时返回 null */
+async function getSealedEntry(id: number): Promise<{ key: VaultKey; entry: Password } | null> {
+  const vault = await getVaultKey();
+  if (!vault) return null;
+
+  const response: SealedPassword & { rekey_active: boolean } = await apiClient.get(
+    `${API_ENDPOINTS.passwords.get(id)}?mode=ciphertext`
+  );
+  if (response.rekey_active) return null;
+
+  try {
+    const summary = await openSummary(vault.key, response);
+    // 旧格式条目只有一列，机密字段也在摘要列中
+    const secret = await openRecord(vault.key, response.encrypted_secret || response.encrypted_data);
+    return { key: vault.key, entry: { ...summary, password: secret.password, notes: secret.notes } };
+  } catch (error) {
+    console.error('本地解密失败，改用服务端解密:', error);
+    return null;
+  }
+}
+
+/** 摘要与机密分别在本地加密，与服务端 encrypt_entries 的分列方式一致 */
+async function seal(key: VaultKey, data: PasswordFields) {
+  const [encrypted_data, encrypted_secret] = await Promise.all([
+    sealRecord(key, { title: data.title ?? '', url: data.url ?? '', username: data.username ?? '' }),
+    sealRecord(key, { password: data.password ?? '', notes: data.notes ?? '' }),
+  ]);
+  return { encrypted_data, encrypted_secret, category: data.category };
+}
 
 export const passwordsApi = {
-  async getAll(): Promise<{ passwords: Password[] }> {
-    return apiClient.get(API_ENDPOINTS.passwords.list);
+  async getAll(): Promise<PasswordsResponse> {
+    return (await getSealedPage(new URLSearchParams())) ?? apiClient.get(API_ENDPOINTS.passwords.list);
+  },
+
+  async getPage(params: {
+    limit: number;
+    afterId?: number | null;
+    category?: string;
+  }): Promise<PasswordsResponse> {
+    const query = new URLSearchParams({ limit: String(params.limit) });
+    if (params.afterId) query.set('after_id', String(params.afterId));
+    if (params.category) query.set('category', params.category);
+    const sealed = await getSealedPage(new URLSearchParams(query));
+    if (sealed) return sealed;
+    return apiClient.get(`${API_ENDPOINTS.passwords.list}?${query.toString()}`);
   },
 
   async getById(id: number): Promise<Password> {
+    const sealed = await getSealedEntry(id);
+    if (sealed) return sealed.entry;
     return apiClient.get(API_ENDPOINTS.passwords.get(id));
   },
 
+  async getSecret(id: number): Promise<{ id: number; password: string; notes: string }> {
+    const sealed = await getSealedEntry(id);
+    if (sealed) return { id, password: sealed.entry.password ?? '', notes: sealed.entry.notes ?? '' };
+    return apiClient.get(API_ENDPOINTS.passwords.secret(id));
+  },
+
   async create(data: {
     title: string;
     url?: string;
@@ -19,20 +115,23 @@ export const passwordsApi = {
     category?: string;
     notes?: string;
   }): Promise<{ message: string; password: Password }> {
+    const vault = await getVaultKey();
+    if (vault) {
+      return apiClient.post(API_ENDPOINTS.passwords.create, await seal(vault.key, data));
+    }
     return apiClient.post(API_ENDPOINTS.passwords.create, data);
   },
 
   async update(
     id: number,
-    data: {
-      title?: string;
-      url?: string;
-      username?: string;
-      password?: string;
-      category?: string;
-      notes?: string;
-    }
+    data: PasswordFields
   ): Promise<{ message: string; password: Password }> {
+    // 客户端加密时上传合并后的完整条目（服务端不再逐字段合并）
+    const sealed = await getSealedEntry(id);
+    if (sealed) {
+      const merged = { ...sealed.entry, ...data };
+      return apiClient.put(API_ENDPOINTS.passwords.update(id), await seal(sealed.key, merged));
+    }
     return apiClient.put(API_ENDPOINTS.passwords.update(id), data);
   },
 
@@ -40,7 +139,14 @@ export const passwordsApi = {
     return apiClient.delete(API_ENDPOINTS.passwords.delete(id));
   },
 
-  async getCategories(): Promise<{ categories: string[] }> {
+  async getCategories(): Promise<{ categories: EntryGroup[]; total: number }> {
     return apiClient.get(API_ENDPOINTS.passwords.categories);
   },
+
+  async getChanges(since?: string | null): Promise<ChangesResponse<Password>> {
+    const endpoint = since
+      ? `${API_ENDPOINTS.passwords.changes}?since=${encodeURIComponent(since)}`
+      : API_ENDPOINTS.passwords.changes;
+    return apiClient.get(endpoint);
+  },
 };
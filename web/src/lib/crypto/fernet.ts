@@ -0,0 +1,181 @@
+/**
+ * 浏览器端的 Fernet 实现（WebCrypto），与服务端 cryptography.fernet 互通
+ *
+ * 令牌格式: 0x80 | 时间戳(8) | IV(16) | AES-128-CBC 密文 | HMAC-SHA256(32)，整体 base64url 编码
+ * 主密钥（十六进制）的前16字节为签名密钥，后16字节为加密密钥，与服务端 get_encryption_key 一致
+ */
+
+import type { KdfInfo } from '../types';
+
+const VERSION = 0x80;
+const HEADER_SIZE = 1 + 8 + 16;
+const HMAC_SIZE = 32;
+
+// 与服务端 pack_record 一致的记录格式
+const RECORD_JSON = 0x01;
+const RECORD_JSON_ZLIB = 0x02;
+const RECORD_COMPRESS_THRESHOLD = 256;
+const FIELD_CODES: Record<string, string> = { title: 't', url: 'u', username: 'n', password: 'p', notes: 'm' };
+const FIELD_NAMES: Record<string, string> = Object.fromEntries(
+  Object.entries(FIELD_CODES).map(([name, code]) => [code, name])
+);
+
+export class FernetError extends Error {}
+
+export interface VaultKey {
+  signingKey: CryptoKey;
+  encryptionKey: CryptoKey;
+}
+
+function base64UrlDecode(value: string): Uint8Array {
+  const base64 = value.replace(/-/g, '+').replace(/_/g, '/');
+  const binary = atob(base64.padEnd(Math.ceil(base64.length / 4) * 4, '='));
+  return Uint8Array.from(binary, (c) => c.charCodeAt(0));
+}
+
+function base64UrlEncode(bytes: Uint8Array): string {
+  let binary = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary).replace(/\+/g, '-').replace(/\//g, '_');
+}
+
+function hexToBytes(hex: string): Uint8Array {
+  const bytes = new Uint8Array(hex.length / 2);
+  for (let i = 0; i < bytes.length; i++) {
+    bytes[i] = parseInt(hex.substr(i * 2, 2), 16);
+  }
+  return bytes;
+}
+
+function bytesToHex(bytes: Uint8Array): string {
+  return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+function concat(...parts: Uint8Array[]): Uint8Array {
+  const out = new Uint8Array(parts.reduce((size, part) => size + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    out.set(part, offset);
+    offset += part.length;
+  }
+  return out;
+}
+
+async function transform(data: Uint8Array, stream: CompressionStream | DecompressionStream): Promise<Uint8Array> {
+  const response = new Response(new Blob([data]).stream().pipeThrough(stream));
+  return new Uint8Array(await response.arrayBuffer());
+}
+
+/** 从十六进制主密钥导入签名密钥和加密密钥 */
+export async function importVaultKey(masterKey: string): Promise<VaultKey> {
+  const keyBytes = hexToBytes(masterKey);
+  if (keyBytes.length !== 32) {
+    throw new FernetError('主密钥长度无效');
+  }
+  const [signingKey, encryptionKey] = await Promise.all([
+    crypto.subtle.importKey('raw', keyBytes.slice(0, 16), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign', 'verify']),
+    crypto.subtle.importKey('raw', keyBytes.slice(16), { name: 'AES-CBC' }, false, ['encrypt', 'decrypt']),
+  ]);
+  return { signingKey, encryptionKey };
+}
+
+/** 解密 Fernet 令牌，签名不符或格式错误时抛出 FernetError */
+export async function decryptToken(key: VaultKey, token: string): Promise<Uint8Array> {
+  let data: Uint8Array;
+  try {
+    data = base64UrlDecode(token);
+  } catch {
+    throw new FernetError('令牌编码无效');
+  }
+  if (data.length < HEADER_SIZE + HMAC_SIZE || data[0] !== VERSION) {
+    throw new FernetError('令牌格式无效');
+  }
+  const signed = data.subarray(0, data.length - HMAC_SIZE);
+  const signature = data.subarray(data.length - HMAC_SIZE);
+  if (!(await crypto.subtle.verify('HMAC', key.signingKey, signature, signed))) {
+    throw new FernetError('令牌签名无效');
+  }
+  try {
+    const plain = await crypto.subtle.decrypt(
+      { name: 'AES-CBC', iv: data.subarray(9, HEADER_SIZE) },
+      key.encryptionKey,
+      data.subarray(HEADER_SIZE, data.length - HMAC_SIZE)
+    );
+    return new Uint8Array(plain);
+  } catch {
+    throw new FernetError('令牌解密失败');
+  }
+}
+
+/** 生成 Fernet 令牌（AES-CBC 使用 PKCS7 填充，与 Fernet 规范一致） */
+export async function encryptToken(key: VaultKey, plain: Uint8Array): Promise<string> {
+  const header = new Uint8Array(HEADER_SIZE);
+  header[0] = VERSION;
+  new DataView(header.buffer).setBigUint64(1, BigInt(Math.floor(Date.now() / 1000)));
+  const iv = crypto.getRandomValues(new Uint8Array(16));
+  header.set(iv, 9);
+  const ciphertext = new Uint8Array(await crypto.subtle.encrypt({ name: 'AES-CBC', iv }, key.encryptionKey, plain));
+  const signed = concat(header, ciphertext);
+  const signature = new Uint8Array(await crypto.subtle.sign('HMAC', key.signingKey, signed));
+  return base64UrlEncode(concat(signed, signature));
+}
+
+/** 解析服务端 pack_record 格式的记录（兼容旧的JSON文本） */
+export async function unpackRecord(raw: Uint8Array): Promise<Record<string, string>> {
+  const decoder = new TextDecoder();
+  if (raw[0] === 0x7b) {
+    return JSON.parse(decoder.decode(raw));
+  }
+  let body = raw.subarray(1);
+  if (raw[0] === RECORD_JSON_ZLIB) {
+    body = await transform(body, new DecompressionStream('deflate'));
+  } else if (raw[0] !== RECORD_JSON) {
+    throw new FernetError('未知的记录格式');
+  }
+  const compact: Record<string, string> = JSON.parse(decoder.decode(body));
+  return Object.fromEntries(Object.entries(compact).map(([code, value]) => [FIELD_NAMES[code] ?? code, value]));
+}
+
+/** 序列化为紧凑记录，较大的记录用zlib压缩 */
+export async function packRecord(data: Record<string, string>): Promise<Uint8Array> {
+  const body = new TextEncoder().encode(
+    JSON.stringify(Object.fromEntries(Object.entries(data).map(([name, value]) => [FIELD_CODES[name] ?? name, value])))
+  );
+  if (body.length > RECORD_COMPRESS_THRESHOLD) {
+    const compressed = await transform(body, new CompressionStream('deflate'));
+    if (compressed.length < body.length) {
+      return concat(Uint8Array.of(RECORD_JSON_ZLIB), compressed);
+    }
+  }
+  return concat(Uint8Array.of(RECORD_JSON), body);
+}
+
+export async function openRecord(key: VaultKey, token: string): Promise<Record<string, string>> {
+  return unpackRecord(await decryptToken(key, token));
+}
+
+export async function sealRecord(key: VaultKey, data: Record<string, string>): Promise<string> {
+  return encryptToken(key, await packRecord(data));
+}
+
+/** 浏览器能否按给定参数派生主密钥（WebCrypto 不支持 scrypt） */
+export function supportsKdf(kdf: KdfInfo): boolean {
+  return kdf.algorithm === 'pbkdf2_sha256' && typeof crypto !== 'undefined' && !!crypto.subtle;
+}
+
+/** 按服务端 kdf.derive_key 的规则派生十六进制主密钥 */
+export async function deriveMasterKey(password: string, kdf: KdfInfo): Promise<string> {
+  if (!supportsKdf(kdf)) {
+    throw new FernetError(`浏览器不支持的密钥派生算法: ${kdf.algorithm}`);
+  }
+  const encoder = new TextEncoder();
+  const baseKey = await crypto.subtle.importKey('raw', encoder.encode(password), 'PBKDF2', false, ['deriveBits']);
+  const bits = await crypto.subtle.deriveBits(
+    { name: 'PBKDF2', hash: 'SHA-256', salt: encoder.encode(kdf.salt), iterations: kdf.params.iterations },
+    baseKey,
+    256
+  );
+  return bytesToHex(new Uint8Array(bits));
+}
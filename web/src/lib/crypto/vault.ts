@@ -0,0 +1,43 @@
+import { CLIENT_DECRYPTION } from '../utils/config';
+import type { KdfInfo } from '../types';
+import { deriveMasterKey, importVaultKey, supportsKdf, type VaultKey } from './fernet';
+
+// 主密钥只保存在 sessionStorage：关闭标签页即失效，不随 localStorage 持久化
+const KEY_STORAGE = 'vault_key';
+const VERSION_STORAGE = 'vault_key_version';
+
+let cached: { masterKey: string; key: VaultKey } | null = null;
+
+/** 登录或修改密码后用登录口令派生并保存主密钥；未启用或浏览器不支持时清除 */
+export async function unlockVault(password: string, kdf?: KdfInfo): Promise<void> {
+  if (!CLIENT_DECRYPTION || !kdf || !supportsKdf(kdf)) {
+    lockVault();
+    return;
+  }
+  try {
+    const masterKey = await deriveMasterKey(password, kdf);
+    sessionStorage.setItem(KEY_STORAGE, masterKey);
+    sessionStorage.setItem(VERSION_STORAGE, String(kdf.key_version));
+  } catch (error) {
+    console.error('主密钥派生失败，改用服务端解密:', error);
+    lockVault();
+  }
+}
+
+export function lockVault(): void {
+  sessionStorage.removeItem(KEY_STORAGE);
+  sessionStorage.removeItem(VERSION_STORAGE);
+  cached = null;
+}
+
+/** 当前可用的主密钥及其版本，没有时返回 null（使用服务端解密） */
+export async function getVaultKey(): Promise<{ key: VaultKey; keyVersion: number } | null> {
+  const masterKey = sessionStorage.getItem(KEY_STORAGE);
+  if (!CLIENT_DECRYPTION || !masterKey) {
+    return null;
+  }
+  if (cached?.masterKey !== masterKey) {
+    cached = { masterKey, key: await importVaultKey(masterKey) };
+  }
+  return { key: cached.key, keyVersion: Number(sessionStorage.getItem(VERSION_STORAGE) ?? 0) };
+}
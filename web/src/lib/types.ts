@@ -33,16 +33,81 @@ export interface AuthResponse {
   message?: string;
   requires_2fa?: boolean;
   requires_2fa_setup?: boolean;
+  kdf?: KdfInfo;
+}
+
+// 主密钥派生参数（客户端解密模式下浏览器据此在本地派生主密钥）
+export interface KdfInfo {
+  algorithm: string;
+  params: Record<string, number>;
+  salt: string;
+  key_version: number;
 }
 
 export interface PasswordsResponse {
   passwords: Password[];
+  errors?: { id: number; error: string }[];
+  total: number;
+  next_cursor: number | null;
+}
+
+// mode=ciphertext 时的条目：摘要（及机密）列的原样密文
+export interface SealedPassword {
+  id: number;
+  category?: string;
+  created_at?: string;
+  updated_at?: string;
+  encrypted_data: string;
+  encrypted_secret?: string | null;
+}
+
+export interface SealedPasswordsResponse {
+  passwords: SealedPassword[];
+  total: number;
+  next_cursor: number | null;
+  kdf: KdfInfo;
+  rekey_active: boolean;
 }
 
 export interface CommandsResponse {
   commands: Command[];
 }
 
+// 密码分类 / 命令类型及其条目数（服务端维护的计数，不需要读取整个密码库）
+export interface EntryGroup {
+  name: string;
+  count: number;
+  last_updated: string | null;
+}
+
+// 全文检索结果：高亮部分以 <mark></mark> 标记，FTS不可用时为 null
+export interface CommandSearchResult extends Command {
+  name_highlight: string | null;
+  snippet: string | null;
+  score: number | null;
+}
+
+export interface CommandSearchResponse {
+  commands: CommandSearchResult[];
+  next_cursor: number | null;
+}
+
+export interface ChangesResponse<T> {
+  upserted: T[];
+  deleted: number[];
+  errors?: { id: number; error: string }[];
+  cursor: string;
+}
+
+// /api/events 推送的条目变动通知：version 为条目写入后的 updated_at；
+// resync 表示变动过多或错过了通知，应做一次增量同步
+export interface ChangeEvent {
+  entity: 'password' | 'command';
+  id: number | null;
+  action: 'upsert' | 'delete' | 'resync';
+  version: string | null;
+}
+
 export interface TwoFactorSetupResponse {
   qr_code: string;
   secret: string;
@@ -1,6 +1,9 @@
 // API配置
 export const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000';
 
+// 客户端解密模式：密码列表以密文下发，由浏览器用本地派生的主密钥解密
+export const CLIENT_DECRYPTION = import.meta.env.VITE_CLIENT_DECRYPTION === 'true';
+
 export const API_ENDPOINTS = {
   // 认证相关
   auth: {
@@ -18,9 +21,11 @@ export const API_ENDPOINTS = {
     list: '/api/passwords/',
     create: '/api/passwords/',
     get: (id: number) => `/api/passwords/${id}`,
+    secret: (id: number) => `/api/passwords/${id}/secret`,
     update: (id: number) => `/api/passwords/${id}`,
     delete: (id: number) => `/api/passwords/${id}`,
     categories: '/api/passwords/categories',
+    changes: '/api/passwords/changes',
   },
   // 命令相关
   commands: {
@@ -30,5 +35,9 @@ export const API_ENDPOINTS = {
     update: (id: number) => `/api/commands/${id}`,
     delete: (id: number) => `/api/commands/${id}`,
     types: '/api/commands/types',
+    changes: '/api/commands/changes',
+    search: '/api/commands/search',
   },
+  // 条目变动通知（Server-Sent Events）
+  events: '/api/events',
 };
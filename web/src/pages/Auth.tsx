@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuthStore } from '@/lib/stores/auth';
 import { authApi } from '@/lib/api/auth';
+import { unlockVault } from '@/lib/crypto/vault';
 import { toast } from '@/lib/stores/toast';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -62,6 +63,7 @@ export function Auth() {
         else {
           const token = response.access_token || response.token;
           if (token && response.user) {
+            await unlockVault(formData.password, response.kdf);
             setAuth(response.user, token);
             toast.success('登录成功');
             // useEffect 会自动处理跳转
@@ -89,6 +91,7 @@ export function Auth() {
       const response = await authApi.verify2FA(tempToken, twoFactorCode);
       const token = response.access_token || response.token;
       if (token && response.user) {
+        await unlockVault(formData.password, response.kdf);
         setAuth(response.user, token);
         toast.success('验证成功');
         // useEffect 会自动处理跳转
@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { Copy, Edit, Trash2, Plus } from 'lucide-react';
+import { Copy, Edit, Trash2, Plus, Search } from 'lucide-react';
 import { Layout } from '@/components/layout';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -10,20 +10,53 @@ import { Card, CardContent } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '@/components/ui/dialog';
 import { useAuthStore } from '@/lib/stores/auth';
 import { commandsApi } from '@/lib/api/commands';
+import { eventsApi, type ChangeSubscription } from '@/lib/api/events';
 import { toast } from '@/lib/stores/toast';
-import type { Command } from '@/lib/types';
+import type { ChangeEvent, Command, CommandSearchResult, EntryGroup } from '@/lib/types';
 import { cn } from '@/lib/utils/cn';
 
+// 输入停顿多久后发起搜索
+const SEARCH_DEBOUNCE_MS = 250;
+// 短时间内收到的多条变动通知合并为一次处理
+const CHANGE_BATCH_MS = 100;
+
+// 按服务端的 <mark></mark> 标记拆分，作为文本节点渲染，不解析其他HTML
+function renderHighlight(text: string) {
+  return text.split(/<mark>|<\/mark>/).map((part, i) =>
+    i % 2 === 1 ? (
+      <mark key={i} className="bg-yellow-200 dark:bg-yellow-800 rounded-sm">
+        {part}
+      </mark>
+    ) : (
+      part
+    )
+  );
+}
+
 export function Commands() {
   const navigate = useNavigate();
   const { isAuthenticated } = useAuthStore();
   const [commands, setCommands] = useState<Command[]>([]);
   const [filteredCommands, setFilteredCommands] = useState<Command[]>([]);
   const [currentType, setCurrentType] = useState('all');
+  // 侧栏的类型与条目数来自服务端的计数
+  const [typeGroups, setTypeGroups] = useState<EntryGroup[]>([]);
+  const [typeTotal, setTypeTotal] = useState(0);
   const [currentPage, setCurrentPage] = useState(1);
   const [modalOpen, setModalOpen] = useState(false);
   const [editingId, setEditingId] = useState<number | null>(null);
   const itemsPerPage = 10;
+  // 上次同步返回的游标，变更后只拉取增量
+  const syncCursor = useRef<string | null>(null);
+  // 服务端全文检索：输入停顿后再请求，只采用最近一次请求的结果
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState<CommandSearchResult[] | null>(null);
+  const [searchCursor, setSearchCursor] = useState<number | null>(null);
+  const searchSeq = useRef(0);
+  // 变动通知（其他标签页/设备的写入也会推送）；处理函数每次渲染更新，读到的是最新状态
+  const changeFeed = useRef<ChangeSubscription | null>(null);
+  const changeHandler = useRef<(change: ChangeEvent | null) => void>(() => {});
+  const pendingSync = useRef<boolean | null>(null);
 
   const [formData, setFormData] = useState({
     name: '',
@@ -36,9 +69,23 @@ export function Commands() {
       navigate('/auth');
     } else {
       fetchCommands();
+      fetchTypes();
     }
   }, [isAuthenticated, navigate]);
 
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    const feed = eventsApi.subscribe({
+      onChange: (change) => changeHandler.current(change),
+      onResync: () => changeHandler.current(null),
+    });
+    changeFeed.current = feed;
+    return () => {
+      feed.close();
+      changeFeed.current = null;
+    };
+  }, [isAuthenticated]);
+
   useEffect(() => {
     if (currentType === 'all') {
       setFilteredCommands(commands);
@@ -50,10 +97,98 @@ export function Commands() {
     setCurrentPage(1);
   }, [currentType, commands]);
 
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      searchSeq.current++;
+      setSearchResults(null);
+      setSearchCursor(null);
+      return;
+    }
+    const timer = setTimeout(() => runSearch(), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchQuery, currentType]);
+
+  const runSearch = async (offset = 0) => {
+    const seq = ++searchSeq.current;
+    try {
+      const response = await commandsApi.search(
+        searchQuery.trim(),
+        currentType === 'all' ? undefined : currentType,
+        offset
+      );
+      if (seq !== searchSeq.current) return;
+      setSearchResults((prev) =>
+        offset && prev ? [...prev, ...response.commands] : response.commands
+      );
+      setSearchCursor(response.next_cursor);
+    } catch (error: any) {
+      if (seq === searchSeq.current) {
+        toast.error(error.message || '搜索失败');
+      }
+    }
+  };
+
+  // 按变动通知修补本地列表：删除直接移除；本地副本已是通知中的版本时不再请求，
+  // 否则增量同步。分组计数与搜索结果每批通知刷新一次。change 为 null 表示需要重新同步
+  changeHandler.current = (change) => {
+    if (change && change.entity !== 'command') return;
+    let upToDate = false;
+    if (change?.action === 'delete') {
+      setCommands((prev) => prev.filter((c) => c.id !== change.id));
+      upToDate = true;
+    } else if (change?.action === 'upsert') {
+      upToDate = commands.some((c) => c.id === change.id && c.updated_at === change.version);
+    }
+    if (pendingSync.current === null) {
+      pendingSync.current = false;
+      setTimeout(applyChanges, CHANGE_BATCH_MS);
+    }
+    pendingSync.current = pendingSync.current || !upToDate;
+  };
+
+  const applyChanges = () => {
+    const sync = pendingSync.current;
+    pendingSync.current = null;
+    fetchTypes();
+    if (sync) {
+      syncCommands();
+    }
+    if (searchQuery.trim()) {
+      runSearch();
+    }
+  };
+
+  // 写入后用响应中的条目更新本地列表
+  const patchCommand = (command: Command) => {
+    setCommands((prev) =>
+      [...prev.filter((c) => c.id !== command.id), command].sort((a, b) => a.id - b.id)
+    );
+  };
+
+  // 条目变更后同步列表，搜索中时重新检索
+  const refresh = async () => {
+    fetchTypes();
+    await syncCommands();
+    if (searchQuery.trim()) {
+      runSearch();
+    }
+  };
+
+  const fetchTypes = async () => {
+    try {
+      const response = await commandsApi.getTypes();
+      setTypeGroups(response.types || []);
+      setTypeTotal(response.total || 0);
+    } catch (error: any) {
+      toast.error(error.message || '获取命令类型失败');
+    }
+  };
+
   const fetchCommands = async () => {
     try {
-      const response = await commandsApi.getAll();
-      setCommands(response.commands || []);
+      const response = await commandsApi.getChanges();
+      syncCursor.current = response.cursor;
+      setCommands(response.upserted || []);
     } catch (error: any) {
       toast.error(error.message || '获取命令列表失败');
       if (error.message?.includes('401')) {
@@ -62,25 +197,40 @@ export function Commands() {
     }
   };
 
+  // 增量同步：先移除已删除的条目，再按id覆盖新增/修改的条目
+  const syncCommands = async () => {
+    if (!syncCursor.current) {
+      return fetchCommands();
+    }
+    try {
+      const response = await commandsApi.getChanges(syncCursor.current);
+      syncCursor.current = response.cursor;
+      setCommands((prev) => {
+        const deleted = new Set(response.deleted);
+        const byId = new Map(
+          prev.filter((c) => !deleted.has(c.id)).map((c) => [c.id, c] as const)
+        );
+        response.upserted.forEach((c) => byId.set(c.id, c));
+        return Array.from(byId.values()).sort((a, b) => a.id - b.id);
+      });
+    } catch (error: any) {
+      toast.error(error.message || '同步命令列表失败');
+    }
+  };
+
   const types = [
-    {
-      name: '全部',
-      value: 'all',
-      count: commands.length,
-    },
-    ...Array.from(new Set(commands.map((c) => c.command_type).filter(Boolean)))
-      .map((type) => ({
-        name: type as string,
-        value: type as string,
-        count: commands.filter((c) => c.command_type === type).length,
-      })),
+    { name: '全部', value: 'all', count: typeTotal },
+    ...typeGroups.map((group) => ({ name: group.name, value: group.name, count: group.count })),
   ];
 
-  const totalPages = Math.ceil(filteredCommands.length / itemsPerPage);
-  const paginatedCommands = filteredCommands.slice(
-    (currentPage - 1) * itemsPerPage,
-    currentPage * itemsPerPage
-  );
+  const searching = searchResults !== null;
+  const totalPages = searching ? 0 : Math.ceil(filteredCommands.length / itemsPerPage);
+  const paginatedCommands: (Command | CommandSearchResult)[] = searching
+    ? searchResults
+    : filteredCommands.slice(
+        (currentPage - 1) * itemsPerPage,
+        currentPage * itemsPerPage
+      );
 
   const showAddModal = () => {
     setEditingId(null);
@@ -108,15 +258,20 @@ export function Commands() {
 
     try {
       if (editingId) {
-        await commandsApi.update(editingId, formData);
+        const response = await commandsApi.update(editingId, formData);
+        patchCommand(response.command);
         toast.success('命令更新成功');
       } else {
-        await commandsApi.create(formData);
+        const response = await commandsApi.create(formData);
+        patchCommand(response.command);
         toast.success('命令添加成功');
       }
       setModalOpen(false);
       resetForm();
-      fetchCommands();
+      // 变动通知会刷新计数与搜索结果；通知未连接时自行同步
+      if (!changeFeed.current?.connected()) {
+        refresh();
+      }
     } catch (error: any) {
       toast.error(error.message || '保存失败');
     }
@@ -129,8 +284,11 @@ export function Commands() {
 
     try {
       await commandsApi.delete(id);
+      setCommands((prev) => prev.filter((c) => c.id !== id));
       toast.success('命令删除成功');
-      fetchCommands();
+      if (!changeFeed.current?.connected()) {
+        refresh();
+      }
     } catch (error: any) {
       toast.error(error.message || '删除失败');
     }
@@ -189,11 +347,20 @@ export function Commands() {
 
         {/* 右侧命令列表 */}
         <div className="flex-1">
-          <div className="mb-6">
+          <div className="mb-6 flex items-center gap-4">
             <Button onClick={showAddModal}>
               <Plus className="mr-2 h-4 w-4" />
               添加新命令
             </Button>
+            <div className="relative flex-1 max-w-md">
+              <Search className="absolute left-3 top-1/2 -translate-y-1/2 h-4 w-4 text-muted-foreground" />
+              <Input
+                value={searchQuery}
+                onChange={(e) => setSearchQuery(e.target.value)}
+                placeholder="搜索名称、命令或类型"
+                className="pl-9"
+              />
+            </div>
           </div>
 
           <Card>
@@ -216,22 +383,28 @@ export function Commands() {
                           colSpan={5}
                           className="text-center py-8 text-muted-foreground"
                         >
-                          没有保存的命令
+                          {searching ? '没有匹配的命令' : '没有保存的命令'}
                         </td>
                       </tr>
                     ) : (
                       paginatedCommands.map((command) => (
                         <tr key={command.id} className="border-b hover:bg-accent/50">
-                          <td className="p-4">{command.name}</td>
+                          <td className="p-4">
+                            {'name_highlight' in command && command.name_highlight
+                              ? renderHighlight(command.name_highlight)
+                              : command.name}
+                          </td>
                           <td className="p-4">{command.command_type || '-'}</td>
                           <td
                             className="p-4 font-mono text-sm cursor-pointer hover:text-primary max-w-xs truncate"
                             onClick={() => copyCommand(command.command_text)}
                             title={`点击复制\n${command.command_text}`}
                           >
-                            {command.command_text.length > 50
-                              ? command.command_text.substring(0, 50) + '...'
-                              : command.command_text}
+                            {'snippet' in command && command.snippet
+                              ? renderHighlight(command.snippet)
+                              : command.command_text.length > 50
+                                ? command.command_text.substring(0, 50) + '...'
+                                : command.command_text}
                           </td>
                           <td className="p-4 text-sm text-muted-foreground">
                             {formatDate(command.created_at)}
@@ -271,6 +444,15 @@ export function Commands() {
                 </table>
               </div>
 
+              {/* 搜索结果的下一页 */}
+              {searching && searchCursor !== null && (
+                <div className="flex justify-center p-4 border-t">
+                  <Button size="sm" variant="outline" onClick={() => runSearch(searchCursor)}>
+                    加载更多
+                  </Button>
+                </div>
+              )}
+
               {/* 分页 */}
               {totalPages > 1 && (
                 <div className="flex items-center justify-center gap-2 p-4 border-t">
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Copy, Edit, Trash2, Plus, ExternalLink, Eye, EyeOff, Sparkles } from 'lucide-react';
 import { Layout } from '@/components/layout';
@@ -10,21 +10,34 @@ import { Card, CardContent } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '@/components/ui/dialog';
 import { useAuthStore } from '@/lib/stores/auth';
 import { passwordsApi } from '@/lib/api/passwords';
+import { eventsApi, type ChangeSubscription } from '@/lib/api/events';
 import { toast } from '@/lib/stores/toast';
-import type { Password } from '@/lib/types';
+import type { ChangeEvent, EntryGroup, Password } from '@/lib/types';
 import { cn } from '@/lib/utils/cn';
 
+// 短时间内收到的多条变动通知合并为一次处理
+const CHANGE_BATCH_MS = 100;
+
 export function Passwords() {
   const navigate = useNavigate();
   const { isAuthenticated } = useAuthStore();
   const [passwords, setPasswords] = useState<Password[]>([]);
-  const [filteredPasswords, setFilteredPasswords] = useState<Password[]>([]);
+  // 侧栏的分类与条目数来自服务端的计数，不随当前页变化
+  const [categoryGroups, setCategoryGroups] = useState<EntryGroup[]>([]);
+  const [vaultTotal, setVaultTotal] = useState(0);
+  const [total, setTotal] = useState(0);
   const [currentCategory, setCurrentCategory] = useState('all');
   const [currentPage, setCurrentPage] = useState(1);
+  // 游标栈：pageCursors[i] 为第 i+1 页请求使用的 after_id
+  const [pageCursors, setPageCursors] = useState<(number | null)[]>([null]);
   const [modalOpen, setModalOpen] = useState(false);
   const [editingId, setEditingId] = useState<number | null>(null);
   const [showPassword, setShowPassword] = useState(false);
   const itemsPerPage = 10;
+  // 变动通知（其他标签页/设备的写入也会推送）；处理函数每次渲染更新，读到的是最新状态
+  const changeFeed = useRef<ChangeSubscription | null>(null);
+  const changeHandler = useRef<(change: ChangeEvent | null) => void>(() => {});
+  const pendingReload = useRef<boolean | null>(null);
 
   // 表单状态
   const [formData, setFormData] = useState({
@@ -45,25 +58,45 @@ export function Passwords() {
     if (!isAuthenticated) {
       navigate('/auth');
     } else {
-      fetchPasswords();
+      fetchCategories();
     }
   }, [isAuthenticated, navigate]);
 
   useEffect(() => {
-    if (currentCategory === 'all') {
-      setFilteredPasswords(passwords);
-    } else {
-      setFilteredPasswords(
-        passwords.filter((p) => p.category === currentCategory)
-      );
+    if (isAuthenticated) {
+      fetchPage(1, [null]);
     }
-    setCurrentPage(1);
-  }, [currentCategory, passwords]);
+  }, [isAuthenticated, currentCategory]);
 
-  const fetchPasswords = async () => {
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    const feed = eventsApi.subscribe({
+      onChange: (change) => changeHandler.current(change),
+      onResync: () => changeHandler.current(null),
+    });
+    changeFeed.current = feed;
+    return () => {
+      feed.close();
+      changeFeed.current = null;
+    };
+  }, [isAuthenticated]);
+
+  // 按游标请求某一页，服务端只解密当前页的条目
+  const fetchPage = async (page: number, cursors: (number | null)[] = pageCursors) => {
     try {
-      const response = await passwordsApi.getAll();
+      const response = await passwordsApi.getPage({
+        limit: itemsPerPage,
+        afterId: cursors[page - 1],
+        category: currentCategory === 'all' ? undefined : currentCategory,
+      });
+      const nextCursors = cursors.slice(0, page);
+      if (response.next_cursor) {
+        nextCursors[page] = response.next_cursor;
+      }
       setPasswords(response.passwords || []);
+      setTotal(response.total || 0);
+      setPageCursors(nextCursors);
+      setCurrentPage(page);
     } catch (error: any) {
       toast.error(error.message || '获取密码列表失败');
       if (error.message?.includes('401')) {
@@ -72,25 +105,59 @@ export function Passwords() {
     }
   };
 
+  const fetchCategories = async () => {
+    try {
+      const response = await passwordsApi.getCategories();
+      setCategoryGroups(response.categories || []);
+      setVaultTotal(response.total || 0);
+    } catch (error: any) {
+      toast.error(error.message || '获取分类失败');
+    }
+  };
+
+  // 变更后刷新当前页和分类列表
+  const fetchPasswords = () => {
+    fetchCategories();
+    fetchPage(currentPage);
+  };
+
+  // 按变动通知刷新：列表按页从服务端读取，只有当前页上已是通知中版本的条目不需要重新请求当前页；
+  // 分类计数每批通知刷新一次。change 为 null 表示需要重新同步
+  changeHandler.current = (change) => {
+    if (change && change.entity !== 'password') return;
+    const upToDate =
+      change?.action === 'upsert' &&
+      passwords.some((p) => p.id === change.id && p.updated_at === change.version);
+    if (pendingReload.current === null) {
+      pendingReload.current = false;
+      setTimeout(applyChanges, CHANGE_BATCH_MS);
+    }
+    pendingReload.current = pendingReload.current || !upToDate;
+  };
+
+  const applyChanges = () => {
+    const reload = pendingReload.current;
+    pendingReload.current = null;
+    fetchCategories();
+    if (reload) {
+      fetchPage(currentPage);
+    }
+  };
+
+  // 写入后由变动通知刷新；通知未连接时自行刷新
+  const refreshAfterWrite = () => {
+    if (!changeFeed.current?.connected()) {
+      fetchPasswords();
+    }
+  };
+
   const categories = [
-    {
-      name: '全部',
-      value: 'all',
-      count: passwords.length,
-    },
-    ...Array.from(new Set(passwords.map((p) => p.category).filter(Boolean)))
-      .map((cat) => ({
-        name: cat as string,
-        value: cat as string,
-        count: passwords.filter((p) => p.category === cat).length,
-      })),
+    { name: '全部', value: 'all', count: vaultTotal },
+    ...categoryGroups.map((group) => ({ name: group.name, value: group.name, count: group.count })),
   ];
 
-  const totalPages = Math.ceil(filteredPasswords.length / itemsPerPage);
-  const paginatedPasswords = filteredPasswords.slice(
-    (currentPage - 1) * itemsPerPage,
-    currentPage * itemsPerPage
-  );
+  const totalPages = Math.ceil(total / itemsPerPage);
+  const paginatedPasswords = passwords;
 
   const showAddModal = () => {
     setEditingId(null);
@@ -134,7 +201,7 @@ export function Passwords() {
       }
       setModalOpen(false);
       resetForm();
-      fetchPasswords();
+      refreshAfterWrite();
     } catch (error: any) {
       toast.error(error.message || '保存失败');
     }
@@ -148,7 +215,7 @@ export function Passwords() {
     try {
       await passwordsApi.delete(id);
       toast.success('密码删除成功');
-      fetchPasswords();
+      refreshAfterWrite();
     } catch (error: any) {
       toast.error(error.message || '删除失败');
     }
@@ -163,6 +230,16 @@ export function Passwords() {
     }
   };
 
+  // 列表只包含摘要字段，复制时再单独获取密码
+  const copyPassword = async (id: number) => {
+    try {
+      const secret = await passwordsApi.getSecret(id);
+      await copyToClipboard(secret.password || '', '密码');
+    } catch (error: any) {
+      toast.error(error.message || '获取密码失败');
+    }
+  };
+
   const generatePassword = () => {
     let chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz';
     if (includeNumbers) chars += '0123456789';
@@ -283,7 +360,7 @@ export function Passwords() {
                               <Button
                                 size="icon"
                                 variant="ghost"
-                                onClick={() => copyToClipboard(password.password || '', '密码')}
+                                onClick={() => copyPassword(password.id)}
                                 title="复制密码"
                               >
                                 <Copy className="h-4 w-4" />
@@ -320,18 +397,18 @@ export function Passwords() {
                     size="sm"
                     variant="outline"
                     disabled={currentPage <= 1}
-                    onClick={() => setCurrentPage(currentPage - 1)}
+                    onClick={() => fetchPage(currentPage - 1)}
                   >
                     上一页
                   </Button>
                   <span className="text-sm text-muted-foreground">
-                    第 {currentPage} / {totalPages} 页 (共 {filteredPasswords.length} 条)
+                    第 {currentPage} / {totalPages} 页 (共 {total} 条)
                   </span>
                   <Button
                     size="sm"
                     variant="outline"
-                    disabled={currentPage >= totalPages}
-                    onClick={() => setCurrentPage(currentPage + 1)}
+                    disabled={currentPage >= totalPages || !pageCursors[currentPage]}
+                    onClick={() => fetchPage(currentPage + 1)}
                   >
                     下一页
                   </Button>
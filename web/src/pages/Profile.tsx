@@ -7,12 +7,13 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { useAuthStore } from '@/lib/stores/auth';
 import { authApi } from '@/lib/api/auth';
+import { unlockVault } from '@/lib/crypto/vault';
 import { toast } from '@/lib/stores/toast';
 import type { User } from '@/lib/types';
 
 export function Profile() {
   const navigate = useNavigate();
-  const { isAuthenticated, user: storeUser } = useAuthStore();
+  const { isAuthenticated, user: storeUser, setAuth } = useAuthStore();
   const [user, setUser] = useState<User | null>(null);
   const [oldPassword, setOldPassword] = useState('');
   const [newPassword, setNewPassword] = useState('');
@@ -49,7 +50,12 @@ export function Profile() {
     }
 
     try {
-      await authApi.changePassword(oldPassword, newPassword);
+      const response = await authApi.changePassword(oldPassword, newPassword);
+      // 主密钥随密码更换，旧令牌已失效，改用新令牌
+      if (response.token && storeUser) {
+        await unlockVault(newPassword, response.kdf);
+        setAuth(storeUser, response.token);
+      }
       toast.success('密码修改成功');
       setOldPassword('');
       setNewPassword('');
@@ -7,6 +7,7 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { useAuthStore } from '@/lib/stores/auth';
 import { authApi } from '@/lib/api/auth';
+import { unlockVault } from '@/lib/crypto/vault';
 import { toast } from '@/lib/stores/toast';
 
 export function SetupTwoFactor() {
@@ -50,6 +51,7 @@ export function SetupTwoFactor() {
 
       // 如果返回了新 token，更新 auth store
       if (response.auto_login && response.token && response.user) {
+        await unlockVault(password, response.kdf);
         setAuth(response.user, response.token);
         localStorage.removeItem('temp_token');
       }